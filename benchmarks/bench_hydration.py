@@ -0,0 +1,41 @@
+""" Micro-benchmark of ``NetboxData.jsonToObj`` hydration
+
+Decodes a synthetic interface-connections page with ``InterfaceConnection.jsonToObj`` as the
+``object_hook`` and reports hydrated objects per second, into empty registries (cold) and
+into registries already holding every object (warm, the merge path).
+
+    python benchmarks/bench_hydration.py [connections] [repeats]
+"""
+import os
+import sys
+import json
+import time
+
+ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
+if ROOT_PATH not in sys.path:
+    sys.path.append( ROOT_PATH )
+
+from classdef.netbox import InterfaceConnection, REGISTRIES
+from benchmarks.synthetic import SyntheticNetbox
+
+
+def run(connections: int = 10000, repeats: int = 3) -> None:
+    body = SyntheticNetbox(connections).page("interface-connections")
+    for label, clear in (("cold", True), ("warm", False)):
+        best = None
+        for _ in range(repeats):
+            if clear:
+                for cls in REGISTRIES:
+                    cls._instances.clear()
+            start = time.perf_counter()
+            page = json.loads(body, object_hook=InterfaceConnection.jsonToObj)
+            elapsed = time.perf_counter() - start
+            assert len(page["results"]) == connections
+            best = elapsed if best is None else min(best, elapsed)
+        hydrated = sum(len(cls._instances) for cls in REGISTRIES)
+        print(f"{label:5} {connections} connections, {hydrated} objects in {best:.3f}s"
+              f" -> {connections / best:,.0f} connections/s, {hydrated / best:,.0f} objects/s")
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
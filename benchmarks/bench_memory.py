@@ -0,0 +1,45 @@
+""" Memory footprint of hydrated netbox objects
+
+Hydrates a synthetic interface-connections page (connections, both of their interfaces,
+the devices, racks and sites those reference) and reports the memory held by the
+registries once the decoded page has been dropped, measured with ``tracemalloc``.
+
+    python benchmarks/bench_memory.py [connections]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
+if ROOT_PATH not in sys.path:
+    sys.path.append( ROOT_PATH )
+
+from classdef.netbox import InterfaceConnection, REGISTRIES
+from benchmarks.synthetic import SyntheticNetbox
+
+
+def run(connections: int = 50000) -> None:
+    body = SyntheticNetbox(connections).page("interface-connections")
+    for cls in REGISTRIES:
+        cls._instances.clear()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    page = json.loads(body, object_hook=InterfaceConnection.jsonToObj)
+    elapsed = time.perf_counter() - start
+    del page
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for cls in REGISTRIES:
+        print(f"{cls.__name__:20} {len(cls._instances):>9,} objects")
+    hydrated = sum(len(cls._instances) for cls in REGISTRIES)
+    print(f"{hydrated:,} objects hold {held / 2**20:,.1f} MiB ({held / hydrated:,.0f} bytes/object),"
+          f" peak {peak / 2**20:,.1f} MiB, hydrated in {elapsed:.1f}s (traced)")
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,192 @@
+""" Benchmark suite of the export pipeline, stage by stage, over synthetic netbox data
+
+For each size, generates a synthetic netbox (``SyntheticNetbox``: sites, racks, devices, interfaces and
+interface-connections with a realistic fan-out) and times each stage of an export on its own,
+the best of ``repeats`` runs:
+
+    decode      ``json.loads`` of the sites, racks, devices and interface-connections pages
+    hydrate     the same pages decoded with ``jsonToObj`` as ``object_hook``, into empty registries
+    registry    hydrating them again, every object is found in its Multiton registry and merged
+    rows        ``InterfaceConnection.getSheetRowData`` of every connection
+    dictmask    ``InterfaceConnection.sheetRowData``, the RowData / CellData construction alone
+    serialize   ``sheet_json.dumps`` of the Spreadsheet holding the rows
+    stash       ``cache_manager.stash`` of the registries to a snapshot
+    unstash     ``cache_manager.unstash`` of the snapshot into empty registries
+    cache_put   ``ResponseCache.put`` of the pages
+    cache_get   ``ResponseCache.get`` of the pages
+
+Results are written as JSON (default ``benchmarks/results/pipeline-<time>.json``), with the python
+version, platform and git commit, so runs can be compared; ``--compare`` prints the ratio of each stage
+to an earlier results file. 1M connections takes several GiB of memory.
+
+    python benchmarks/bench_pipeline.py [--sizes 1000 10000 100000 1000000] [--repeats 3] [--compare OLD.json]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
+if ROOT_PATH not in sys.path:
+    sys.path.append( ROOT_PATH )
+
+from classdef.netbox import InterfaceConnection, Device, Rack, DataCenter, REGISTRIES
+from classdef.sheet import Spreadsheet, SpreadsheetProperties, Sheet, GridData
+from classdef.columnar import ConnectionTable
+from classdef.response_cache import ResponseCache
+from classdef.cache_manager import stash, unstash
+from classdef import sheet_json
+from benchmarks.synthetic import SyntheticNetbox
+
+
+SIZES = (1000, 10000, 100000)
+
+# pages decoded and hydrated, in the order related objects are needed, with the class hydrating them
+PAGES = (("sites", DataCenter), ("racks", Rack), ("devices", Device), ("interface-connections", InterfaceConnection))
+
+RESULTS_PATH = os.path.join(ROOT_PATH, "benchmarks", "results")
+
+
+def clear_registries() -> None:
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def best_of(function: Callable[[], Any], repeats: int, setup: Optional[Callable[[], Any]] = None) -> float:
+    """ Return the least seconds ``function`` took in ``repeats`` runs, ``setup`` runs untimed before each """
+    best = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def hydrate(bodies: Dict[str, bytes]) -> List[InterfaceConnection]:
+    """ Decode every page into objects, return the connections """
+    results = []
+    for kind, cls in PAGES:
+        results = json.loads(bodies[kind], object_hook=cls.jsonToObj)["results"]
+    return results
+
+
+def render_stages(stage: Callable[[str, int, str, float], None], connections: int, repeats: int) -> int:
+    """ Time the rows, dictmask and serialize stages, return the bytes of the spreadsheet
+
+    The rows are only held while this runs, the later stages do not share the memory with them.
+    """
+    linked = [InterfaceConnection._instances[obj_idx] for obj_idx in InterfaceConnection._instances.keys()]
+    stage("rows", connections, "connections", best_of(lambda: [connection.getSheetRowData() for connection in linked], repeats))
+    records = list(ConnectionTable.fromConnections(linked, use_numpy=False).records())
+    rows = []
+    stage("dictmask", connections, "connections", best_of(lambda: rows.extend([InterfaceConnection.sheetRowData(*record) for record in records]), repeats, rows.clear))
+    spreadsheet = Spreadsheet(sheets=[Sheet([GridData(0, 0, rows)])], properties=SpreadsheetProperties(title="bench"))
+    body_size = len(sheet_json.dumps(spreadsheet))
+    stage("serialize", body_size, "bytes", best_of(lambda: sheet_json.dumps(spreadsheet), repeats))
+    return body_size
+
+
+def run_size(connections: int, repeats: int, directory: str) -> Dict[str, Any]:
+    """ Time every stage for ``connections`` connections, return the result of the size """
+    start = time.perf_counter()
+    netbox = SyntheticNetbox(connections)
+    bodies = {kind: netbox.page(kind) for kind, _ in PAGES}
+    generated = time.perf_counter() - start
+    del netbox
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    def stage(name: str, items: int, unit: str, seconds: float) -> None:
+        stages[name] = {"seconds": seconds, "items": items, "unit": unit, "per_second": items / seconds if seconds else None}
+        print(f"{connections:>9} {name:10} {seconds:9.3f}s {items:>10} {unit:11} {stages[name]['per_second'] or 0:>14,.0f}/s", file=sys.stderr)
+
+    page_bytes = sum(len(body) for body in bodies.values())
+    stage("decode", page_bytes, "bytes", best_of(lambda: [json.loads(body) for body in bodies.values()], repeats))
+    stage("hydrate", connections, "connections", best_of(lambda: hydrate(bodies), repeats, clear_registries))
+    objects = {cls.__name__: len(cls._instances) for cls in REGISTRIES}
+    stage("registry", sum(objects.values()), "objects", best_of(lambda: hydrate(bodies), repeats))
+    body_size = render_stages(stage, connections, repeats)
+
+    snapshot = os.path.join(directory, f"snapshot-{connections}.pickle")
+    stage("stash", sum(objects.values()), "objects", best_of(lambda: stash(path=snapshot), repeats))
+    stage("unstash", sum(objects.values()), "objects", best_of(lambda: unstash(path=snapshot), repeats, clear_registries))
+    snapshot_size = os.path.getsize(snapshot)
+    os.remove(snapshot)
+
+    cache = ResponseCache(os.path.join(directory, f"responses-{connections}.sqlite3"))
+    keys = {kind: ResponseCache.key(kind, {"limit": 0}) for kind in bodies}
+    stage("cache_put", page_bytes, "bytes", best_of(lambda: [cache.put(keys[kind], kind, 200, body) for kind, body in bodies.items()], repeats))
+    stage("cache_get", page_bytes, "bytes", best_of(lambda: [cache.get(key).content for key in keys.values()], repeats))
+    cache.connection.close()
+    clear_registries()
+    return {
+        "connections": connections,
+        "objects": objects,
+        "bytes": {"pages": page_bytes, "spreadsheet": body_size, "snapshot": snapshot_size},
+        "generate_seconds": generated,
+        "stages": stages,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """ Print the seconds of each stage against those of ``previous``, >1 is slower now """
+    earlier = {size["connections"]: size["stages"] for size in previous["results"]}
+    print(f"against {previous.get('commit')} of {previous.get('created')}")
+    for size in results["results"]:
+        for name, stage in size["stages"].items():
+            before = earlier.get(size["connections"], {}).get(name)
+            if before and before["seconds"]:
+                print(f"{size['connections']:>9} {name:10} {stage['seconds']:9.3f}s was {before['seconds']:9.3f}s x{stage['seconds'] / before['seconds']:.2f}")
+
+
+def run(sizes: List[int] = SIZES, repeats: int = 3, output: Optional[str] = None, previous: Optional[str] = None) -> Dict[str, Any]:
+    created = datetime.now(timezone.utc)
+    results = {
+        "benchmark": "pipeline",
+        "created": created.isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for connections in sizes:
+            results["results"].append(run_size(connections, repeats, directory))
+    if output is None:
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        output = os.path.join(RESULTS_PATH, f"pipeline-{created.strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+    if previous is not None:
+        with open(previous) as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each stage of the export pipeline over synthetic netbox data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help=f"connections of each run (default {' '.join(map(str, SIZES))})")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of each stage, the fastest is kept (default 3)")
+    parser.add_argument("--output", help="results file, default benchmarks/results/pipeline-<time>.json")
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare with")
+    args = parser.parse_args()
+    run(args.sizes, args.repeats, args.output, args.compare)
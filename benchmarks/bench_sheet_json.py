@@ -0,0 +1,68 @@
+""" Spreadsheet request body encoding, ``json.dumps`` against ``classdef.sheet_json``
+
+Builds a Spreadsheet of one GridData holding synthetic connection rows (as ``InterfaceConnection.sheetRowData``
+renders them) and reports the time and peak memory (``tracemalloc``) of encoding it with ``json.dumps``
+and of writing it with ``sheet_json.dump`` to a file. ``tests/test_sheet_json.py`` checks the two decode to the same body.
+
+    python benchmarks/bench_sheet_json.py [rows] [repeats]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+
+ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
+if ROOT_PATH not in sys.path:
+    sys.path.append( ROOT_PATH )
+
+from classdef.netbox import InterfaceConnection
+from classdef.sheet import Spreadsheet, SpreadsheetProperties, Sheet, GridData
+from classdef import sheet_json
+
+
+def spreadsheet(rows: int) -> Spreadsheet:
+    """ Return a Spreadsheet of ``rows`` connection rows, spread over 40 racks of 40 devices """
+    row_data = []
+    for row in range(rows):
+        device_a, device_b = row % 1600, (row * 7 + 3) % 1600
+        row_data.append(InterfaceConnection.sheetRowData(
+            row % 5 != 0,
+            f"eth{row % 48}", f"dev{device_a}", device_a % 40 or None, f"R{device_a // 40}",
+            f"xe-0/0/{row % 48}", f"dev{device_b}", device_b % 40 or None, f"R{device_b // 40}",
+        ))
+    return Spreadsheet(sheets=[Sheet([GridData(0, 0, row_data)])], properties=SpreadsheetProperties(title="bench"))
+
+
+def run(rows: int = 100000, repeats: int = 3) -> None:
+    ss = spreadsheet(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "body.json")
+
+        def json_dumps() -> None:
+            with open(path, "w") as f:
+                f.write(json.dumps(ss))
+
+        def sheet_json_dump() -> None:
+            with open(path, "w") as f:
+                sheet_json.dump(ss, f)
+
+        for label, function in (("json.dumps", json_dumps), ("sheet_json.dump", sheet_json_dump)):
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                function()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            body_size = os.path.getsize(path)
+            print(f"{label:16} {rows} rows in {best:.3f}s -> {rows / best:,.0f} rows/s,"
+                  f" {body_size / 2**20:,.1f} MiB body, peak {peak / 2**20:,.1f} MiB (traced)")
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
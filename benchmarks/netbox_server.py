@@ -0,0 +1,351 @@
+""" Local netbox stand-in, for load and latency testing of the fetch layer
+
+Serves the ``/dcim/interface-connections/``, ``/dcim/interfaces/``, ``/dcim/devices/``, ``/dcim/racks/``
+and ``/dcim/sites/`` endpoints (list and ``<id>/`` detail) from ``SyntheticNetbox`` fixtures, paginated as
+netbox does (``count`` / ``next`` / ``previous``, ``limit`` / ``offset``) and filtered by the parameters
+the exporter sends: ``id``, ``id__in``, ``slug``, ``site``, ``site_id``, ``rack_id``, ``device``, ``device_id``, ``q``
+and ``last_updated__gte``. Repeated parameters match any of their values, different parameters must all match.
+``brief`` is accepted and ignored, records are always served in full.
+
+Latency (fixed plus random jitter), an error rate and a request rate limit (token bucket, 429 with
+``Retry-After`` when exceeded) can be injected. ``/_stats/`` returns the requests served by status and endpoint.
+
+Point the exporter at it with the ``NETBOX_BASE_URL`` environment variable, and ``NETBOX_CACHE_DIR`` so its
+responses are cached apart from those of the real netbox (or ``NetboxRequest.configure(base_url=..., cache_dir=...)``):
+
+    python benchmarks/netbox_server.py --connections 100000 --port 8000 --latency 50 --jitter 25 --error-rate 0.01
+    NETBOX_BASE_URL=http://127.0.0.1:8000/api NETBOX_CACHE_DIR=/tmp/standin python main.py --site site1 --dry-run
+
+or in process:
+
+    server = NetboxServer(SyntheticNetbox(10000), latency=0.05)
+    NetboxRequest.configure(base_url=server.start(), cache_dir=tempfile.mkdtemp())
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlencode, urlsplit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
+if ROOT_PATH not in sys.path:
+    sys.path.append( ROOT_PATH )
+
+from benchmarks.synthetic import SyntheticNetbox
+
+
+API_PREFIX = "/api"
+
+KINDS = ("interface-connections", "interfaces", "devices", "racks", "sites")
+
+# page size when the request has no ``limit``, and the largest served, as netbox's PAGINATE_COUNT and MAX_PAGE_SIZE
+PAGINATE_COUNT: int = 50
+MAX_PAGE_SIZE: int = 1000
+
+# filtered result lists kept, so paging through a large result does not filter it again for every page
+FILTER_CACHE_SIZE: int = 64
+
+
+class TokenBucket:
+    """ Allows ``rate`` requests per second on average, in bursts of up to ``burst`` """
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        """ Init """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """ Take a token, return 0, or the seconds until one is available when there is none """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class StandInNetbox:
+    """ The records of a ``SyntheticNetbox`` with netbox's filtering and pagination """
+
+    def __init__(self, netbox: SyntheticNetbox) -> None:
+        """ Init, indexes the records by id and the site and rack of each device """
+        self.records: Dict[str, List[Dict[str, Any]]] = {kind: netbox.records(kind) for kind in KINDS}
+        self.by_id: Dict[str, Dict[int, Dict[str, Any]]] = {kind: {record["id"]: record for record in records}
+                                                            for kind, records in self.records.items()}
+        self.device_site: Dict[int, Tuple[int, str]] = {device["id"]: (device["site"]["id"], device["site"]["slug"])
+                                                         for device in self.records["devices"]}
+        self._filtered: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def devices(self, kind: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """ Return the (brief) devices a record belongs to, both sides of a connection """
+        if kind == "interface-connections":
+            return [record["interface_a"]["device"], record["interface_b"]["device"]]
+        if kind == "interfaces":
+            return [record["device"]]
+        if kind == "devices":
+            return [record]
+        return []
+
+    def sites(self, kind: str, record: Dict[str, Any]) -> List[Tuple[int, str]]:
+        """ Return the (id, slug) of the sites a record belongs to """
+        if kind == "sites":
+            return [(record["id"], record["slug"])]
+        if kind == "racks":
+            return [(record["site"]["id"], record["site"]["slug"])]
+        return [self.device_site[device["id"]] for device in self.devices(kind, record)]
+
+    def matcher(self, kind: str, name: str, values: List[str]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+        """ Return the test of filter parameter ``name``, None for parameters netbox would ignore """
+        if name == "site_id":
+            ids = {int(value) for value in values}
+            return lambda record: any(site_id in ids for site_id, _ in self.sites(kind, record))
+        if name == "site":
+            slugs = set(values)
+            return lambda record: any(slug in slugs for _, slug in self.sites(kind, record))
+        if name == "slug" and kind == "sites":
+            slugs = set(values)
+            return lambda record: record["slug"] in slugs
+        if name == "rack_id" and kind == "devices":
+            ids = {int(value) for value in values}
+            return lambda record: record["rack"] is not None and record["rack"]["id"] in ids
+        if name == "device_id" and kind in ("interfaces", "interface-connections"):
+            ids = {int(value) for value in values}
+            return lambda record: any(device["id"] in ids for device in self.devices(kind, record))
+        if name == "device" and kind in ("interfaces", "interface-connections"):
+            names = set(values)
+            return lambda record: any(device["name"] in names for device in self.devices(kind, record))
+        if name == "q":
+            text = values[0].lower()
+            return lambda record: text in (record.get("name") or "").lower()
+        if name == "last_updated__gte":
+            return lambda record: (record.get("last_updated") or "") >= values[0]
+        return None
+
+    def filter(self, kind: str, parameters: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """ Return the records of ``kind`` matching every filter of ``parameters`` """
+        criteria = tuple(sorted((name, tuple(values)) for name, values in parameters.items() if name not in ("limit", "offset", "brief")))
+        # endpoints share filter parameters (eg: ``site``), not their results
+        cache_key = (kind, criteria)
+        with self._lock:
+            if cache_key in self._filtered:
+                self._filtered.move_to_end(cache_key)
+                return self._filtered[cache_key]
+        ids = [int(value) for name in ("id", "id__in") for values in parameters.get(name, ()) for value in values.split(",") if value]
+        if ids:
+            records = [self.by_id[kind][record_id] for record_id in sorted(set(ids)) if record_id in self.by_id[kind]]
+        else:
+            records = self.records[kind]
+        for name, values in criteria:
+            test = self.matcher(kind, name, list(values))
+            if test is not None:
+                records = [record for record in records if test(record)]
+        with self._lock:
+            self._filtered[cache_key] = records
+            if len(self._filtered) > FILTER_CACHE_SIZE:
+                self._filtered.popitem(last=False)
+        return records
+
+    def page(self, kind: str, parameters: Dict[str, List[str]], url: str) -> Dict[str, Any]:
+        """ Return the list page of ``kind`` for the query ``parameters``, ``url`` is the endpoint's url for next / previous """
+        records = self.filter(kind, parameters)
+        limit = int(parameters.get("limit", [PAGINATE_COUNT])[0]) or MAX_PAGE_SIZE
+        limit = min(limit, MAX_PAGE_SIZE)
+        offset = int(parameters.get("offset", [0])[0])
+
+        def link(link_offset: int) -> str:
+            query = [(name, value) for name, values in parameters.items() if name not in ("limit", "offset") for value in values]
+            return f"{url}?{urlencode(query + [('limit', limit), ('offset', link_offset)])}"
+
+        return {
+            "count": len(records),
+            "next": link(offset + limit) if offset + limit < len(records) else None,
+            "previous": link(max(0, offset - limit)) if offset > 0 else None,
+            "results": records[offset:offset + limit],
+        }
+
+    def detail(self, kind: str, record_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id[kind].get(record_id)
+
+
+class NetboxHandler(BaseHTTPRequestHandler):
+    """ Serves one request of a ``NetboxServer`` """
+
+    server: "NetboxServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/_stats/":
+            return self.send_json(200, self.server.stats())
+        parts = url.path[len(API_PREFIX):].strip("/").split("/") if url.path.startswith(API_PREFIX + "/") else []
+        if len(parts) not in (2, 3) or parts[0] != "dcim" or parts[1] not in KINDS or (len(parts) == 3 and not parts[2].isdigit()):
+            return self.respond(url.path, 404, {"detail": "Not found."})
+        kind = parts[1]
+        wait = self.server.rate_limiter.take() if self.server.rate_limiter is not None else 0.0
+        if wait:
+            return self.respond(kind, 429, {"detail": f"Request was throttled. Expected available in {wait:.0f} seconds."},
+                                {"Retry-After": str(max(1, round(wait)))})
+        self.server.delay()
+        if self.server.fail():
+            return self.respond(kind, self.server.error_status, {"detail": "injected error"})
+        if len(parts) == 3:
+            record = self.server.netbox.detail(kind, int(parts[2]))
+            if record is None:
+                return self.respond(kind, 404, {"detail": "Not found."})
+            return self.respond(kind, 200, record)
+        endpoint_url = f"http://{self.headers.get('Host', '%s:%s' % self.server.server_address[:2])}{url.path}"
+        self.respond(kind, 200, self.server.netbox.page(kind, parse_qs(url.query), endpoint_url))
+
+    def respond(self, endpoint: str, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self.server.count(endpoint, status)
+        self.send_json(status, body, headers)
+
+
+class NetboxServer(ThreadingHTTPServer):
+    """ HTTP server of a ``StandInNetbox``, each request handled on its own thread
+
+    latency : float
+        seconds every request waits before it is answered
+    jitter : float
+        up to this many seconds more, uniformly random
+    error_rate : float
+        fraction of requests answered ``error_status`` instead
+    rate_limit : float
+        requests per second allowed (in bursts of ``burst``), others are answered 429; None for no limit
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 netbox: SyntheticNetbox,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 rate_limit: Optional[float] = None,
+                 burst: Optional[int] = None,
+                 seed: int = 0,
+                 verbose: bool = False) -> None:
+        """ Init, binds ``host``:``port`` (0 for any free port) """
+        super().__init__((host, port), NetboxHandler)
+        self.netbox = StandInNetbox(netbox)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.verbose = verbose
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def random(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    def delay(self) -> None:
+        """ Wait the injected latency """
+        seconds = self.latency + (self.jitter * self.random() if self.jitter else 0.0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def fail(self) -> bool:
+        """ Return True for the requests to answer with an injected error """
+        return self.error_rate > 0 and self.random() < self.error_rate
+
+    def count(self, endpoint: str, status: int) -> None:
+        with self._counts_lock:
+            self._counts[(endpoint, status)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """ Return the requests served, in total, by status and by endpoint and status """
+        with self._counts_lock:
+            counts = dict(self._counts)
+        by_status: Counter = Counter()
+        by_endpoint: Dict[str, Dict[str, int]] = {}
+        for (endpoint, status), count in counts.items():
+            by_status[str(status)] += count
+            by_endpoint.setdefault(endpoint, {})[str(status)] = count
+        return {"requests": sum(counts.values()), "status": dict(by_status), "endpoints": by_endpoint}
+
+    def start(self) -> str:
+        """ Serve on a background thread, return the base url """
+        self._thread = threading.Thread(target=self.serve_forever, name="NetboxServer", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve synthetic netbox data for load and latency testing")
+    parser.add_argument("--connections", type=int, default=10000, help="interface connections generated (default 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated data and the injected faults")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="0 for any free port (default 8000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds every request waits")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many random milliseconds more")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503, help="status of injected errors (default 503)")
+    parser.add_argument("--rate-limit", type=float, help="requests per second allowed, others are answered 429")
+    parser.add_argument("--burst", type=int, help="requests allowed at once by --rate-limit (default the rate)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    netbox = SyntheticNetbox(args.connections, seed=args.seed)
+    server = NetboxServer(netbox, args.host, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate,
+                          args.error_status, args.rate_limit, args.burst, args.seed, args.verbose)
+    print(f"generated {args.connections} connections in {time.perf_counter() - start:.1f}s,"
+          f" sites {', '.join(site['slug'] for site in netbox.sites[:5])}{' ...' if len(netbox.sites) > 5 else ''}")
+    print(f"NETBOX_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
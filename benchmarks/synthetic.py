@@ -0,0 +1,117 @@
+""" Synthetic netbox data for benchmarks
+
+Generates netbox shaped JSON (sites, racks, devices, interfaces, interface-connections)
+for a requested number of connections, with a fixed fan-out of racks per site,
+devices per rack and interfaces per device. Output is deterministic for a seed.
+"""
+import json
+import math
+import random
+from typing import Any, Dict, List
+
+
+BASE_URL = "https://netbox.example/api"
+
+FORM_FACTORS = [
+    {"value": 1000, "label": "1000BASE-T (1GE)"},
+    {"value": 1200, "label": "SFP+ (10GE)"},
+    {"value": 1350, "label": "QSFP28 (100GE)"},
+]
+CONNECTION_STATUSES = [
+    {"value": True, "label": "Connected"},
+    {"value": False, "label": "Planned"},
+]
+LAST_UPDATED = "2018-06-01T00:00:00.000000Z"
+
+
+class SyntheticNetbox:
+    """ Generated netbox records, each list holds full records as the list endpoints return them
+
+    connections : int
+        number of interface connections, each uses two interfaces on different devices
+    """
+
+    def __init__(self,
+                 connections: int,
+                 seed: int = 0,
+                 racks_per_site: int = 40,
+                 devices_per_rack: int = 20,
+                 interfaces_per_device: int = 48) -> None:
+        """ Generate """
+        rng = random.Random(seed)
+        interface_count = connections * 2
+        device_count = max(2, math.ceil(interface_count / interfaces_per_device))
+        rack_count = math.ceil(device_count / devices_per_rack)
+        site_count = math.ceil(rack_count / racks_per_site)
+
+        self.sites: List[Dict[str, Any]] = [self.site(site_id) for site_id in range(1, site_count + 1)]
+        self.racks: List[Dict[str, Any]] = [self.rack(rack_id, self.sites[(rack_id - 1) // racks_per_site])
+                                             for rack_id in range(1, rack_count + 1)]
+        self.devices: List[Dict[str, Any]] = [self.device(device_id, self.racks[(device_id - 1) // devices_per_rack], rng)
+                                               for device_id in range(1, device_count + 1)]
+        self.interfaces: List[Dict[str, Any]] = [self.interface(interface_id, self.devices[(interface_id - 1) // interfaces_per_device], rng)
+                                                  for interface_id in range(1, device_count * interfaces_per_device + 1)]
+        # pair interfaces of different devices, a device's ports are spread over many peers
+        order = list(range(interface_count))
+        rng.shuffle(order)
+        self.interface_connections: List[Dict[str, Any]] = []
+        for connection_id in range(1, connections + 1):
+            a, b = order[2 * connection_id - 2], order[2 * connection_id - 1]
+            if self.interfaces[a]["device"]["id"] == self.interfaces[b]["device"]["id"]:
+                b = (b + interfaces_per_device) % len(self.interfaces)
+            self.interface_connections.append({
+                "id": connection_id,
+                "interface_a": self.interfaces[a],
+                "interface_b": self.interfaces[b],
+                "connection_status": dict(rng.choice(CONNECTION_STATUSES)),
+                "last_updated": LAST_UPDATED,
+            })
+
+    @staticmethod
+    def brief(kind: str, record: Dict[str, Any], *fields: str) -> Dict[str, Any]:
+        """ Return the nested (brief) representation of ``record`` """
+        brief = {"id": record["id"], "url": f"{BASE_URL}/dcim/{kind}/{record['id']}/"}
+        brief.update({field: record[field] for field in fields})
+        return brief
+
+    def site(self, site_id: int) -> Dict[str, Any]:
+        return {"id": site_id, "url": f"{BASE_URL}/dcim/sites/{site_id}/", "name": f"site{site_id}", "slug": f"site{site_id}",
+                "physical_address": f"{site_id} Example Road", "last_updated": LAST_UPDATED}
+
+    def rack(self, rack_id: int, site: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": rack_id, "url": f"{BASE_URL}/dcim/racks/{rack_id}/", "name": f"R{rack_id:05d}", "display_name": f"R{rack_id:05d}",
+                "facility_id": None, "u_height": 42, "site": self.brief("sites", site, "name", "slug"), "last_updated": LAST_UPDATED}
+
+    def device(self, device_id: int, rack: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        name = f"{rng.choice(['sw', 'rtr', 'srv', 'fw'])}-{device_id:06d}"
+        return {"id": device_id, "url": f"{BASE_URL}/dcim/devices/{device_id}/", "name": name, "display_name": name,
+                "device_type": {"id": 1, "url": f"{BASE_URL}/dcim/device-types/1/", "model": "generic"},
+                "asset_tag": None, "position": rng.randint(1, 42), "parent_device": None,
+                "site": rack["site"], "rack": self.brief("racks", rack, "name", "display_name"), "last_updated": LAST_UPDATED}
+
+    def interface(self, interface_id: int, device: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        return {"id": interface_id, "url": f"{BASE_URL}/dcim/interfaces/{interface_id}/", "name": f"eth{interface_id % 64}",
+                "device": self.brief("devices", device, "name", "display_name"),
+                "form_factor": dict(rng.choice(FORM_FACTORS)), "enabled": True, "lag": None, "mtu": None,
+                "mac_address": None, "mgmt_only": False, "description": "", "last_updated": LAST_UPDATED}
+
+    def records(self, kind: str) -> List[Dict[str, Any]]:
+        """ Return the records served by the ``/dcim/<kind>/`` endpoint """
+        return {
+            "sites":                 self.sites,
+            "racks":                 self.racks,
+            "devices":               self.devices,
+            "interfaces":            self.interfaces,
+            "interface-connections": self.interface_connections,
+        }[kind]
+
+    def page(self, kind: str, offset: int = 0, limit: int = None) -> bytes:
+        """ Return a list endpoint page of ``kind`` as netbox serves it """
+        records = self.records(kind)
+        limit = limit if limit is not None else len(records)
+        return json.dumps({
+            "count": len(records),
+            "next": None,
+            "previous": None,
+            "results": records[offset:offset + limit],
+        }).encode()
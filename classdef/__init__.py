@@ -7,9 +7,13 @@ ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
 if ROOT_PATH not in sys.path:
     sys.path.append( ROOT_PATH )
 
-from .sheet import Spreadsheet, SpreadsheetProperties, ExtendedValue, GridRange, Color, CellData, RowData, GridData, BandingProperties, BandedRange, DictMask, ConditionalFormatRule, ProtectedRange, BasicFilter, FilterView, EmbeddedChart, NamedRange, DimensionGroup, DeveloperMetadata, Sheet
-from .netbox import Interface, InterfaceConnection, Device, Rack, DataCenter, NetboxRequest, NetboxQuery
+from .sheet import Spreadsheet, SpreadsheetProperties, ExtendedValue, GridRange, Color, CellData, RowData, GridData, BandingProperties, BandedRange, DictMask, ConditionalFormatRule, ProtectedRange, BasicFilter, FilterView, EmbeddedChart, NamedRange, DimensionGroup, DeveloperMetadata, Sheet, SheetProperties, GridProperties
+from .netbox import Interface, InterfaceConnection, Device, Rack, DataCenter, NetboxRequest, NetboxQuery, registry_stats, set_weak_registries
 from .cache_manager import stash, unstash
+from .prefetch import prefetch_related
+from .session import NetboxSession
+from .sync import IncrementalSync
+from .columnar import ConnectionTable
 
 
 __all__ = [
@@ -33,6 +37,8 @@ __all__ = [
     "DimensionGroup",
     "DeveloperMetadata",
     "Sheet",
+    "SheetProperties",
+    "GridProperties",
     "Interface",
     "InterfaceConnection",
     "Device",
@@ -41,5 +47,11 @@ __all__ = [
     "stash",
     "unstash",
     "NetboxRequest",
-    "NetboxQuery"
+    "NetboxQuery",
+    "registry_stats",
+    "set_weak_registries",
+    "prefetch_related",
+    "NetboxSession",
+    "IncrementalSync",
+    "ConnectionTable"
 ]
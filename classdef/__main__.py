@@ -0,0 +1,22 @@
+""" Command line entry point for classdef maintenance commands
+
+    python -m classdef cache stats|purge [options]
+"""
+import sys
+
+COMMANDS = {
+    "cache": "classdef.response_cache",
+}
+
+
+def main() -> None:
+    """ Dispatch ``python -m classdef <command>`` to the command's module ``main`` """
+    import importlib
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"usage: python -m classdef {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
-""" CacheManager manages object , class caching """
+""" CacheManager manages object , class caching
 
-from typing import Dict, Type, List, Optional, Union, cast
+``stash`` writes every registered netbox object into one snapshot file, ``unstash`` restores them
+into the Multiton registries in a single load, so a warm start needs no requests at all.
+
+The snapshot is one pickle stream, so an object referenced from several places (eg: a Device from each of
+its Interfaces) is stored once and comes back as one object. It is preceded by a header recording
+``SNAPSHOT_VERSION`` and the slots of each class, a snapshot written by a different layout is stale and ignored.
+"""
+
+from typing import Dict, Type, List, Optional, Union, Tuple
+import copyreg
+import mmap
+import pickle
 import sys
 import os
+import time
+from logging import getLogger
 from .print_color import Print
 from .netbox import *
 
@@ -11,84 +24,94 @@ ROOT_PATH = os.path.abspath( os.path.join( __file__, "..", ".." ) )
 if ROOT_PATH not in sys.path:
     sys.path.append( ROOT_PATH )
 
+debug = getLogger().debug
+
+
+# bump when the snapshot format changes, snapshots of another version are not loaded
+SNAPSHOT_VERSION: int = 1
+
+# file in ``NetboxRequest.cache_dir`` holding the snapshot
+snapshot_file_name: str = "snapshot.pickle"
+
 
 def get_cachable_classes() -> Dict[str, Type]:
     """ Return class objects which are cachable by CacheManager """
-    import inspect
-    # print(sys.modules)
-    # print(sys.modules["classdef.netbox"])
-    classdict: Dict[str, Type] = {}
-    for name, cls in inspect.getmembers(sys.modules["classdef.netbox"]):
-        print( f"{inspect.isclass(cls)} and {cls.__module__ if hasattr(cls, 'module') else None} == 'classdef.netbox' and {hasattr(cls, '_instances')}" )
-        if inspect.isclass(cls) and cls.__module__ == "classdef.netbox" and hasattr(cls, "_instances"):
-            print(f"cls={cls} module={cls.__module__}")
-            classdict[name] = cls
-    Print.green_bg(classdict)
-    return classdict
-
-
-def stash(objects: Union[List[Type], None, Type] = None) -> None:
-    """ Pickle all classdef.netbox objects to minimize lookups"""
-    import pickle
-    if objects is None:
-        objects = list(get_cachable_classes().values())
-    if not isinstance(objects, list):
-        objects = [objects]
-    Print.magenta_bg(f"pickling found {len(objects)}")
+    return {cls.__name__: cls for cls in REGISTRIES}
+
+
+def snapshot_path() -> str:
+    return os.path.join( NetboxRequest.cache_dir, snapshot_file_name )
+
+
+def snapshot_layout(objects: List[Type]) -> Dict[str, Tuple[str, ...]]:
+    """ Return the slots of each class, a snapshot only matches classes with the same layout """
+    return {cls.__name__: cls.slotNames() for cls in objects}
 
-    for cls in objects:
-        pkl_file_name = os.path.join(ROOT_PATH, f'cache_{cls.__name__}.pkl')
-        with open(os.path.join(ROOT_PATH, f'cache_{cls.__name__}.pkl'), 'wb') as f:
-            # Pickle using the highest protocol available.
-            Print.magenta_bg(f"pickling {cls.__name__} into {pkl_file_name}")
-            pickle.dump(cls._instances, f, pickle.HIGHEST_PROTOCOL)
-            print(f"pickle of {cls.__name__} is complete")
-            # Print.red_bg(f"pickle file invalid {cls.__name__} from {pkl_file_name}")
 
+def reduce_object(obj: NetboxData) -> Tuple:
+    """ Pickle ``obj`` as a bare instance and its slots, unpickling then runs no python code per object """
+    return (object.__new__, (type(obj),), obj.__getstate__())
 
 
+class SnapshotPickler(pickle.Pickler):
+    """ Pickler of registered objects, without going through ``Multiton.__new__`` when loaded """
 
+    dispatch_table = {**copyreg.dispatch_table, **{cls: reduce_object for cls in REGISTRIES}}
 
 
-def unstash(objects: Union[List[Type], None, Type] = None) -> None:
-    """ Unpickle all classdef.netbox objects to minimize lookups"""
-    import pickle
+def stash(objects: Union[List[Type], None, Type] = None, path: Optional[str] = None) -> str:
+    """ Snapshot the registries of ``objects`` (default every netbox class) and the objects they reference, return the path """
     if objects is None:
         objects = list(get_cachable_classes().values())
     if not isinstance(objects, list):
         objects = [objects]
-
+    path = path or snapshot_path()
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "layout": snapshot_layout(objects),
+        "created": time.time(),
+    }
+    graph = {cls.__name__: cls._instances.values() for cls in objects}
+    # written next to the snapshot and then moved over it, a reader never sees a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickler = SnapshotPickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.dump(header)
+        pickler.dump(graph)
+    os.replace(tmp_path, path)
+    debug(f"stashed {sum(len(registry) for registry in graph.values())} objects into {path}")
+    return path
+
+
+def unstash(objects: Union[List[Type], None, Type] = None, path: Optional[str] = None) -> bool:
+    """ Restore the registries of ``objects`` (default every netbox class) from the snapshot
+
+    Restored objects replace registered objects with the same index, so this is meant for before anything is hydrated.
+    Return False if there is no snapshot or it is stale.
+    """
+    if objects is None:
+        objects = list(get_cachable_classes().values())
+    if not isinstance(objects, list):
+        objects = [objects]
+    path = path or snapshot_path()
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        unpickler = pickle.Unpickler(mm)
+        try:
+            header = unpickler.load()
+        except (pickle.UnpicklingError, EOFError):
+            Print.red_bg(f"snapshot file invalid {path}")
+            return False
+        if type(header) is not dict or header.get("version") != SNAPSHOT_VERSION:
+            Print.red(f"snapshot {path} is stale, version {header.get('version') if type(header) is dict else None} != {SNAPSHOT_VERSION}")
+            return False
+        layout = snapshot_layout(objects)
+        if any(header["layout"].get(name) != slots for name, slots in layout.items()):
+            Print.red(f"snapshot {path} is stale, the object layout has changed since it was written")
+            return False
+        graph: Dict[str, List[NetboxData]] = unpickler.load()
     for cls in objects:
-        pkl_file_name = os.path.join(ROOT_PATH, f'cache_{cls.__name__}.pkl')
-        if os.path.isfile(pkl_file_name):
-            with open(pkl_file_name, 'rb') as f:
-                # Pickle using the highest protocol available.
-                try:
-                    # cls = pickle.load(f)
-                    
-                    # load into cls._instances
-                    print(f"loading...{cls.__name__} from {pkl_file_name}")
-                    pickle.load(f)
-                except EOFError:
-                    Print.red_bg(f"pickle file invalid {cls.__name__} from {pkl_file_name}")
-    print("------Datacenter------")
-    print(DataCenter._instances)
-    print("------Rack------")
-    print(Rack._instances)
-    print("------Device------")
-    print(Device._instances)
-    print("------InterfaceConnection------")
-    print(InterfaceConnection._instances)
-    input("press [Enter] to continue")
-
-# def unstash(name, value) -> None:
-#     """ Unpickle all classdef.netbox objects to minimize lookups"""
-#     import pickle
-#     for cls in objects:
-#         pkl_file_name = os.path.join(ROOT_PATH, f'cache_{cls.__name__}.pkl')
-#         if os.path.isfile(pkl_file_name):
-#             with open(pkl_file_name, 'rb') as f:
-#                 # Pickle using the highest protocol available.
-#                 # cls = pickle.load(f)
-#                 print(f"loading...{cls.__name__} from {pkl_file_name}")
-#                 print(pickle.load(f, encoding="bytes"))
+        cls._instances.update((obj.obj_idx, obj) for obj in graph.get(cls.__name__, ()))
+    debug(f"unstashed {sum(len(registry) for registry in graph.values())} objects from {path}, written {time.ctime(header['created'])}")
+    return True
@@ -0,0 +1,234 @@
+""" Columnar representation of InterfaceConnections
+
+Walking ``connection.interface_a.device.rack.name`` for every connection, for every filter and every export,
+is slow for large sites. ``ConnectionTable`` walks the object graph once, joining the interface, device, rack
+and site of both sides of each connection into flat integer columns: ids, rack units, and names dictionary
+encoded as integer codes. Filters then compare integers and sheet rows are built from the columns
+without touching the objects again.
+
+Columns are NumPy arrays when NumPy is installed, so filters are vectorized, ``array.array`` otherwise.
+
+    table = ConnectionTable.fromConnections(InterfaceConnection.getInterfaceConnections(data_center="hkg1"))
+    rows = list(table.select(rack="R12", connected=True).rows())
+"""
+
+from array import array
+from itertools import compress
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .netbox import NetboxData, InterfaceConnection, Interface, Device, Rack, DataCenter
+from .sheet import RowData
+from .metrics import ROWS
+
+
+# value of integer columns where the object graph has nothing, eg: the rack unit of an unracked device
+NULL: int = -1
+
+SIDES = ("a", "b")
+
+# columns of each side of a connection, ``<column>_a`` and ``<column>_b``; names are string codes
+SIDE_COLUMNS = ("interface_id", "interface", "device_id", "device", "rack_unit", "rack_id", "rack", "site_id", "site")
+STRING_COLUMNS = ("interface", "device", "rack", "site")
+
+# values of a sheet row, the arguments of ``InterfaceConnection.sheetRowData``
+RECORD_FIELDS = ("connected",) + tuple(f"{column}_{side}" for side in SIDES for column in ("interface", "device", "rack_unit", "rack"))
+
+COLUMNS = ("id", "connected") + tuple(f"{column}_{side}" for side in SIDES for column in SIDE_COLUMNS)
+
+# filterable object kinds, the class accepted and the columns holding its id and name
+FILTERS = {
+    "site":   DataCenter,
+    "rack":   Rack,
+    "device": Device,
+}
+
+Criteria = Union[None, str, int, NetboxData, Iterable[Union[str, int, NetboxData]]]
+
+
+class StringDictionary:
+    """ Dictionary encoding of the names in a ``ConnectionTable``, code 0 is None """
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self) -> None:
+        """ Init """
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+
+    def encode(self, value: Optional[str]) -> int:
+        """ Return the code of ``value``, adding it if it is new """
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value: Optional[str]) -> Optional[int]:
+        """ Return the code of ``value``, None if no row has it """
+        return self.codes.get(value)
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def follow(obj: Optional[NetboxData], attr: str, cls: type) -> Optional[NetboxData]:
+    """ Return the related ``cls`` object at ``obj.<attr>``, loading it through the lazy property only if it is not loaded yet """
+    if obj is None:
+        return None
+    value = getattr(obj, f"_{attr}", None)
+    if type(value) is not cls:
+        value = getattr(obj, attr)
+    return value if type(value) is cls else None
+
+
+class ConnectionTable:
+    """ InterfaceConnections as columns
+
+    columns : Dict[str, Sequence[int]]
+        ``COLUMNS`` by name, each as long as the table
+    strings : StringDictionary
+        decodes the name columns, shared by the tables ``select`` returns
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[int]], strings: StringDictionary) -> None:
+        """ Init """
+        self.columns = columns
+        self.strings = strings
+
+    @classmethod
+    def fromConnections(cls, connections: Iterable[InterfaceConnection], use_numpy: Optional[bool] = None) -> "ConnectionTable":
+        """ Join the interfaces, devices, racks and sites of ``connections`` into a table
+
+        Related objects which are not loaded yet are loaded as ``getSheetRowData`` would,
+        resolve them in bulk first (``prefetch_related``, the default of ``getInterfaceConnections``).
+
+        use_numpy : bool
+            store the columns as NumPy arrays, default when NumPy is installed
+        """
+        strings = StringDictionary()
+        columns = {name: array("q") for name in COLUMNS}
+        connection_ids, connected = columns["id"], columns["connected"]
+        sides = [{column: columns[f"{column}_{side}"] for column in SIDE_COLUMNS} for side in SIDES]
+        for connection in connections:
+            connection_ids.append(connection.id)
+            status = connection.connection_status
+            connected.append(1 if status is not None and status["value"] is True else 0)
+            for side, side_columns in zip(SIDES, sides):
+                interface = follow(connection, f"interface_{side}", Interface)
+                device = follow(interface, "device", Device)
+                rack = follow(device, "rack", Rack)
+                site = follow(device, "datacenter", DataCenter) or follow(rack, "datacenter", DataCenter)
+                rack_unit = device.rack_unit if device is not None else None
+                side_columns["interface_id"].append(interface.id if interface is not None else NULL)
+                side_columns["interface"].append(strings.encode(interface.name if interface is not None else None))
+                side_columns["device_id"].append(device.id if device is not None else NULL)
+                side_columns["device"].append(strings.encode(device.name if device is not None else None))
+                side_columns["rack_unit"].append(rack_unit if type(rack_unit) is int else NULL)
+                side_columns["rack_id"].append(rack.id if rack is not None else NULL)
+                side_columns["rack"].append(strings.encode(rack.name if rack is not None else None))
+                side_columns["site_id"].append(site.id if site is not None else NULL)
+                side_columns["site"].append(strings.encode((site.slug or site.name) if site is not None else None))
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy:
+            columns = {name: numpy.frombuffer(column, dtype=numpy.int64) for name, column in columns.items()}
+        return cls(columns, strings)
+
+    @property
+    def is_numpy(self) -> bool:
+        return numpy is not None and isinstance(self.columns["id"], numpy.ndarray)
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def values(self, name: str) -> List[Any]:
+        """ Return column ``name`` as python values, names decoded and ``NULL`` as None """
+        column = self.columns[name]
+        if self.is_numpy:
+            column = column.tolist()
+        if name.rsplit("_", 1)[0] in STRING_COLUMNS:
+            decode = self.strings.values
+            return [decode[code] for code in column]
+        return [None if value == NULL else value for value in column]
+
+    def isin(self, name: str, keys: Iterable[int]) -> Sequence[bool]:
+        """ Return the mask of rows whose column ``name`` is one of ``keys`` """
+        if self.is_numpy:
+            return numpy.isin(self.columns[name], numpy.fromiter(keys, dtype=numpy.int64))
+        keys = set(keys)
+        return [value in keys for value in self.columns[name]]
+
+    def combine(self, first: Optional[Sequence[bool]], second: Sequence[bool], both: bool) -> Sequence[bool]:
+        """ Return ``first & second`` (or ``first | second`` when not ``both``), ``first`` None is all True """
+        if first is None:
+            return second
+        if self.is_numpy:
+            return first & second if both else first | second
+        if both:
+            return [x and y for x, y in zip(first, second)]
+        return [x or y for x, y in zip(first, second)]
+
+    def match(self, kind: str, criteria: Criteria) -> Sequence[bool]:
+        """ Return the mask of rows with either side in a ``kind`` (site, rack or device) of ``criteria``
+
+        criteria is a model object, an id or a name (a slug for sites), or an iterable of them
+        """
+        cls = FILTERS[kind]
+        if isinstance(criteria, (str, int, NetboxData)):
+            criteria = [criteria]
+        ids: List[int] = []
+        codes: List[int] = []
+        for value in criteria:
+            if isinstance(value, cls):
+                ids.append(value.id)
+            elif type(value) is int:
+                ids.append(value)
+            elif type(value) is str:
+                code = self.strings.code(value)
+                if code is not None:
+                    codes.append(code)
+            else:
+                raise TypeError(f"{kind} filter accepts {cls.__name__}, int or str, not {type(value).__name__}")
+        mask = None
+        for side in SIDES:
+            mask = self.combine(mask, self.isin(f"{kind}_id_{side}", ids), both=False)
+            mask = self.combine(mask, self.isin(f"{kind}_{side}", codes), both=False)
+        return mask
+
+    def select(self, site: Criteria = None, rack: Criteria = None, device: Criteria = None, connected: Optional[bool] = None) -> "ConnectionTable":
+        """ Return the rows matching every given filter, a connection matches a site, rack or device if either side does """
+        mask = None
+        for kind, criteria in (("site", site), ("rack", rack), ("device", device)):
+            if criteria is not None:
+                mask = self.combine(mask, self.match(kind, criteria), both=True)
+        if connected is not None:
+            mask = self.combine(mask, self.isin("connected", [1 if connected else 0]), both=True)
+        return self if mask is None else self.take(mask)
+
+    def take(self, mask: Sequence[bool]) -> "ConnectionTable":
+        """ Return the rows where ``mask`` is True """
+        if self.is_numpy:
+            columns = {name: column[mask] for name, column in self.columns.items()}
+        else:
+            columns = {name: array("q", compress(column, mask)) for name, column in self.columns.items()}
+        return self.__class__(columns, self.strings)
+
+    def records(self) -> Iterator[tuple]:
+        """ Yield the values of each connection's sheet row as a tuple of ``RECORD_FIELDS``, connected as a bool """
+        connected = [value == 1 for value in self.values("connected")]
+        sides = [[self.values(f"{column}_{side}") for column in ("interface", "device", "rack_unit", "rack")] for side in SIDES]
+        return zip(connected, *sides[0], *sides[1])
+
+    def rows(self) -> Iterator[RowData]:
+        """ Yield the sheet RowData of each connection, as ``InterfaceConnection.getSheetRowData`` creates it """
+        for values in self.records():
+            ROWS.inc(output="sheet")
+            yield InterfaceConnection.sheetRowData(*values)
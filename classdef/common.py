@@ -1,50 +1,268 @@
 """ Shared base class definitions """
 
-from pprint import pprint
-from .print_color import Print
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
 
 
-class Multiton(object):
+class IdentityMap(object):
+    """ Registry of the one instance per index of a Multiton subclass
+
+    Every operation holds the map's lock, so objects can be hydrated from several threads.
+
+    weak : bool
+        hold instances by weak reference, an object no longer referenced anywhere else leaves the map
+    indexes : Dict[str, Callable[[Any], Iterable[Hashable]]]
+        secondary indexes, name -> function returning the keys an instance is found under (eg: the id of its rack),
+        kept up to date as instances are registered, merged into and removed, queried with ``lookup``
+    hits, misses, merges : int
+        lookups which found an instance, lookups which did not, and updates merged into an existing instance
+    """
+
+    def __init__(self, weak: bool = False, indexes: Optional[Dict[str, Callable[[Any], Iterable[Hashable]]]] = None) -> None:
+        """ Init """
+        self.lock = threading.RLock()
+        self._objects = weakref.WeakValueDictionary() if weak else {}
+        self.indexes: Dict[str, Callable[[Any], Iterable[Hashable]]] = dict(indexes or {})
+        # index name -> key -> obj_idx of the instances with the key (a dict, to keep registration order)
+        self._index: Dict[str, Dict[Hashable, Dict[Hashable, None]]] = {name: {} for name in self.indexes}
+        # index name -> obj_idx -> keys the instance is currently indexed under
+        self._index_keys: Dict[str, Dict[Hashable, Tuple[Hashable, ...]]] = {name: {} for name in self.indexes}
+        # registered before their state was set (unpickling), indexed on the next lookup
+        self._unindexed: Dict[Hashable, None] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.merges: int = 0
+
+    @property
+    def weak(self) -> bool:
+        return type(self._objects) is weakref.WeakValueDictionary
+
+    def set_weak(self, weak: bool) -> None:
+        """ Switch between holding instances by strong and by weak reference, keeping the registered ones """
+        with self.lock:
+            if weak != self.weak:
+                self._objects = (weakref.WeakValueDictionary if weak else dict)(self._objects.items())
+
+    def get(self, obj_idx: Hashable, default: Any = None) -> Any:
+        """ Return the instance registered under ``obj_idx``, counting a hit or a miss """
+        with self.lock:
+            instance = self._objects.get(obj_idx)
+            if instance is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return instance
+
+    def get_or_create(self, obj_idx: Hashable, create: Callable[[], Any]) -> Tuple[Any, bool]:
+        """ Return ``(instance, created)``, registering ``create()`` under ``obj_idx`` if nothing is """
+        with self.lock:
+            instance = self.get(obj_idx)
+            if instance is not None:
+                return instance, False
+            instance = create()
+            self._objects[obj_idx] = instance
+            if self.indexes:
+                self._unindexed[obj_idx] = None
+            return instance, True
+
+    def merged(self, instance: Any) -> None:
+        """ Count an update merged into a registered instance and move it to its new index keys """
+        with self.lock:
+            self.merges += 1
+            self._reindex(instance)
+
+    def reindex(self, instance: Any) -> None:
+        """ Index ``instance`` under its current keys, call after changing it other than by a merge """
+        with self.lock:
+            self._reindex(instance)
+
+    def _reindex(self, instance: Any) -> None:
+        """ ``reindex`` with the lock already held """
+        obj_idx = instance.obj_idx
+        for name, key_function in self.indexes.items():
+            keys = key_function(instance)
+            index_keys = self._index_keys[name]
+            previous = index_keys.get(obj_idx, ())
+            if keys == previous:
+                continue
+            index = self._index[name]
+            for key in previous:
+                self._discard(index, key, obj_idx)
+            for key in keys:
+                entries = index.get(key)
+                if entries is None:
+                    entries = index[key] = {}
+                entries[obj_idx] = None
+            if keys:
+                index_keys[obj_idx] = keys
+            else:
+                del index_keys[obj_idx]
+
+    @staticmethod
+    def _discard(index: Dict[Hashable, Dict[Hashable, None]], key: Hashable, obj_idx: Hashable) -> None:
+        entries = index.get(key)
+        if entries is not None:
+            entries.pop(obj_idx, None)
+            if not entries:
+                del index[key]
+
+    def _unindex(self, obj_idx: Hashable) -> None:
+        """ Remove ``obj_idx`` from every index """
+        self._unindexed.pop(obj_idx, None)
+        for name, index_keys in self._index_keys.items():
+            for key in index_keys.pop(obj_idx, ()):
+                self._discard(self._index[name], key, obj_idx)
+
+    def lookup(self, index: str, key: Hashable) -> List[Any]:
+        """ Return the registered instances found under ``key`` in secondary index ``index`` """
+        with self.lock:
+            for obj_idx in list(self._unindexed):
+                instance = self._objects.get(obj_idx)
+                if instance is not None:
+                    self._reindex(instance)
+            self._unindexed.clear()
+            found = []
+            for obj_idx in list(self._index[index].get(key, ())):
+                instance = self._objects.get(obj_idx)
+                if instance is None:
+                    # collected in weak mode
+                    self._unindex(obj_idx)
+                else:
+                    found.append(instance)
+            return found
+
+    def stats(self) -> Dict[str, int]:
+        """ Return the size and counters of the map """
+        with self.lock:
+            return {"objects": len(self._objects), "hits": self.hits, "misses": self.misses, "merges": self.merges}
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.hits = self.misses = self.merges = 0
+
+    def update(self, pairs: Iterable[Tuple[Hashable, Any]]) -> None:
+        """ Register every ``(index, instance)`` of ``pairs``, replacing what is registered under the same index """
+        with self.lock:
+            for obj_idx, instance in pairs:
+                self._objects[obj_idx] = instance
+                self._reindex(instance)
+
+    def pop(self, obj_idx: Hashable, *default: Any) -> Any:
+        with self.lock:
+            self._unindex(obj_idx)
+            return self._objects.pop(obj_idx, *default)
+
+    def clear(self) -> None:
+        with self.lock:
+            self._objects.clear()
+            self._unindexed.clear()
+            for name in self.indexes:
+                self._index[name].clear()
+                self._index_keys[name].clear()
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """ Return a snapshot of the registered ``(index, instance)`` pairs """
+        with self.lock:
+            return list(self._objects.items())
+
+    def keys(self) -> Iterator[Hashable]:
+        with self.lock:
+            return list(self._objects.keys())
+
+    def values(self) -> Iterator[Any]:
+        with self.lock:
+            return list(self._objects.values())
+
+    def __getitem__(self, obj_idx: Hashable) -> Any:
+        with self.lock:
+            return self._objects[obj_idx]
+
+    def __setitem__(self, obj_idx: Hashable, instance: Any) -> None:
+        with self.lock:
+            self._objects[obj_idx] = instance
+            self._reindex(instance)
+
+    def __delitem__(self, obj_idx: Hashable) -> None:
+        with self.lock:
+            del self._objects[obj_idx]
+            self._unindex(obj_idx)
+
+    def __contains__(self, obj_idx: Hashable) -> bool:
+        return obj_idx in self._objects
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.keys())
+
+    def __reduce__(self):
+        """ Pickle as the registered pairs, the lock and counters are not kept """
+        return (self.__class__, (self.weak, self.indexes), None, None, iter(self.items()))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.stats()})"
+
+
+class MultitonMeta(type):
+    """ Metaclass of Multiton, calling the class returns the registered instance of the index """
+
+    def __call__(cls, *args, **kwargs):
+        """ Return the instance for the index of ``kwargs``, creating it or merging ``kwargs`` into it
+
+        ``__init__`` only runs on new instances when the class defines ``mergeFrom(other)``,
+        an existing instance is then updated from an unregistered instance built from ``kwargs``.
+        """
+        obj_idx = cls.getIndex(**kwargs)
+        registry: IdentityMap = cls._instances
+        with registry.lock:
+            instance = registry.get(obj_idx)
+            if instance is None:
+                instance = object.__new__(cls)
+                instance.obj_idx = obj_idx
+                instance.__init__(*args, **kwargs)
+                registry[obj_idx] = instance
+                return instance
+            merge_from = getattr(instance, "mergeFrom", None)
+            if merge_from is None:
+                instance.__init__(*args, **kwargs)
+                registry.merged(instance)
+                return instance
+        update = object.__new__(cls)
+        update.obj_idx = obj_idx
+        update.__init__(*args, **kwargs)
+        with registry.lock:
+            merge_from(update)
+            registry.merged(instance)
+        return instance
+
+
+class Multiton(object, metaclass=MultitonMeta):
     """ Single Globally Uniquely ID / keyed object, use by subclassing Multiton
 
-    Must define on the subclass the class variable:
+    Must define on the subclass:
         _instances
-    this is a list which contains the subclass instances, indexed by the obj_idx strings
+            an ``IdentityMap`` which holds the subclass instances, indexed by the obj_idx returned from ``getIndex``
+        getIndex(**kwargs)
+            classmethod returning the index of the instance ``kwargs`` describe, raising if there is none
+    and may define:
+        mergeFrom(other)
+            update self with the fields of ``other``, without it ``__init__`` is run again on the existing instance
     """
 
+    __slots__ = ("obj_idx", "__weakref__")
 
     def __new__(cls, *args, **kwargs):
-        """ Restrict instances to the first one """
-        print(f"Multiton.__new__")
-        pprint(kwargs, indent=2)
-        print(f"cls={cls}")
-        
-        try:
-            obj_idx: str = cls.getIndex(**kwargs)
-            Print.green(f"Loaded index for {cls} of {obj_idx} with {kwargs}")
-            # this code assumes that the first parameter input is the key
-            if hasattr(cls, '_instances') and obj_idx in cls._instances:
-                print(f"{'Multiton has_attr DUPLICATE':!>130}\n\t{cls}\n\t{obj_idx}")
-                for attr in kwargs:
-                    print(f"Multiton.__new__ -> Setting attr={attr} on {cls.__name__} with id={obj_idx}")
-                    if hasattr(cls._instances[obj_idx], attr):
-                        print(f"setting {cls._instances[obj_idx]} obj_idx={obj_idx} attr={attr} to->\n{kwargs[attr]}")
-                        setattr(cls._instances[obj_idx], attr, kwargs[attr])
-                return cls._instances[obj_idx]
-            # wasn't found, so add an instance
+        """ Return the registered instance for the index of ``kwargs``, registering a new uninitialised one if there is none
+
+        Used directly only by unpickling, which then applies the pickled state.
+        """
+        obj_idx = cls.getIndex(**kwargs)
+
+        def create() -> "Multiton":
             instance = object.__new__(cls)
             instance.obj_idx = obj_idx
-            if not hasattr(cls, '_instances'):
-                print(f"{'Multiton create new _instances':!>120}\n\t{cls}\n\t{obj_idx}")
-                # create new list and start it with this instance
-                # setattr(cls, '_instances', {argval: instance})
-                cls._instances = {obj_idx: instance}
-            else:
-                # print(f"{'Multiton append to _instances':!>120}\n\t{cls}\n\t{obj_idx}")
-                # else append to instances list
-                cls._instances[obj_idx] = instance
             return instance
-        except Exception:
-            Print.red(f"Exception when getting the index for {cls} with {args} & {kwargs}")
-            return False
 
+        return cls._instances.get_or_create(obj_idx, create)[0]
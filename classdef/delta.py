@@ -0,0 +1,266 @@
+""" Delta re-export of a site's InterfaceConnections into the spreadsheet of a previous export
+
+A full export re-sends every cell of the site. ``DeltaExport`` instead records a fingerprint of each
+exported row, keyed by the ``InterfaceConnection.id``, and on the next run compares the site's current
+rows with them: only the inserted, deleted and changed rows are sent, as ``insertDimension`` /
+``deleteDimension`` and ``updateCells`` requests, so the upload follows the number of changes rather
+than the size of the site.
+
+Rows are kept ordered by connection id, so the position of every row follows from the recorded ids:
+the deleted rows are removed bottom up, the new rows inserted top down at their final position, then
+the inserted and changed rows written. The fingerprints are only recorded once every request has been
+sent; if a batch fails the recorded sheet is forgotten and the next run must export anew.
+
+    spreadsheet_id = DeltaExport(SheetsUploader(transport), "hkg1").export()        # full export, recorded
+    DeltaExport(SheetsUploader(transport), "hkg1", spreadsheet_id).export()         # only the changes
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .netbox import NetboxRequest, InterfaceConnection
+from .columnar import ConnectionTable
+from .response_cache import SQLiteStore
+from .sheet import Spreadsheet, SpreadsheetProperties, Sheet, SheetProperties, GridData
+from .export import connection_banding
+from .upload import SheetsUploader, Segment, RawRequest, UploadError
+
+
+debug = getLogger().debug
+
+Fingerprint = bytes
+
+
+def fingerprint(encoded_row: str) -> Fingerprint:
+    """ Return the fingerprint of a row's JSON """
+    return hashlib.blake2b(encoded_row.encode(), digest_size=16).digest()
+
+
+def raw_request(kind: str, request: Dict[str, Any]) -> RawRequest:
+    return RawRequest(json.dumps({kind: request}, separators=(",", ":")))
+
+
+def runs(positions: Iterable[int]) -> List[Tuple[int, int]]:
+    """ Return ascending ``positions`` as ``(start, end)`` ranges of consecutive positions """
+    ranges: List[Tuple[int, int]] = []
+    for position in positions:
+        if ranges and ranges[-1][1] == position:
+            ranges[-1] = (ranges[-1][0], position + 1)
+        else:
+            ranges.append((position, position + 1))
+    return ranges
+
+
+class Delta(NamedTuple):
+    """ Changes between two exports of a sheet, both ordered by connection id
+
+    deleted : ``(start, end)`` row ranges of the previous export
+    inserted : ``(start, end)`` row ranges of the new export
+    written : ``(start, end)`` row ranges of the new export to write, the inserted and the changed rows
+    """
+    deleted: List[Tuple[int, int]]
+    inserted: List[Tuple[int, int]]
+    written: List[Tuple[int, int]]
+    changed: int
+
+    @classmethod
+    def between(cls, previous: List[Tuple[int, Fingerprint]], current: List[Tuple[int, Fingerprint]]) -> "Delta":
+        """ Compare the ``(connection id, fingerprint)`` rows of the previous and the current export """
+        previous_fingerprints = dict(previous)
+        current_ids = {connection_id for connection_id, _ in current}
+        deleted = [position for position, (connection_id, _) in enumerate(previous) if connection_id not in current_ids]
+        inserted = []
+        changed = []
+        for position, (connection_id, current_fingerprint) in enumerate(current):
+            previous_fingerprint = previous_fingerprints.get(connection_id)
+            if previous_fingerprint is None:
+                inserted.append(position)
+            elif previous_fingerprint != current_fingerprint:
+                changed.append(position)
+        return cls(runs(deleted), runs(inserted), runs(sorted(inserted + changed)), len(changed))
+
+    def __bool__(self) -> bool:
+        return bool(self.deleted or self.written)
+
+
+class ExportStore(SQLiteStore):
+    """ Fingerprints of the rows of exported sheets """
+
+    SCHEMA_VERSION: int = 1
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """ Drop and create the export tables """
+        connection.execute("DROP TABLE IF EXISTS sheets")
+        connection.execute("DROP TABLE IF EXISTS rows")
+        connection.execute(
+            "CREATE TABLE sheets ("
+            " spreadsheet_id TEXT NOT NULL,"
+            " sheet_id INTEGER NOT NULL,"
+            " site TEXT NOT NULL,"
+            " exported REAL NOT NULL,"
+            " PRIMARY KEY (spreadsheet_id, sheet_id)"
+            ") WITHOUT ROWID")
+        connection.execute(
+            "CREATE TABLE rows ("
+            " spreadsheet_id TEXT NOT NULL,"
+            " sheet_id INTEGER NOT NULL,"
+            " connection_id INTEGER NOT NULL,"
+            " fingerprint BLOB NOT NULL,"
+            " PRIMARY KEY (spreadsheet_id, sheet_id, connection_id)"
+            ") WITHOUT ROWID")
+
+    def sheet(self, spreadsheet_id: str, sheet_id: int) -> Optional[Dict[str, Any]]:
+        """ Return the recorded export of the sheet, None if there is none """
+        row = self.connection.execute("SELECT site, exported FROM sheets WHERE spreadsheet_id = ? AND sheet_id = ?",
+                                      (spreadsheet_id, sheet_id)).fetchone()
+        if row is None:
+            return None
+        return {"site": row[0], "exported": row[1]}
+
+    def rows(self, spreadsheet_id: str, sheet_id: int) -> List[Tuple[int, Fingerprint]]:
+        """ Return the ``(connection id, fingerprint)`` of the sheet's rows, in row order """
+        return self.connection.execute("SELECT connection_id, fingerprint FROM rows WHERE spreadsheet_id = ? AND sheet_id = ? ORDER BY connection_id",
+                                       (spreadsheet_id, sheet_id)).fetchall()
+
+    def merge(self, spreadsheet_id: str, sheet_id: int, site: str, changed: List[Tuple[int, Fingerprint]], removed: Iterable[int] = (), replace: bool = False) -> None:
+        """ Upsert the ``changed`` rows and delete the ``removed`` connection ids of the sheet in one transaction
+
+        replace : bool
+            discard every recorded row of the sheet first, for a full export
+        """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if replace:
+                connection.execute("DELETE FROM rows WHERE spreadsheet_id = ? AND sheet_id = ?", (spreadsheet_id, sheet_id))
+            connection.executemany("INSERT OR REPLACE INTO rows (spreadsheet_id, sheet_id, connection_id, fingerprint) VALUES (?, ?, ?, ?)",
+                                   [(spreadsheet_id, sheet_id, connection_id, row_fingerprint) for connection_id, row_fingerprint in changed])
+            connection.executemany("DELETE FROM rows WHERE spreadsheet_id = ? AND sheet_id = ? AND connection_id = ?",
+                                   [(spreadsheet_id, sheet_id, connection_id) for connection_id in removed])
+            connection.execute("INSERT OR REPLACE INTO sheets (spreadsheet_id, sheet_id, site, exported) VALUES (?, ?, ?, ?)",
+                               (spreadsheet_id, sheet_id, site, time.time()))
+
+    def forget(self, spreadsheet_id: str, sheet_id: int) -> None:
+        """ Drop the recorded export of the sheet """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM rows WHERE spreadsheet_id = ? AND sheet_id = ?", (spreadsheet_id, sheet_id))
+            connection.execute("DELETE FROM sheets WHERE spreadsheet_id = ? AND sheet_id = ?", (spreadsheet_id, sheet_id))
+
+
+class DeltaExport:
+    """ Export the InterfaceConnections of ``site`` to sheet ``sheet_id`` of ``spreadsheet_id``, sending only what changed
+
+    Without ``spreadsheet_id`` a new spreadsheet is created and its rows recorded.
+
+    incremental : bool
+        fetch the connections with ``getInterfaceConnections(incremental=True)``, only what changed in netbox is downloaded
+    """
+
+    # file in ``NetboxRequest.cache_dir`` holding the fingerprints
+    store_file_name: str = "exports.sqlite3"
+
+    def __init__(self, uploader: SheetsUploader, site: str, spreadsheet_id: Optional[str] = None, sheet_id: int = 0,
+                 title: Optional[str] = None, incremental: bool = False) -> None:
+        """ Init """
+        self.uploader = uploader
+        self.site = site
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_id = sheet_id
+        self.title = title
+        self.incremental = incremental
+        self.store: ExportStore = ExportStore.open(os.path.join(NetboxRequest.cache_dir, self.store_file_name))
+        self.stats: Dict[str, int] = {}
+
+    def rows(self) -> List[Tuple[int, Fingerprint, Any]]:
+        """ Return the ``(connection id, fingerprint, RowData)`` of the site's connections, ordered by connection id """
+        table = ConnectionTable.fromConnections(InterfaceConnection.getInterfaceConnections(data_center=self.site, incremental=self.incremental))
+        encode_row = self.uploader.encoder.encodeRow
+        rows = sorted(zip(table.values("id"), table.rows()), key=lambda row: row[0])
+        return [(connection_id, fingerprint(encode_row(row)), row) for connection_id, row in rows]
+
+    def export(self) -> str:
+        """ Bring the sheet up to date, return the spreadsheet id """
+        rows = self.rows()
+        if self.spreadsheet_id is None:
+            return self.exportAll(rows)
+        if self.store.sheet(self.spreadsheet_id, self.sheet_id) is None:
+            raise ValueError(f"no export of sheet {self.sheet_id} of {self.spreadsheet_id} is recorded, export {self.site} without a spreadsheet id first")
+        previous = self.store.rows(self.spreadsheet_id, self.sheet_id)
+        current = [(connection_id, row_fingerprint) for connection_id, row_fingerprint, _ in rows]
+        delta = Delta.between(previous, current)
+        self.stats = {"rows": len(rows), "inserted": sum(end - start for start, end in delta.inserted),
+                      "deleted": sum(end - start for start, end in delta.deleted), "changed": delta.changed, "requests": 0}
+        if delta:
+            try:
+                self.stats["requests"] = self.uploader.send(self.spreadsheet_id, self.uploader.batches(self.requests(delta, rows, len(previous))))
+            except UploadError:
+                # the sheet may hold part of the changes, its recorded rows no longer describe it
+                self.store.forget(self.spreadsheet_id, self.sheet_id)
+                raise
+            previous_fingerprints = dict(previous)
+            changed = [(connection_id, row_fingerprint) for connection_id, row_fingerprint in current
+                       if previous_fingerprints.get(connection_id) != row_fingerprint]
+            removed = previous_fingerprints.keys() - {connection_id for connection_id, _ in current}
+            self.store.merge(self.spreadsheet_id, self.sheet_id, self.site, changed, removed)
+        debug(f"delta export of {self.site} to {self.spreadsheet_id}: {self.stats}")
+        return self.spreadsheet_id
+
+    def exportAll(self, rows: List[Tuple[int, Fingerprint, Any]]) -> str:
+        """ Create a spreadsheet holding ``rows`` and record them """
+        row_data = [row for _, _, row in rows]
+        properties = SpreadsheetProperties(title = self.title) if self.title is not None else SpreadsheetProperties()
+        sheet = Sheet([GridData(0, 0, row_data)], [connection_banding(len(row_data), self.sheet_id)] if row_data else [],
+                      properties = SheetProperties(title = self.site, index = 0, sheetId = self.sheet_id))
+        self.spreadsheet_id = self.uploader.upload(Spreadsheet(sheets = [sheet], properties = properties))
+        self.store.merge(self.spreadsheet_id, self.sheet_id, self.site,
+                         [(connection_id, row_fingerprint) for connection_id, row_fingerprint, _ in rows], replace=True)
+        self.stats = {"rows": len(rows), "inserted": len(rows), "deleted": 0, "changed": 0}
+        return self.spreadsheet_id
+
+    def dimension(self, kind: str, start: int, end: int) -> RawRequest:
+        """ Return an insertDimension or deleteDimension request of rows ``start`` to ``end`` """
+        request: Dict[str, Any] = {"range": {"sheetId": self.sheet_id, "dimension": "ROWS", "startIndex": start, "endIndex": end}}
+        if kind == "insertDimension":
+            request["inheritFromBefore"] = start > 0
+        return raw_request(kind, request)
+
+    def requests(self, delta: Delta, rows: List[Tuple[int, Fingerprint, Any]], previous_count: int) -> Iterable[Any]:
+        """ Yield the requests applying ``delta`` to the sheet of ``previous_count`` rows, in the order they must be applied """
+        count = previous_count
+        for start, end in reversed(delta.deleted):
+            if end - start == count:
+                # a sheet keeps at least one row, the last one is cleared instead
+                if count > 1:
+                    yield self.dimension("deleteDimension", 1, count)
+                yield raw_request("updateCells", {"range": {"sheetId": self.sheet_id, "startRowIndex": 0, "endRowIndex": 1}, "fields": "*"})
+                count = 0
+                continue
+            yield self.dimension("deleteDimension", start, end)
+            count -= end - start
+        for start, end in delta.inserted:
+            if count == 0 and start == 0:
+                # an empty sheet still has one (blank) row, it is reused
+                start, count = 1, 1
+            if start < end and start == count:
+                # rows can only be inserted before an existing row, after the last they are appended
+                yield raw_request("appendDimension", {"sheetId": self.sheet_id, "dimension": "ROWS", "length": end - start})
+            elif start < end:
+                yield self.dimension("insertDimension", start, end)
+            count += end - start
+        encode_row = self.uploader.encoder.encodeRow
+        for start, end in delta.written:
+            for position in range(start, end):
+                row = rows[position][2]
+                yield Segment(self.sheet_id, position, 0, [encode_row(row)], len(row.get("values", [])))
+        banding = connection_banding(len(rows), self.sheet_id)
+        if previous_count == 0 and rows:
+            yield raw_request("addBanding", {"bandedRange": banding})
+        elif previous_count and not rows:
+            yield raw_request("deleteBanding", {"bandedRangeId": self.sheet_id})
+        elif len(rows) != previous_count:
+            yield raw_request("updateBanding", {"bandedRange": banding, "fields": "range"})
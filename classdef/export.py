@@ -0,0 +1,100 @@
+""" Export of the InterfaceConnections of many sites
+
+Every site is exported by a worker process, which fetches, hydrates and renders the site's
+connections into a ``Sheet`` titled with the site. The parent assembles the sheets into one
+``Spreadsheet`` with a tab per site, or a ``Spreadsheet`` per site.
+
+The workers share one budget of concurrent netbox requests, ``NetboxRequest.concurrency`` unless
+given, split evenly between them so that adding workers does not add load on netbox.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+
+from .netbox import NetboxRequest, NetboxQuery, DataCenter, InterfaceConnection
+from .columnar import ConnectionTable
+from .metrics import METRICS
+from .sheet import Spreadsheet, SpreadsheetProperties, Sheet, SheetProperties, GridData, GridRange, BandedRange, BandingProperties, Color
+
+
+debug = getLogger().debug
+
+# columns of a connection row, see ``InterfaceConnection.sheetRowData``
+ROW_WIDTH: int = 9
+
+
+def get_sites() -> List[str]:
+    """ Return the slug of every site in netbox """
+    sites = NetboxRequest(NetboxQuery.DATACENTERS, {}, json_callback = DataCenter.jsonToObj).results
+    return [site.slug for site in sites if isinstance(site, DataCenter)]
+
+
+def connection_banding(rows: int, sheet_id: int = 0) -> BandedRange:
+    """ Return the alternating row colors of ``rows`` connection rows in sheet ``sheet_id`` """
+    return BandedRange(range = GridRange(0, rows, 0, ROW_WIDTH, sheetId = sheet_id),
+                       rowProperties = BandingProperties( headerColor = Color(50, 50, 50, 100),
+                                                          firstBandColor = Color(100, 100, 100, 200),
+                                                          secondBandColor = Color(200, 200, 200, 0) ),
+                       # ids must be unique in the spreadsheet, the sequence of BandedRange is per process
+                       bandedRangeId = sheet_id)
+
+
+def site_sheet(site: str, index: int = 0) -> Sheet:
+    """ Fetch the InterfaceConnections of ``site`` and render them into a Sheet, tab ``index`` of the spreadsheet """
+    interface_connections = InterfaceConnection.getInterfaceConnections(data_center=site)
+    rows = list(ConnectionTable.fromConnections(interface_connections).rows())
+    banded_ranges = [connection_banding(len(rows), index)] if rows else []
+    debug(f"rendered {len(rows)} connections of {site}")
+    return Sheet([GridData(0, 0, rows)], banded_ranges, properties = SheetProperties(title = site, index = index, sheetId = index))
+
+
+def export_site(site: str, index: int, concurrency: int) -> Sheet:
+    """ Worker process entry point, ``site_sheet`` with at most ``concurrency`` requests to netbox at a time """
+    NetboxRequest.configure(concurrency = concurrency)
+    return site_sheet(site, index)
+
+
+def export_site_metered(site: str, index: int, concurrency: int) -> Tuple[Sheet, Dict[str, Any]]:
+    """ Worker process entry point, ``export_site`` and the metrics of the process for the parent to merge """
+    return export_site(site, index, concurrency), METRICS.drain()
+
+
+def export_sites(sites: List[str],
+                 workers: Optional[int] = None,
+                 concurrency: Optional[int] = None,
+                 per_site: bool = False,
+                 title: Optional[str] = None) -> List[Spreadsheet]:
+    """ Export ``sites`` with a pool of worker processes, return the assembled Spreadsheet(s)
+
+    workers : int
+        worker processes, default one per site up to the number of CPUs and the request budget
+    concurrency : int
+        concurrent netbox requests of all the workers together, default ``NetboxRequest.concurrency``
+    per_site : bool
+        return a Spreadsheet per site rather than one with a tab per site
+    title : str
+        of the spreadsheet, the site is appended with ``per_site``
+    """
+    concurrency = concurrency if concurrency is not None else NetboxRequest.concurrency
+    if workers is None:
+        workers = min(len(sites), os.cpu_count() or 1, concurrency)
+    workers = max(1, min(workers, len(sites)))
+    worker_concurrency = max(1, concurrency // workers)
+    debug(f"exporting {len(sites)} sites with {workers} workers of {worker_concurrency} requests each")
+    # alone in its spreadsheet, a site's sheet is the first tab
+    indexes = [0] * len(sites) if per_site else list(range(len(sites)))
+    if workers == 1:
+        sheets = [export_site(site, index, worker_concurrency) for site, index in zip(sites, indexes)]
+    else:
+        sheets = []
+        with ProcessPoolExecutor(max_workers = workers, initializer = METRICS.reset) as executor:
+            for sheet, metrics in executor.map(export_site_metered, sites, indexes, [worker_concurrency] * len(sites)):
+                METRICS.merge(metrics)
+                sheets.append(sheet)
+    title = title if title is not None else SpreadsheetProperties().title
+    if not per_site:
+        return [Spreadsheet(sheets = sheets, properties = SpreadsheetProperties(title = title))]
+    return [Spreadsheet(sheets = [sheet], properties = SpreadsheetProperties(title = f"{title} {site}"))
+            for site, sheet in zip(sites, sheets)]
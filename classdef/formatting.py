@@ -0,0 +1,116 @@
+""" Range level formatting of Sheets, compiled from repeated cell attributes
+
+Every connection row carries the same ``DataValidationRule`` on its checkbox cell, and any per cell
+format would be repeated the same way, so the request body grows by the attribute times the rows.
+``FormatCompiler`` finds an attribute repeated down a column and strips it from the cells, sending it
+once for the whole run of rows instead: ``setDataValidation`` for a data validation rule and
+``repeatCell`` for the other attributes (eg: ``userEnteredFormat``).
+
+The range requests must be applied after the rows are written, writing a cell with ``fields: "*"``
+resets its validation and format; ``SheetsUploader`` sends them last.
+
+    spreadsheet, requests = FormatCompiler().compile(spreadsheet)
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .sheet_json import SheetEncoder, encode_json
+
+
+# cell attributes hoisted to range requests
+HOISTED_ATTRIBUTES: Tuple[str, ...] = ("dataValidation", "userEnteredFormat")
+
+# shortest run of equal values hoisted, a lone value is cheaper left on its cell
+MIN_RUN: int = 2
+
+
+def range_request(attribute: str, grid_range: Dict[str, int], encoded_value: str) -> str:
+    """ Return the JSON of the request setting the JSON ``encoded_value`` of ``attribute`` on every cell of ``grid_range`` """
+    if attribute == "dataValidation":
+        return '{"setDataValidation":{"range":%s,"rule":%s}}' % (encode_json(grid_range), encoded_value)
+    return ('{"repeatCell":{"range":%s,"cell":{%s:%s},"fields":%s}}'
+            % (encode_json(grid_range), encode_json(attribute), encoded_value, encode_json(attribute)))
+
+
+class FormatCompiler:
+    """ Hoist cell attributes repeated down a column into range requests
+
+    attributes : Tuple[str, ...]
+        cell attributes considered, default ``HOISTED_ATTRIBUTES``
+    min_run : int
+        rows a value must be repeated on to be hoisted
+    """
+
+    def __init__(self, attributes: Optional[Tuple[str, ...]] = None, min_run: Optional[int] = None, encoder: Optional[SheetEncoder] = None) -> None:
+        """ Init """
+        self.attributes = attributes if attributes is not None else HOISTED_ATTRIBUTES
+        self.min_run = min_run if min_run is not None else MIN_RUN
+        self.encoder = encoder if encoder is not None else SheetEncoder()
+        self.hoisted: int = 0
+
+    def compile(self, spreadsheet: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """ Return ``spreadsheet`` without the hoisted attributes and the JSON of the range requests setting them, ``spreadsheet`` is not changed """
+        sheets = []
+        requests: List[str] = []
+        for index, sheet in enumerate(spreadsheet.get("sheets", [])):
+            sheet_id = sheet.get("properties", {}).get("sheetId", index)
+            data = []
+            for grid_data in sheet.get("data", []):
+                grid_data, grid_requests = self.compileGrid(sheet_id, grid_data)
+                data.append(grid_data)
+                requests.extend(grid_requests)
+            sheets.append(dict(dict.items(sheet), data=data) if "data" in sheet else sheet)
+        return dict(dict.items(spreadsheet), sheets=sheets), requests
+
+    def compileGrid(self, sheet_id: int, grid_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """ Return ``grid_data`` without the hoisted attributes and the JSON of the range requests setting them """
+        rows = grid_data.get("rowData", [])
+        start_row, start_column = grid_data.get("startRow", 0), grid_data.get("startColumn", 0)
+        requests: List[str] = []
+        # row -> column -> attributes stripped from the cell
+        stripped: Dict[int, Dict[int, List[str]]] = {}
+        for column, attribute, first, end, encoded_value in self.runs(rows):
+            grid_range = {"sheetId": sheet_id, "startRowIndex": start_row + first, "endRowIndex": start_row + end,
+                          "startColumnIndex": start_column + column, "endColumnIndex": start_column + column + 1}
+            requests.append(range_request(attribute, grid_range, encoded_value))
+            for row_index in range(first, end):
+                stripped.setdefault(row_index, {}).setdefault(column, []).append(attribute)
+            self.hoisted += end - first
+        if not stripped:
+            return grid_data, requests
+        compiled_rows = list(rows)
+        for row_index, columns in stripped.items():
+            row = rows[row_index]
+            cells = list(row.get("values", []))
+            for column, attributes in columns.items():
+                cells[column] = {key: value for key, value in dict.items(cells[column]) if key not in attributes}
+            compiled_rows[row_index] = dict(dict.items(row), values=cells)
+        return dict(dict.items(grid_data), rowData=compiled_rows), requests
+
+    def runs(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, str, int, int, str]]:
+        """ Return the ``(column, attribute, first row, end row, value JSON)`` of the runs of ``min_run`` or more equal attribute values down a column """
+        found: List[Tuple[int, str, int, int, str]] = []
+        # (column, attribute) -> [first row, last row, value, value JSON] of the run being followed
+        following: Dict[Tuple[int, str], List[Any]] = {}
+        for row_index, row in enumerate(rows):
+            for column, cell in enumerate(row.get("values", ())):
+                # most cells hold a value only
+                if not cell or len(cell) == 1 and "userEnteredValue" in cell:
+                    continue
+                for attribute in self.attributes:
+                    value = cell.get(attribute)
+                    if value is None:
+                        continue
+                    run = following.get((column, attribute))
+                    if run is not None and run[1] == row_index - 1:
+                        # rows often share the value object, or an equal one, no need to encode it again
+                        if value is run[2] or value == run[2] or self.encoder.encodeValue(value) == run[3]:
+                            run[1] = row_index
+                            continue
+                    if run is not None and run[1] - run[0] + 1 >= self.min_run:
+                        found.append((column, attribute, run[0], run[1] + 1, run[3]))
+                    following[(column, attribute)] = [row_index, row_index, value, self.encoder.encodeValue(value)]
+        for (column, attribute), run in following.items():
+            if run[1] - run[0] + 1 >= self.min_run:
+                found.append((column, attribute, run[0], run[1] + 1, run[3]))
+        return sorted(found)
@@ -0,0 +1,206 @@
+""" Incremental decoding of netbox list pages
+
+A netbox list page is ``{"count": .., "next": .., "previous": .., "results": [ .. ]}``.
+``StreamingPage`` decodes it from an iterable of byte chunks, holding only the undecoded
+remainder of the current chunk, and yields each element of ``results`` as soon as it is
+complete, passed through ``object_hook`` like ``json.loads`` does. The decoded dict tree of
+the whole page never exists at once.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+# bytes handed to the decoder at a time when decoding a body already in memory
+CHUNK_SIZE: int = 64 * 1024
+
+WHITESPACE = " \t\n\r"
+
+# what ends a number or literal, what the value scanner stops at outside and inside a string
+SCALAR_END = re.compile(r"[,\]}\s]")
+STRUCTURE = re.compile(r'[{}\[\]"]')
+STRING_END = re.compile(r'["\\]')
+
+
+def iter_chunks(content: bytes, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """ Split ``content`` into chunks without copying it """
+    view = memoryview(content)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size].tobytes()
+
+
+class StreamingPage:
+    """ Incrementally decoded netbox list page
+
+    fields : Dict[str, Any]
+        top level members other than ``results`` (``count``, ``next``, ``previous``) decoded so far
+    """
+
+    def __init__(self, chunks: Iterable[bytes], object_hook: Optional[Callable] = None, results_key: str = "results") -> None:
+        """ Init """
+        self.fields: Dict[str, Any] = {}
+        self.results_key = results_key
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder(object_hook=object_hook)
+        self._plain_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._exhausted = False
+        self._state = "start"
+
+    def _read_more(self) -> bool:
+        """ Append the next chunk to the buffer, dropping what has been consumed; False when the input is exhausted """
+        if self._exhausted:
+            return False
+        try:
+            chunk = next(self._chunks)
+            text = self._text_decoder.decode(chunk)
+        except StopIteration:
+            text = self._text_decoder.decode(b"", final=True)
+            self._exhausted = True
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _next_char(self) -> str:
+        """ Skip whitespace and return the next character without consuming it """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                raise ValueError("unexpected end of JSON page")
+
+    def _expect(self, char: str) -> None:
+        if self._next_char() != char:
+            raise ValueError(f"expected {char!r} at {self._buffer[self._pos:self._pos + 40]!r}")
+        self._pos += 1
+
+    def _value_end(self) -> int:
+        """ Return the end of the next value in the buffer, reading more input until the whole value is in it
+
+        Only brackets and strings are scanned, nothing is decoded, so ``object_hook`` never sees a partial value.
+        """
+        if self._next_char() not in '{["':
+            # number or literal, ends at the next delimiter or at the end of the input
+            while True:
+                match = SCALAR_END.search(self._buffer, self._pos)
+                if match is not None:
+                    return match.start()
+                if not self._read_more():
+                    return len(self._buffer)
+        scan = self._pos
+        depth = 0
+        in_string = False
+        while True:
+            buffer = self._buffer
+            while True:
+                if in_string:
+                    match = STRING_END.search(buffer, scan)
+                    if match is None:
+                        scan = len(buffer)
+                        break
+                    if match.group() == "\\":
+                        if match.end() == len(buffer):
+                            # the escaped character is in the next chunk
+                            scan = match.start()
+                            break
+                        scan = match.end() + 1
+                        continue
+                    in_string = False
+                    scan = match.end()
+                    if depth == 0:
+                        return scan
+                else:
+                    match = STRUCTURE.search(buffer, scan)
+                    if match is None:
+                        scan = len(buffer)
+                        break
+                    char = match.group()
+                    scan = match.end()
+                    if char == '"':
+                        in_string = True
+                    elif char in "{[":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            return scan
+            # reading more drops the consumed part of the buffer, the scan position moves with it
+            scanned = scan - self._pos
+            if not self._read_more():
+                raise ValueError("unexpected end of JSON page")
+            scan = self._pos + scanned
+
+    def _decode_value(self, decoder: json.JSONDecoder) -> Any:
+        """ Decode the next complete value, reading more input until it is available
+
+        The value is decoded once, from the complete text, so ``object_hook`` runs exactly once per object.
+        """
+        end = self._value_end()
+        value, decoded_end = decoder.raw_decode(self._buffer, self._pos)
+        if decoded_end != end:
+            raise ValueError(f"unexpected data in JSON page at {self._buffer[decoded_end:decoded_end + 40]!r}")
+        self._pos = end
+        return value
+
+    def _next_member(self) -> Optional[str]:
+        """ Consume up to and including the ':' of the next top level member and return its key, None at the end """
+        char = self._next_char()
+        if char == ",":
+            self._pos += 1
+            char = self._next_char()
+        if char == "}":
+            self._pos += 1
+            self._state = "end"
+            return None
+        key = self._decode_value(self._plain_decoder)
+        self._expect(":")
+        return key
+
+    def field(self, name: str) -> Any:
+        """ Return a top level member, decoding no further into the page than needed
+
+        Members after ``results`` can only be reached by consuming the results, netbox sends ``count`` first.
+        """
+        if self._state == "start":
+            self._expect("{")
+            self._state = "members"
+        while name not in self.fields and self._state == "members":
+            key = self._next_member()
+            if key is None:
+                break
+            if key == self.results_key:
+                self._state = "results"
+                break
+            self.fields[key] = self._decode_value(self._plain_decoder)
+        return self.fields.get(name)
+
+    def results(self) -> Iterator[Any]:
+        """ Yield each element of ``results`` passed through ``object_hook``, then decode the remaining members """
+        while self._state in ("start", "members"):
+            self.field(self.results_key)
+        if self._state != "results":
+            return
+        self._expect("[")
+        if self._next_char() == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield self._decode_value(self._decoder)
+                char = self._next_char()
+                self._pos += 1
+                if char == "]":
+                    break
+                if char != ",":
+                    raise ValueError(f"expected ',' or ']' in {self.results_key} at {self._buffer[self._pos - 1:self._pos + 40]!r}")
+        self._state = "members"
+        while True:
+            key = self._next_member()
+            if key is None:
+                break
+            self.fields[key] = self._decode_value(self._plain_decoder)
@@ -0,0 +1,298 @@
+""" Metrics of an export run: counters, gauges and histograms
+
+What the fetch layer and the exporters do is counted here, rather than shown as colored lines:
+netbox requests by endpoint and status, their latency and bytes, response cache hits and misses,
+objects hydrated by class, rows rendered and Sheets API requests. At the end of a run they are written
+as a JSON summary (``write_summary``) and / or a Prometheus textfile (``write_textfile``, for the node
+exporter's textfile collector) to alert on export time and cache effectiveness.
+
+Metrics are per process, a worker process sends back its ``drain()`` which the parent ``merge``s.
+
+    from classdef.metrics import METRICS
+    METRICS.write_summary("run.json")
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metric:
+    """ A named metric holding one value per combination of its ``labels`` values """
+
+    kind: str = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        """ Init """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], Any] = {}
+
+    def key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """ Return the values of ``labels`` in the order of the metric's labels """
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} has labels {self.labels}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """ Yield the (name, labels, value) of each sample, as exposed to Prometheus """
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, key)), value
+
+    def snapshot(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """ Return the values, as plain data which can be pickled to another process """
+        with self.lock:
+            return [(key, list(value) if type(value) is list else value) for key, value in self.values.items()]
+
+    def merge(self, values: List[Tuple[Tuple[str, ...], Any]]) -> None:
+        """ Add the ``snapshot`` values of the same metric from another process """
+        with self.lock:
+            for key, value in values:
+                self.values[tuple(key)] = self.values.get(tuple(key), 0) + value
+
+    def reset(self) -> None:
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    """ Value which only increases, eg: requests sent """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """ Return the value of ``labels``, or the total of every labels combination when none are given """
+        with self.lock:
+            if not labels and self.labels:
+                return sum(self.values.values())
+            return self.values.get(self.key(labels), 0)
+
+
+class Gauge(Metric):
+    """ Value which is set, eg: the duration of the run; a merged value replaces the current one """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def merge(self, values: List[Tuple[Tuple[str, ...], Any]]) -> None:
+        with self.lock:
+            self.values.update((tuple(key), value) for key, value in values)
+
+
+class Histogram(Metric):
+    """ Distribution of observed values, eg: request latency, counted in cumulative ``buckets`` """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """ Init """
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self.key(labels)
+        with self.lock:
+            # counts of each bucket (not cumulative), then the +Inf bucket, the sum and the count
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 3)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """ Observe the seconds the block takes """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        for key, counts in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le="+Inf" if bound == math.inf else repr(bound)), cumulative
+            yield f"{self.name}_sum", labels, counts[-2]
+            yield f"{self.name}_count", labels, counts[-1]
+
+    def merge(self, values: List[Tuple[Tuple[str, ...], Any]]) -> None:
+        with self.lock:
+            for key, counts in values:
+                current = self.values.setdefault(tuple(key), [0] * (len(self.buckets) + 3))
+                for index, count in enumerate(counts):
+                    current[index] += count
+
+    def summary(self, counts: List[float]) -> Dict[str, Any]:
+        """ Return the count, sum, mean and estimated quantiles of ``counts`` """
+        total = counts[-1]
+        result: Dict[str, Any] = {"count": total, "sum": counts[-2], "mean": counts[-2] / total if total else None}
+        for quantile in (0.5, 0.9, 0.99):
+            result[f"p{round(quantile * 100)}"] = self.quantile(counts, quantile)
+        return result
+
+    def quantile(self, counts: List[float], quantile: float) -> Optional[float]:
+        """ Return the upper bound of the bucket holding ``quantile`` of the observations, None above the last bucket """
+        rank = quantile * counts[-1]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """ The metrics of a process, by name """
+
+    def __init__(self) -> None:
+        """ Init """
+        self.metrics: Dict[str, Metric] = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """ Return the metric registered under ``metric.name``, registering ``metric`` if there is none """
+        with self.lock:
+            registered = self.metrics.setdefault(metric.name, metric)
+        if type(registered) is not type(metric) or registered.labels != metric.labels:
+            raise ValueError(f"{metric.name} is already registered as a {registered.kind} of labels {registered.labels}")
+        return registered
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def snapshot(self) -> Dict[str, List[Tuple[Tuple[str, ...], Any]]]:
+        """ Return the values of every metric, as plain data """
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def drain(self) -> Dict[str, List[Tuple[Tuple[str, ...], Any]]]:
+        """ Return the ``snapshot`` and reset every metric, what a worker process sends back after each task """
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def reset(self) -> None:
+        """ Reset every metric, a forked worker process starts with a copy of its parent's values """
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def merge(self, snapshot: Dict[str, List[Tuple[Tuple[str, ...], Any]]]) -> None:
+        """ Add the values of a ``snapshot`` (or ``drain``) of another process's registry """
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def summary(self) -> Dict[str, Any]:
+        """ Return every metric as JSON-able data, with the derived cache hit ratio """
+        metrics: Dict[str, Any] = {}
+        for name, metric in self.metrics.items():
+            with metric.lock:
+                values = {key: list(value) if type(value) is list else value for key, value in metric.values.items()}
+            entries = []
+            for key, value in sorted(values.items()):
+                entry = {"labels": dict(zip(metric.labels, key))}
+                entry.update(metric.summary(value) if type(metric) is Histogram else {"value": value})
+                entries.append(entry)
+            metrics[name] = {"type": metric.kind, "help": metric.help, "values": entries}
+        lookups = self.metrics.get("netbox_cache_lookups_total")
+        results = lookups.snapshot() if lookups is not None else []
+        hits = sum(value for key, value in results if key[-1] == "hit")
+        misses = sum(value for key, value in results if key[-1] == "miss")
+        return {
+            "started": self.started,
+            "seconds": time.time() - self.started,
+            "cache_hit_ratio": hits / (hits + misses) if hits + misses else None,
+            "metrics": metrics,
+        }
+
+    def prometheus(self) -> str:
+        """ Return every metric in the Prometheus text exposition format """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                label_text = ",".join(f'{label}="{escape_label(label_value)}"' for label, label_value in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {format_value(value)}" if label_text else f"{sample_name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path: str) -> None:
+        """ Write the ``summary`` as JSON to ``path`` """
+        write_atomic(path, json.dumps(self.summary(), indent=2))
+
+    def write_textfile(self, path: str) -> None:
+        """ Write the metrics in the Prometheus text format to ``path``, replacing it at once as the textfile collector requires """
+        write_atomic(path, self.prometheus())
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if type(value) is float else str(value)
+
+
+def write_atomic(path: str, text: str) -> None:
+    """ Write ``text`` next to ``path`` and move it over it, a reader never sees a partial file """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# metrics of this process
+METRICS = MetricsRegistry()
+
+REQUESTS = METRICS.counter("netbox_requests_total", "netbox requests sent, by endpoint and HTTP status", ("endpoint", "status"))
+REQUEST_SECONDS = METRICS.histogram("netbox_request_seconds", "latency of netbox requests", ("endpoint",))
+RESPONSE_BYTES = METRICS.counter("netbox_response_bytes_total", "bytes of netbox responses, by endpoint and whether read from the network or the cache",
+                                 ("endpoint", "source"))
+CACHE = METRICS.counter("netbox_cache_lookups_total", "response cache lookups, by endpoint and result (hit or miss)", ("endpoint", "result"))
+HYDRATED = METRICS.counter("netbox_objects_hydrated_total", "netbox records hydrated into objects, by class", ("model",))
+ROWS = METRICS.counter("export_rows_rendered_total", "connection rows rendered, by output (sheet or file)", ("output",))
+SHEETS_REQUESTS = METRICS.counter("sheets_requests_total", "Sheets API batchUpdate requests, by HTTP status", ("status",))
+SHEETS_BYTES = METRICS.counter("sheets_request_bytes_total", "bytes of Sheets API batchUpdate request bodies")
+EXPORT_SECONDS = METRICS.gauge("export_duration_seconds", "duration of the last export run")
+EXPORT_SUCCESS = METRICS.gauge("export_last_success_timestamp_seconds", "time the last successful export run ended")
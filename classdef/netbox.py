@@ -1,23 +1,26 @@
 """ Netbox classes """
 
-from typing import Dict, Optional, List, Union, TypeVar, Any, cast, Tuple, Callable
+from typing import Dict, Optional, List, Union, TypeVar, Any, Tuple, Callable, Iterator, Iterable, Deque
 from logging import getLogger
 
 import requests
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 import json
-import base64
-import pickle
 import os
-from copy import deepcopy
-from pprint import pprint
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from .common import Multiton
+from .common import Multiton, IdentityMap
 from .sheet import RowData, CellData, ExtendedValue
 from classdef import sheet
-from .secrets import NETBOX_SEND_HEADERS
+from .session import NetboxSession
+from .response_cache import ResponseCache
+from .jsonstream import StreamingPage, iter_chunks
 from .print_color import Print
+from .metrics import REQUESTS, REQUEST_SECONDS, RESPONSE_BYTES, CACHE, HYDRATED, ROWS
 
 from copy import copy
 
@@ -56,14 +59,98 @@ class RESULT(Enum):
 
 
 
+class Choice(tuple):
+    """ Netbox choice field (eg: ``form_factor``, ``connection_status``), an immutable ``(value, label)`` pair
+
+    There is one shared instance per distinct choice rather than a dict per object,
+    ``choice["value"]`` / ``choice["label"]`` still work as they did on the dict.
+    """
+
+    __slots__ = ()
+
+    _choices: Dict[Tuple[type, Any, str], "Choice"] = {}
+
+    def __new__(cls, value: Any, label: str) -> "Choice":
+        """ Return the shared instance of the choice """
+        # the type is part of the key, ``True == 1`` but they are different choices
+        key = (type(value), value, label)
+        choice = cls._choices.get(key)
+        if choice is None:
+            choice = cls._choices.setdefault(key, tuple.__new__(cls, (value, intern_str(label))))
+        return choice
+
+    @classmethod
+    def fromJson(cls, jd: Any) -> Any:
+        """ Return the Choice for a ``{"value": .., "label": ..}`` dict, anything else is returned unchanged """
+        if type(jd) is dict and "value" in jd and "label" in jd:
+            return cls(jd["value"], jd["label"])
+        return jd
+
+    @property
+    def value(self) -> Any:
+        return tuple.__getitem__(self, 0)
+
+    @property
+    def label(self) -> str:
+        return tuple.__getitem__(self, 1)
+
+    def __getitem__(self, key):
+        """ Index by position or by ``"value"`` / ``"label"`` """
+        if key == "value":
+            return tuple.__getitem__(self, 0)
+        if key == "label":
+            return tuple.__getitem__(self, 1)
+        return tuple.__getitem__(self, key)
+
+    def __reduce__(self):
+        return (Choice, tuple(self))
+
+    def __repr__(self) -> str:
+        return f"Choice(value={self.value!r}, label={self.label!r})"
+
+
+def intern_str(value: Any) -> Any:
+    """ Return ``value`` interned if it is a str, names and labels repeat across many objects """
+    return sys.intern(value) if type(value) is str else value
+
+
 def str_to_class(classname: str):
     """ Input a string and returns the class object named it """
-    import sys
     return getattr(sys.modules[__name__], classname)
 
 
+class HydrationPlan:
+    """ Everything ``NetboxData.jsonToObj`` needs to know about a class, resolved once per class
+
+    endpoint : str
+        path records of the class are served under, a dict whose url does not contain it is not one of them
+    identifier_fields : frozenset
+        keys which identify a record of the class when the dict has no url
+    fields : Dict[str, Tuple[type, str]]
+        json field -> (class to create from it, attribute to store it in)
+    """
+
+    __slots__ = ("endpoint", "identifier_fields", "fields")
+
+    def __init__(self, cls: type) -> None:
+        """ Compile the plan of ``cls`` """
+        query_endpoint = NetboxQuery.__members__.get(f"{cls.__name__}S".upper())
+        self.endpoint: Optional[str] = query_endpoint.value if query_endpoint is not None else None
+        self.identifier_fields: frozenset = frozenset(getattr(cls, "_identifier_fields", ()))
+        self.fields: Dict[str, Tuple[type, str]] = {
+            json_field: ( str_to_class(field["class"]), json_field if len(field) == 1 else field["obj_attr"] )
+            for json_field, field in cls.field_to_object_map.items()
+        }
+
+
 class NetboxData:
-    """ Base for all netbox data objects, provide basic helper functions """
+    """ Base for all netbox data objects, provide basic helper functions
+
+    Subclasses declare their attributes in ``__slots__``, there is no per instance ``__dict__``,
+    fields of a record which are not slots are dropped when it is hydrated.
+    """
+
+    __slots__ = ()
 
     # define mapping of json fields to objects to create
     # must pass the object as a string because of issues with forward references
@@ -79,15 +166,38 @@ class NetboxData:
         "interface_b":      { "class": "Interface", "obj_attr": "_interface_b" }
     }
 
+    # attribute which is only set once the full record, rather than a nested brief, has been loaded
+    # ``None`` means every record of the class is complete
+    _detail_attr: Optional[str] = None
+
+    # slots which are not filled from records, left untouched by ``mergeFrom``
+    _unmerged_slots: frozenset = frozenset(("obj_idx",))
+
+    @property
+    def is_resolved(self) -> bool:
+        """ Return True if the full record of this object has been loaded """
+        return self._detail_attr is None or getattr(self, self._detail_attr, RESULT.UNINIT) is not RESULT.UNINIT
+
     def updateFromJson(self: T, jd: Dict[str, Any]) -> T:
         """ Update self with JSON """
         return self.__class__.jsonToObj(jd, self)
 
+    @classmethod
+    def hydrationPlan(cls) -> "HydrationPlan":
+        """ Return the compiled ``HydrationPlan`` of this class, compiling it on first use """
+        plan = cls.__dict__.get("_hydration_plan")
+        if plan is None:
+            plan = HydrationPlan(cls)
+            cls._hydration_plan = plan
+        return plan
+
     @classmethod
     def jsonToObj(cls: T, jd: Dict[str, Any], merge_object: T = None) -> Union[T, dict]:
         """ Input json object and create/update object
 
-        shared jsonToObj from base ``NetboxData``
+        shared jsonToObj from base ``NetboxData``, this is used as the ``object_hook`` of json decoding
+        so it is called for every dict in a response, nested dicts first.
+        Dicts which are not a record of ``cls`` are returned unchanged.
 
         Parameters
         ----------
@@ -101,51 +211,46 @@ class NetboxData:
                 The object provided by ``merge_object`` is updated
 
         """
-        debug(f"{'*'*30} jd into (NetboxData) {cls.__name__}.jsonToObj {'*'*30} ---->")
-        trace(jd)
+        plan = cls.__dict__.get("_hydration_plan") or cls.hydrationPlan()
         if type(jd) is not dict:
             raise ValueError(f"jd is not a dict: {jd}")
-            # return jd
-        if "detail" in jd.keys() and jd["detail"] == "Not found.":
-            Print.red_bg("not found with")
-        debug(f"<---- {'*'*30} jd into {cls.__name__}.jsonToObj {'*'*30}")
-        if "url" in jd:
-            if cast(str, jd["url"]).find(NetboxQuery[f"{cls.__name__}S".upper()].value) == -1:
+        url = jd.get("url")
+        if url is not None:
+            if plan.endpoint is None or plan.endpoint not in url:
                 return jd
-        elif not all([True if identifier_field in jd else False for identifier_field in cls._identifier_fields ]):
-            info(f"identifier_fields{cls._identifier_fields} check did not pass")
+        elif not plan.identifier_fields.issubset(jd.keys()):
+            if jd.get("detail") == "Not found.":
+                Print.red_bg("not found with")
             return jd
-        debug(f"{'*'*30} PASS (NetboxData) {cls.__name__}.jsonToObj {'*'*30}")
-        # copy jd into obj_args,
-        # ``obj_args`` will be passed into class to create new instance
-        obj_args = deepcopy(jd)
-        for json_field, field in cls.field_to_object_map.items():
-            if json_field in obj_args:
-                obj_attr = json_field if len(field) == 1 else field["obj_attr"]
-                Print.magenta_bg(f"**{cls.__name__}.jsonToObj ; setting {obj_attr} from {json_field}" +
-                                 f"\n\ttype(field) = {type(field)}" +
-                                 f"\n\ttype(jd) = {type(jd)}" )
-                # try:
-                #     print("str to class: ", end="")
-                #     print(str_to_class(field["class"]))
-                #     print("jd: ", end="")
-                #     pprint(jd)
-                #     print("jsonToObj: ", end="")
-                #     print(str_to_class(field["class"]).jsonToObj(jd[json_field]))
-                #     print("jd[json_field]: ", end="")
-                #     print(jd[json_field])
-                #     print(type(jd[json_field]["id"]))
-                # except Exception as e: print(e)
-                if jd[json_field] is None:
-                    obj_args[obj_attr] = RESULT.NULL
-                elif type(jd[json_field]) is str_to_class(field["class"]):
-                    Print.cyan(f"The field {json_field} is already of {type(jd[json_field])}")
-                else:
-                    obj_args[obj_attr] = str_to_class(field["class"]).jsonToObj(jd[json_field]) if json_field in jd and type(jd[json_field]["id"]) is int else None
-                obj_args.pop(json_field)  # remove json_field
-        debug(f"cls={cls}")
-        instance = cls( **obj_args )
-        return instance
+        # ``obj_args`` will be passed into class to create new instance,
+        # nested dicts have already been through the hook so a shallow copy is all that is needed
+        obj_args = {}
+        fields = plan.fields
+        for json_field, value in jd.items():
+            field = fields.get(json_field)
+            if field is None:
+                obj_args[json_field] = value
+                continue
+            field_class, obj_attr = field
+            if value is None:
+                obj_args[obj_attr] = RESULT.NULL
+            elif type(value) is field_class:
+                obj_args[obj_attr] = value
+            else:
+                obj_args[obj_attr] = field_class.jsonToObj(value) if type(value) is dict and type(value.get("id")) is int else None
+        HYDRATED.inc(model=cls.__name__)
+        return cls( **obj_args )
+
+    @classmethod
+    def getIndexed(cls: T, index: str, key: Any) -> List[T]:
+        """ Return the registered objects found under ``key`` in the secondary index ``index`` of the class
+
+        key : Any
+            a model object is looked up by its id
+        """
+        if isinstance(key, NetboxData):
+            key = key.id
+        return cls._instances.lookup(index, key)
 
     @classmethod
     def getIndex(cls, **kwargs) -> str:
@@ -159,9 +264,7 @@ class NetboxData:
     @classmethod
     def setattr_helper(cls, attr_name: str, values) -> Any:
         """ Return mapped field if necessary (for objects) """
-        debug(f"setattr_helper\nattr_name: {attr_name}\nvalues: {values}")
         if attr_name in cls.field_to_object_map and cls.field_to_object_map[attr_name]["obj_attr"] in values and cls.field_to_object_map[attr_name]["obj_attr"]:
-            debug(f"found {attr_name}")
             return_value = values[cls.field_to_object_map[attr_name]["obj_attr"]]
         elif attr_name in values:
             return_value = values[attr_name]
@@ -172,41 +275,35 @@ class NetboxData:
     @property
     def datacenter(self) -> "DataCenter":
         """ Return DataCenter object """
-        if type(self._datacenter) is not DataCenter:
+        if type(self._datacenter) is not DataCenter and not self.is_resolved:
             NetboxRequest(NetboxQuery.DEVICE, {"id": self.id}, self)
         return self._datacenter
 
     @property
     def rack(self) -> "Rack":
         """ Return DataCenter object """
-        Print.red(f"parent_device={type(self.parent_device)}\_rack={type(self._rack)}")
-        if type(self._rack) is not Rack:
+        if type(self._rack) is not Rack and not self.is_resolved:
             NetboxRequest(NetboxQuery[self.__class__.__name__.upper()], {"id": self.id}, self)
-            Print.red(f"parent_device={type(self.parent_device)}")
             if type(self.parent_device) is Device:
-                Print.red(f"parent_device.rack={self.parent_device.rack}")
+                debug("%s.%s takes the rack of its parent device %s", self.__class__.__name__, self.id, self.parent_device.id)
                 self._rack = self.parent_device.rack
+                self._instances.reindex(self)
         if self._rack is not None:
             return self._rack
-        import traceback
-        print("<-----traceback---->")
-        traceback.print_stack()
-        traceback.print_exc()
-        print("<-----traceback---->")
         raise Exception(f"rack not found on {self} with id={self.id}")
 
     @property
     def device(self) -> "Device":
         """ Return Device object """
-        if type(self._device) is not Device:
+        if type(self._device) is not Device and not self.is_resolved:
             NetboxRequest(NetboxQuery[self.__class__.__name__.upper()], {"id": self.id}, self)
         return self._device
     
     @property
     def parent_device(self) -> "Device":
         """ Return Device object of parent if present"""
-        Print.red_bg(f"querying{self.__class__.__name__}.{self.id} ; parent_device={self._parent_device}")
-        if type(self._parent_device) is not Device:
+        debug("querying %s.%s parent_device=%s", self.__class__.__name__, self.id, self._parent_device)
+        if type(self._parent_device) is not Device and not self.is_resolved:
             NetboxRequest(NetboxQuery[self.__class__.__name__.upper()], {"id": self.id}, self)
         if self._parent_device is not None:
             return self._parent_device
@@ -218,11 +315,37 @@ class NetboxData:
         """ Return endpoint for this device """
         return NetboxQuery[f"{cls.__name__.__name__.upper()}S"]
 
-    def __setstate__(self, state):
-        debug(f"{'*'*40} setstate={state}")
+    @classmethod
+    def slotNames(cls) -> Tuple[str, ...]:
+        """ Return the names of every slot of the class, including those of its bases """
+        names = cls.__dict__.get("_slot_names")
+        if names is None:
+            names = tuple(dict.fromkeys(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get("__slots__", ())
+                                        if name != "__weakref__"))
+            cls._slot_names = names
+        return names
+
+    def mergeFrom(self: T, other: T) -> None:
+        """ Merge ``other``, an unregistered instance built from a newer record of the same object, into self
+
+        A complete record replaces every field. A brief one (or any record of a class which has no ``_detail_attr``
+        to tell them apart) only sets the fields it carries, so it never resets what a complete one set.
+        """
+        replace = self._detail_attr is not None and other.is_resolved
+        for name in self.slotNames():
+            if name in self._unmerged_slots:
+                continue
+            value = getattr(other, name, RESULT.UNINIT)
+            if replace or (value is not None and value is not RESULT.UNINIT):
+                setattr(self, name, value)
 
     def __getnewargs_ex__(self) -> Tuple[Tuple, Dict]:
-        return ((), self.__dict__)
+        """ Unpickling creates (or finds) the registered object through ``Multiton.__new__``, which only needs the id """
+        return ((), {"id": self.id})
+
+    def __getstate__(self) -> Tuple[None, Dict[str, Any]]:
+        """ Return the set slots, as the ``(None, slot state)`` pair unpickling applies to slotted objects itself """
+        return (None, {name: getattr(self, name) for name in self.slotNames() if hasattr(self, name)})
 
 
 
@@ -231,10 +354,17 @@ class NetboxData:
 class NetboxRequest:
     """ HTTP request to netbox """
 
-    _BASE_URL = "https://netbox.roblox.local/api"
-    cache_dir = os.path.abspath( os.path.join( __file__, "..", "..", "data_cache" ) )
-
-    def __init__(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, any], update_obj = None, limit: int=None, json_callback: Callable = None) -> None:
+    # api root, ``NETBOX_BASE_URL`` points it elsewhere, eg: the local stand-in ``benchmarks/netbox_server.py``
+    _BASE_URL = os.environ.get("NETBOX_BASE_URL", "https://netbox.roblox.local/api").rstrip("/")
+    # response cache, snapshot and sync / export records, ``NETBOX_CACHE_DIR`` keeps those of another api root apart
+    cache_dir = os.path.abspath( os.environ.get("NETBOX_CACHE_DIR") or os.path.join( __file__, "..", "..", "data_cache" ) )
+    cache_file_name = "responses.sqlite3"
+    # number of results requested per page when paginating a list endpoint
+    page_size: int = 1000
+    # number of pages fetched in parallel once the first page has returned ``count``
+    concurrency: int = 8
+
+    def __init__(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, any], update_obj = None, limit: int=None, json_callback: Callable = None, page_size: int = None, concurrency: int = None, use_cache: bool = True, stream: bool = False) -> None:
         """ Create initial params for Request
 
         query_endpoint : NetboxQuery
@@ -244,81 +374,159 @@ class NetboxRequest:
         update_obj : Object
             update_obj should point back to the object to be updated, if not creating a new Object
         limit : int
-            limit the number of returned results
+            limit the number of returned results, disables pagination
+        page_size : int
+            results per page when paginating, defaults to ``NetboxRequest.page_size``
+        concurrency : int
+            pages fetched in parallel when paginating, defaults to ``NetboxRequest.concurrency``
+        use_cache : bool
+            read the response from the response cache when present, when False always request it (the response is still stored)
+        stream : bool
+            decode ``results`` incrementally one result at a time, rather than decoding each whole page first
         """
         self.query_parameters = copy(query_parameters)
         self.query_endpoint   = query_endpoint
         self.json_callback    = json_callback
         self.update_obj       = update_obj
+        self.page_size        = page_size if page_size is not None else self.__class__.page_size
+        self.concurrency      = concurrency if concurrency is not None else self.__class__.concurrency
+        self.use_cache        = use_cache
+        self.stream           = stream
+        self.count: Optional[int] = None
+        # offset pages in flight, in offset order, and the parameters of those not requested yet
+        self._pages: Deque[Future] = deque()
+        self._page_parameters: Iterator[Dict[str, Any]] = iter(())
+        self._executor: Optional[ThreadPoolExecutor] = None
         debug(f"NetboxRequest !!! self.query_parameters -> {self.query_parameters}")
-        # for k, v in query_parameters.items():
-        #     try:
-        #         raise Exception(f"this->{k}={v}")
-        #     except Exception as e:
-        #         print(e)
+        query_parameters = copy(query_parameters)
         if limit is not None and type(limit) is int and limit > 0:
             query_parameters["limit"] = limit
+            self.query_parameters["limit"] = limit
         if type(self.query_endpoint.value) is tuple and self.query_endpoint.value[1] == "id":
+            self.paginate = False
             self.query_endpoint_str = (
                 str(self.query_endpoint.value[0]) +
                 str(query_parameters.pop(self.query_endpoint.value[1])) +
                 str("/")
             )
         else:
-            #NOTE: kill
-            query_parameters["limit"] = 5
+            # an explicit limit or offset means the caller is asking for exactly one page
+            self.paginate = "limit" not in query_parameters and "offset" not in query_parameters
+            if self.paginate:
+                query_parameters["limit"] = self.page_size
+                self.query_parameters["limit"] = self.page_size
             self.query_endpoint_str = str(self.query_endpoint.value)
-        if not self.load_from_cache():
-            Print.red_bg(f"cache **MISS** -> NetboxRequest !!! endpoint={self.query_endpoint} ; query_parameters -> {self.query_parameters}/{query_parameters} ; query_endpoint_str -> {self.query_endpoint_str}")
-            self.response: requests.Response = requests.get(
-                self._BASE_URL + self.query_endpoint_str,
-                query_parameters,
-                headers=NETBOX_SEND_HEADERS,
-                verify=False)
+        if not (self.use_cache and self.load_from_cache()):
+            debug(f"NetboxRequest requesting {self.query_endpoint_str} {query_parameters}")
+            endpoint = self.query_endpoint.name
+            start = time.perf_counter()
+            try:
+                self.response: requests.Response = NetboxSession.get().get(
+                    self._BASE_URL + self.query_endpoint_str,
+                    params=query_parameters,
+                    timeout=NetboxSession.timeout)
+            except requests.RequestException:
+                REQUESTS.inc(endpoint=endpoint, status="error")
+                raise
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=self.response.status_code)
+            RESPONSE_BYTES.inc(len(self.response.content), endpoint=endpoint, source="network")
             debug(self.response.status_code)
             if self.response:
                 self.set_to_cache()
+        if self.paginate and self.response:
+            self.fetch_remaining_pages()
         if self.update_obj is not None and hasattr(update_obj, "updateFromJson"):
             self.response.json(object_hook=self.update_obj.updateFromJson)
 
+    @classmethod
+    def configure(cls, page_size: int = None, concurrency: int = None, base_url: str = None, cache_dir: str = None) -> None:
+        """ Set the default page size and page fetch concurrency, the api root requested and the cache directory
+
+        The shared session's per host connection pool is resized to match ``concurrency``
+        so parallel page fetches each get a kept-alive connection.
+        """
+        if base_url is not None:
+            cls._BASE_URL = base_url.rstrip("/")
+        if cache_dir is not None:
+            cls.cache_dir = os.path.abspath(cache_dir)
+        if page_size is not None:
+            cls.page_size = page_size
+        if concurrency is not None:
+            cls.concurrency = concurrency
+            NetboxSession.configure(pool_maxsize=concurrency)
+
+    def fetch_remaining_pages(self) -> None:
+        """ Read ``count`` from the first page and start requesting the remaining offset pages in parallel
+
+        Each page is its own ``NetboxRequest`` (and so its own cache entry). At most ``concurrency`` pages
+        are in flight or waiting to be read, ``results`` requests the next one as it finishes reading each page,
+        so fetching runs only that far ahead of the consumer and a read page is released once yielded.
+        """
+        # netbox sends count first, so only the start of the page is decoded here
+        self.count = StreamingPage(iter_chunks(self.response.content)).field("count")
+        offsets = range(self.page_size, self.count, self.page_size)
+        if len(offsets) == 0:
+            return
+        debug(f"NetboxRequest paginating {self.query_endpoint} count={self.count} pages={len(offsets) + 1}")
+        self._page_parameters = (dict(self.query_parameters, offset=offset) for offset in offsets)
+        self._executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(offsets)))
+        for _ in range(self.concurrency):
+            self.request_next_page()
+
+    def request_next_page(self) -> None:
+        """ Submit the next offset page, if any are left """
+        if self._executor is None:
+            return
+        page_parameters = next(self._page_parameters, None)
+        if page_parameters is None:
+            # queued pages still run, this only releases the worker threads once they are done
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            return
+        self._pages.append(self._executor.submit(self.__class__,
+                                                 self.query_endpoint,
+                                                 page_parameters,
+                                                 json_callback=self.json_callback,
+                                                 use_cache=self.use_cache,
+                                                 stream=self.stream))
+
+    def close(self) -> None:
+        """ Cancel the offset pages not started yet and request no more """
+        for page in self._pages:
+            page.cancel()
+        self._pages.clear()
+        self._page_parameters = iter(())
+        self.request_next_page()
+
 
+    @property
+    def response_cache(self) -> ResponseCache:
+        """ Return the response store kept in ``cache_dir`` """
+        return ResponseCache.open(os.path.join(self.cache_dir, self.cache_file_name))
 
     @property
-    def get_pickle_file_name(self) -> str:
-        """ Create standard pickle file name from query and endpoint return String """
-        # input(self.query_endpoint.__repr__())
-        # input(sorted(self.query_parameters.items()).__repr__())
-        encoded_query = base64.b32encode(self.query_endpoint.__repr__().encode() + sorted(self.query_parameters.items()).__repr__().encode()).decode()
-        pkl_file_name = os.path.join(self.cache_dir, f'cache_{encoded_query}.pkl')
-        # input(f"Confirm:\n\tpkl_file_name: {pkl_file_name}\n\tcache_dir: {self.cache_dir}\n\tself.query_endpoint.__repr__().encode(): {self.query_endpoint.__repr__().encode()}\n\tsorted(self.query_parameters.items()).__repr__().encode(){sorted(self.query_parameters.items()).__repr__().encode()}\n???")
-        return pkl_file_name
+    def cache_key(self) -> str:
+        """ Return the key this query's response is stored under """
+        return ResponseCache.key(self.query_endpoint, self.query_parameters)
 
 
     def load_from_cache(self) -> bool:
-        """ Check cache, if query is present, set self._json and return True, else return False """
-        pkl_file_name = self.get_pickle_file_name
-        if os.path.isfile(pkl_file_name):
-            with open(pkl_file_name, 'rb') as f:
-                try:
-                    Print.green_bg(f"loading...NetboxQuery from {pkl_file_name}")
-                    # input("pickle continue?")
-                    self.response = pickle.load(f)
-                    return True
-                except EOFError as e:
-                    Print.red_bg(f"pickle file invalid -> {pkl_file_name}")
-                    raise e
-                    return False
-        return False
+        """ Check cache, if query is present, set self.response and return True, else return False """
+        cached = self.response_cache.get(self.cache_key)
+        if cached is None:
+            CACHE.inc(endpoint=self.query_endpoint.name, result="miss")
+            return False
+        CACHE.inc(endpoint=self.query_endpoint.name, result="hit")
+        RESPONSE_BYTES.inc(len(cached.content), endpoint=self.query_endpoint.name, source="cache")
+        debug(f"NetboxRequest {self.query_endpoint} {self.query_parameters} loaded from cache")
+        self.response = cached
+        return True
 
 
     def set_to_cache(self) -> None:
-        """ Take query param encode as filename and save json of this query """
-        pkl_file_name = self.get_pickle_file_name
-        with open(pkl_file_name, 'wb') as f:
-            # Pickle using the highest protocol available.
-            Print.magenta_bg(f"pickling {self.response} into {pkl_file_name}")
-            pickle.dump(self.response, f, pickle.HIGHEST_PROTOCOL)
-            debug(f"pickle of {self.response} is complete")
+        """ Store the raw body and status of this query's response """
+        self.response_cache.put(self.cache_key, self.query_endpoint.name, self.response.status_code, self.response.content)
 
 
     @property
@@ -346,28 +554,128 @@ class NetboxRequest:
         return j
     
     @property
-    def results(self) -> object:
-        """ JSON TO results via callback """
-        self.read_response
-        return self._results
+    def results(self) -> Iterator:
+        """ JSON TO results via callback, streamed page by page across every page of the query
+
+        The offset pages are read once, each is released after its results are yielded.
+        """
+        try:
+            if self.stream:
+                yield from StreamingPage(iter_chunks(self.response.content), object_hook=self.json_callback).results()
+            else:
+                self.read_response
+                yield from self._results
+            while self._pages:
+                page = self._pages.popleft().result()
+                self.request_next_page()
+                yield from page.results
+                del page
+        finally:
+            self.close()
+
+
+# a filter of ``getInterfaceConnections``: a model object, id or name, or a list of them
+Filter = Union[None, str, int, NetboxData, List[Union[str, int, NetboxData]]]
+
+
+def filter_values(value: Filter, cls: type) -> List[Union[str, int, NetboxData]]:
+    """ Return the values of a filter as a list, checking each is a ``cls``, an id or a name """
+    if value is None:
+        return []
+    values = [value] if isinstance(value, (str, int, NetboxData)) else list(value)
+    for item in values:
+        if not isinstance(item, (cls, str, int)):
+            raise TypeError(f"{cls.__name__} filter accepts {cls.__name__}, int or str values, not {type(item).__name__}")
+    return values
+
+
+def set_filter(query_parameters: Dict[str, Any], name: str, values: List[Any]) -> None:
+    """ Add a filter to ``query_parameters``, several values are sent as a repeated parameter """
+    if len(values) == 1:
+        query_parameters[name] = values[0]
+    elif values:
+        query_parameters[name] = values
+
+
+def filter_alternatives(filters: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """ Return a query parameter dict for each non empty filter of ``filters``, [{}] if all are empty
+
+    The filters are alternatives of the same filter (eg: sites by slug and by id), netbox would require all of them to match.
+    """
+    alternatives = []
+    for name, values in filters.items():
+        query_parameters: Dict[str, Any] = {}
+        set_filter(query_parameters, name, values)
+        if query_parameters:
+            alternatives.append(query_parameters)
+    return alternatives or [{}]
+
+
+def unique_objects(objects: Iterable[NetboxData]) -> Iterator[NetboxData]:
+    """ Yield each object once, results of several requests for the same scope may overlap """
+    seen = set()
+    for obj in objects:
+        if isinstance(obj, NetboxData):
+            if obj.id in seen:
+                continue
+            seen.add(obj.id)
+        yield obj
+
+
+def related_key(obj: NetboxData, attr: str, cls: type) -> Tuple[int, ...]:
+    """ Return the index key of the ``cls`` object in ``obj.<attr>``, its id, empty if it is not loaded """
+    related = getattr(obj, attr, None)
+    return (related.id,) if type(related) is cls else ()
+
+
+def name_key(obj: NetboxData) -> Tuple[str, ...]:
+    return (obj.name,) if obj.name is not None else ()
+
+
+def datacenter_key(obj: NetboxData) -> Tuple[int, ...]:
+    return related_key(obj, "_datacenter", DataCenter)
+
+
+def rack_key(obj: NetboxData) -> Tuple[int, ...]:
+    return related_key(obj, "_rack", Rack)
+
+
+def device_key(obj: NetboxData) -> Tuple[int, ...]:
+    return related_key(obj, "_device", Device)
+
+
+def normalize_mac_address(mac_address: str) -> str:
+    """ Return ``mac_address`` upper case and colon separated, as netbox formats it """
+    digits = "".join(char for char in mac_address if char.isalnum()).upper()
+    return ":".join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+def mac_address_key(obj: NetboxData) -> Tuple[str, ...]:
+    return (normalize_mac_address(obj.mac_address),) if obj.mac_address else ()
+
+
+def interfaces_key(obj: NetboxData) -> Tuple[int, ...]:
+    return related_key(obj, "_interface_a", Interface) + related_key(obj, "_interface_b", Interface)
 
 
 class DataCenter(Multiton, NetboxData):
     """ DataCenter aka Site is the geographical location equipment is located within """
 
-    _instances: dict = {}
+    __slots__ = ("id", "url", "name", "slug", "physical_address", "id_site", "Racks", "devices")
+
+    _instances: IdentityMap = IdentityMap()
     _identifier_fields = { "name": True, "physical_address": True }
+    _unmerged_slots = NetboxData._unmerged_slots | { "Racks", "devices" }
 
     def __init__(self, **kwargs):
-        debug(f"creating DataCenter object from {kwargs}")
-        self.id_site: int = None
-        self.name: str
-        self.Racks: list = []
-        self.devices: list = []
-
-        for key, val in kwargs.items():
-            setattr(self, key, val)
-        debug(f"created -> DataCenter object from {self.__dict__}")
+        self.id: int                    = kwargs.get("id")
+        self.url: str                   = kwargs.get("url")
+        self.name: str                  = intern_str(kwargs.get("name"))
+        self.slug: str                  = intern_str(kwargs.get("slug"))
+        self.physical_address: str      = kwargs.get("physical_address")
+        self.id_site: int               = kwargs.get("id_site")
+        self.Racks: list                = []
+        self.devices: list              = []
 
     @classmethod
     def equivalency(cls, origin, test) -> bool:
@@ -382,21 +690,52 @@ class DataCenter(Multiton, NetboxData):
 class Rack(Multiton, NetboxData):
     """ Container for Rack obj - these contain Devices, contained by DataCenter """
 
-    _instances: dict = {}
+    __slots__ = ("id", "url", "name", "display_name", "facility_id", "id_facility", "_datacenter", "u_height", "devices")
+
+    _instances: IdentityMap = IdentityMap(indexes={"site": datacenter_key, "name": name_key})
     _identifier_fields = { "u_height": True, "facility_id": True }
+    _detail_attr = "_datacenter"
+    _unmerged_slots = NetboxData._unmerged_slots | { "devices" }
 
     def __init__(self, **kwargs):
         """ Init Rack """
-        self.id: int = None
-        self.id_facility: int = None
-        self.name: str
-        self._datacenter: DataCenter = self.__class__.setattr_helper("datacenter", kwargs)
+        self.id: int                    = kwargs.get("id")
+        self.url: str                   = kwargs.get("url")
+        self.name: str                  = intern_str(kwargs.get("name"))
+        self.display_name: str          = intern_str(kwargs.get("display_name"))
+        self.facility_id: str           = kwargs.get("facility_id")
+        self.id_facility: int           = kwargs.get("id_facility")
+        self._datacenter: DataCenter    = self.__class__.setattr_helper("datacenter", kwargs)
+        self.u_height: int              = kwargs.get("u_height")
+        self.devices: list              = []
+
+    @classmethod
+    def getBySite(cls, data_center: Union[DataCenter, int]) -> List["Rack"]:
+        """ Return the loaded Racks of ``data_center`` """
+        return cls.getIndexed("site", data_center)
+
+    @classmethod
+    def getByName(cls, name: str) -> List["Rack"]:
+        """ Return the loaded Racks named ``name`` (rack names are unique per site) """
+        return cls.getIndexed("name", name)
 
-        self.u_height: int = None
+    @classmethod
+    def resolveIds(cls, racks: List[Union["Rack", int, str]], site_alternatives: List[Dict[str, Any]]) -> List[int]:
+        """ Return the ids of ``racks``, names are looked up among the racks of the site(s) in ``site_alternatives``
 
-        self.devices: list = []
-        for key, val in kwargs.items():
-            setattr(self, key, val)
+        netbox can not filter racks by exact name, the racks of the site are requested instead (once, they are cached),
+        without a site a ``q`` search per name is narrowed down to exact matches.
+        """
+        rack_ids = [value if type(value) is int else value.id for value in racks if type(value) is not str]
+        names = [value for value in racks if type(value) is str]
+        if names:
+            if any(site_alternatives):
+                candidates = [obj for site_parameters in site_alternatives
+                              for obj in NetboxRequest(NetboxQuery.RACKS, site_parameters, json_callback = cls.jsonToObj).results]
+            else:
+                candidates = [obj for name in names for obj in NetboxRequest(NetboxQuery.RACKS, {"q": name}, json_callback = cls.jsonToObj).results]
+            rack_ids += [obj.id for obj in unique_objects(candidates) if isinstance(obj, Rack) and obj.name in names]
+        return rack_ids
 
     # @classmethod
     # def getIndex(cls, **kwargs) -> str:
@@ -419,8 +758,11 @@ class Rack(Multiton, NetboxData):
 class Device(Multiton, NetboxData):
     """ Container for physical assets """
 
-    _instances: dict = {}
+    __slots__ = ("id", "url", "name", "display_name", "asset_tag", "_datacenter", "_rack", "_parent_device", "_rack_unit")
+
+    _instances: IdentityMap = IdentityMap(indexes={"name": name_key, "rack": rack_key})
     _identifier_fields = { "device_type": True }
+    _detail_attr = "_rack"
 
     def __init__(self, **kwargs):
         """ Init Device """
@@ -429,19 +771,39 @@ class Device(Multiton, NetboxData):
         self._rack: Rack                = self.__class__.setattr_helper("rack", kwargs)
         self._parent_device: Device     = self.__class__.setattr_helper("parent_device", kwargs)
         self.url: str                   = kwargs["url"] if "url" in kwargs else None
-        self.name: str                  = kwargs["name"] if "name" in kwargs else None
-        self.display_name: str          = kwargs["display_name"] if "display_name" in kwargs else None
+        self.name: str                  = intern_str(kwargs.get("name"))
+        self.display_name: str          = intern_str(kwargs.get("display_name"))
         self.asset_tag: str             = kwargs["asset_tag"] if "asset_tag" in kwargs else None
-        self._rack_unit: int             = kwargs["rack_unit"] if "rack_unit" in kwargs else None
+        # netbox returns the rack unit of a device as ``position``
+        self._rack_unit: int            = kwargs["rack_unit"] if "rack_unit" in kwargs else kwargs.get("position")
         # for key, val in kwargs.items():
         #     setattr(self, key, val)
 
     @property
     def rack_unit(self) -> int:
-        """ Return Device object """
-        if type(self._rack_unit) is not int:
+        """ Return rack unit (position) of the Device, None when not racked """
+        if type(self._rack_unit) is not int and not self.is_resolved:
             NetboxRequest(NetboxQuery[self.__class__.__name__.upper()], {"id": self.id}, self)
-        return self._device
+        return self._rack_unit
+
+    @classmethod
+    def getByName(cls, name: str) -> List["Device"]:
+        """ Return the loaded Devices named ``name`` """
+        return cls.getIndexed("name", name)
+
+    @classmethod
+    def getByRack(cls, rack: Union[Rack, int]) -> List["Device"]:
+        """ Return the loaded Devices in ``rack``, a Device is only known to be in a rack once its full record is loaded """
+        return cls.getIndexed("rack", rack)
+
+    @classmethod
+    def getInRacks(cls, rack_ids: List[int]) -> List["Device"]:
+        """ Request the Devices in the racks of ``rack_ids``, in one query """
+        if not rack_ids:
+            return []
+        query_parameters: Dict[str, Any] = {}
+        set_filter(query_parameters, "rack_id", sorted(set(rack_ids)))
+        return [obj for obj in NetboxRequest(NetboxQuery.DEVICES, query_parameters, json_callback = cls.jsonToObj).results if isinstance(obj, Device)]
 
     # @property
     # def rack(self) -> Rack:
@@ -474,8 +836,21 @@ class Device(Multiton, NetboxData):
 class Interface(Multiton, NetboxData):
     """ Interfaces exist on devices """
 
-    _instances: dict = {}
+    __slots__ = ("id", "url", "_device", "name", "form_factor", "enabled", "lag", "mtu", "mac_address", "mgmt_only", "description")
+
+    _instances: IdentityMap = IdentityMap(indexes={"device": device_key, "mac_address": mac_address_key})
     _identifier_fields = {"mac_address": True, "lag": True}
+    _detail_attr = "_device"
+
+    @classmethod
+    def getByDevice(cls, device: Union[Device, int]) -> List["Interface"]:
+        """ Return the loaded Interfaces of ``device`` """
+        return cls.getIndexed("device", device)
+
+    @classmethod
+    def getByMacAddress(cls, mac_address: str) -> List["Interface"]:
+        """ Return the loaded Interfaces with ``mac_address``, in any case or separator format """
+        return cls.getIndexed("mac_address", normalize_mac_address(mac_address))
 
     # @classmethod
     # def getIndex(cls, **kwargs) -> str:
@@ -489,74 +864,182 @@ class Interface(Multiton, NetboxData):
         self.id: int                    = kwargs["id"] if "id" in kwargs else None
         self.url: str                   = kwargs["url"] if "url" in kwargs else None
         self._device: Device            = self.__class__.setattr_helper("device", kwargs)
-        self.name: str                  = kwargs["name"] if "name" in kwargs else None
-        # this should be a new type of InterfaceFormFactor object; value, label attrs
-        self.form_factor: dict          = kwargs["form_factor"] if "form_factor" in kwargs else None
+        self.name: str                  = intern_str(kwargs.get("name"))
+        self.form_factor: Choice        = Choice.fromJson(kwargs.get("form_factor"))
         self.enabled: bool              = kwargs["enabled"] if "enabled" in kwargs else None
         self.lag: Optional[int]         = kwargs["lag"] if "lag" in kwargs else None
         self.mtu: Optional[int]         = kwargs["mtu"] if "mtu" in kwargs else None
         self.mac_address: Optional[str] = kwargs["mac_address"] if "mac_address" in kwargs else None
         self.mgmt_only: bool            = kwargs["mgmt_only"] if "mgmt_only" in kwargs else None
-        self.description: str           = kwargs["description"] if "description" in kwargs else None
+        self.description: str           = intern_str(kwargs.get("description"))
 
 
 class InterfaceConnection(Multiton, NetboxData):
     """ Connect two Interfaces """
 
-    _instances: dict = {}
+    __slots__ = ("id", "_interface_a", "_interface_b", "connection_status")
+
+    _instances: IdentityMap = IdentityMap(indexes={"interface": interfaces_key})
     _identifier_fields = {"interface_a": True, "interface_b": True}
 
     @classmethod
-    def getInterfaceConnections(cls, data_center: Union[DataCenter, str] = SITE, rack: Union[DataCenter, str, None] = None) -> List["InterfaceConnection"]:
-        """ Get List of InterfaceConnection matching input params """
-        query_parameters: Dict[str, str] = {}
-        if data_center is not None:
-            if type(data_center) is str:
-                query_parameters["site"] = data_center.lower()
-            elif type(data_center) is DataCenter:
-                query_parameters["site"] = data_center.name.lower()
-        if rack is not None:
-            if type(rack) is str:
-                query_parameters["q"] = rack.lower()
-            elif type(rack) is Rack:
-                query_parameters["q"] = rack.name.lower()
-        r = NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, query_parameters, json_callback = InterfaceConnection.jsonToObj)
-        trace(r.__dict__)
-        return r.results
+    def getByInterface(cls, interface: Union[Interface, int]) -> List["InterfaceConnection"]:
+        """ Return the loaded InterfaceConnections with ``interface`` on either side """
+        return cls.getIndexed("interface", interface)
+
+    @classmethod
+    def getByDevice(cls, device: Union[Device, int]) -> List["InterfaceConnection"]:
+        """ Return the loaded InterfaceConnections with an Interface of ``device`` on either side """
+        connections: Dict[int, InterfaceConnection] = {}
+        for interface in Interface.getByDevice(device):
+            for connection in cls.getByInterface(interface):
+                connections[connection.id] = connection
+        return list(connections.values())
+
+    @classmethod
+    def getByRack(cls, rack: Union[Rack, int]) -> List["InterfaceConnection"]:
+        """ Return the loaded InterfaceConnections with a Device of ``rack`` on either side """
+        connections: Dict[int, InterfaceConnection] = {}
+        for device in Device.getByRack(rack):
+            for connection in cls.getByDevice(device):
+                connections[connection.id] = connection
+        return list(connections.values())
+
+    @classmethod
+    def getInterfaceConnections(cls,
+                                data_center: Filter = SITE,
+                                rack: Filter = None,
+                                device: Filter = None,
+                                resolve_related: bool = True,
+                                incremental: bool = False,
+                                stream: bool = False) -> Union[List["InterfaceConnection"], Iterator["InterfaceConnection"]]:
+        """ Get List of InterfaceConnection matching input params
+
+        data_center, rack, device : Filter
+            a model object, id or name (slug for sites), or a list of them, see ``queryParameters``;
+            a connection matches a rack or device when either of its sides does
+        resolve_related : bool
+            load the Interfaces, Devices and Racks the connections reference in bulk,
+            so building rows from them does not request each object individually
+        incremental : bool
+            only request connections (and the site's Devices and Racks) changed since the last incremental run,
+            see ``classdef.sync.IncrementalSync``; NetBox 2.x connections have no ``last_updated``,
+            so they are downloaded in full every run and only the Devices and Racks are incremental
+        stream : bool
+            return a generator, connections are decoded one at a time and their related objects resolved in batches;
+            with ``incremental`` the synced connections are hydrated from the sync store one at a time
+        """
+        requests_parameters = cls.queryParameters(data_center, rack, device)
+        if incremental:
+            from .sync import IncrementalSync
+            interface_connections = unique_objects(obj for query_parameters in requests_parameters
+                                                   for obj in IncrementalSync(cls, query_parameters, stream = stream).sync())
+            sites = {repr(site): site for site in ({key: value for key, value in query_parameters.items() if key in ("site", "site_id")}
+                                                  for query_parameters in requests_parameters) if site}
+            for site_parameters in sites.values():
+                # devices before racks, the brief racks nested in devices must not overwrite the synced racks
+                IncrementalSync(Device, site_parameters).sync()
+                IncrementalSync(Rack, site_parameters).sync()
+        else:
+            interface_connections = unique_objects(
+                obj for query_parameters in requests_parameters
+                for obj in NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, query_parameters, json_callback = InterfaceConnection.jsonToObj, stream = stream).results)
+        from .prefetch import prefetch_related, prefetch_batches
+        if stream:
+            return prefetch_batches(interface_connections) if resolve_related else interface_connections
+        interface_connections = list(interface_connections)
+        if resolve_related:
+            prefetch_related(interface_connections)
+        return interface_connections
+
+    @classmethod
+    def queryParameters(cls, data_center: Filter = None, rack: Filter = None, device: Filter = None) -> List[Dict[str, Any]]:
+        """ Translate filters into netbox's own query parameters, one dict per request needed
+
+        Each filter takes one or a list of values, sent as repeated parameters:
+            data_center : DataCenter or int -> ``site_id``, str -> ``site`` (slug)
+            device      : Device or int -> ``device_id``, str -> ``device`` (name)
+            rack        : Rack, int or str (name); netbox does not filter connections by rack, so the
+                          Devices of the racks are requested (``rack_id``) and the connections filtered by ``device_id``,
+                          split over as many requests as needed to keep each URL short.
+                          Combined with ``device``, only those of the rack's Devices are used.
+        netbox requires every parameter to match, so when a filter is given both ids and names they are requested separately.
+        An empty list is returned when the filters can not match anything.
+        """
+        site_ids: List[int] = []
+        site_slugs: List[str] = []
+        for value in filter_values(data_center, DataCenter):
+            if isinstance(value, DataCenter):
+                if value.id is not None:
+                    site_ids.append(value.id)
+                else:
+                    site_slugs.append((value.slug or value.name).lower())
+            elif type(value) is int:
+                site_ids.append(value)
+            else:
+                site_slugs.append(value.lower())
+        site_alternatives = filter_alternatives({"site": site_slugs, "site_id": site_ids})
+
+        device_ids: List[int] = []
+        device_names: List[str] = []
+        for value in filter_values(device, Device):
+            if isinstance(value, Device) or type(value) is int:
+                device_ids.append(value if type(value) is int else value.id)
+            else:
+                device_names.append(value)
+        if rack is None:
+            device_alternatives = filter_alternatives({"device_id": device_ids, "device": device_names})
+            return [dict(site, **devices) for site in site_alternatives for devices in device_alternatives]
+
+        rack_devices = Device.getInRacks(Rack.resolveIds(filter_values(rack, Rack), site_alternatives))
+        if device_ids or device_names:
+            rack_devices = [obj for obj in rack_devices if obj.id in device_ids or obj.name in device_names]
+        from .prefetch import chunk_ids, ID_FILTER_LENGTH
+        requests_parameters = []
+        for chunk in chunk_ids(sorted(obj.id for obj in rack_devices), ID_FILTER_LENGTH, len("&device_id=")):
+            for site in site_alternatives:
+                chunk_parameters = dict(site)
+                set_filter(chunk_parameters, "device_id", [int(obj_id) for obj_id in chunk])
+                requests_parameters.append(chunk_parameters)
+        return requests_parameters
 
     def __init__(self, **kwargs):
         """ Create """
-        self.id: int
-        self._interface_a: Interface = self.__class__.setattr_helper("interface_a", kwargs)
-        self._interface_b: Interface = self.__class__.setattr_helper("interface_b", kwargs)
-        self.connection_status: dict = {
-            "value": bool,
-            "label": str
-        }
-        for k in kwargs:
-            setattr(self, k, kwargs[k])
+        self.id: int                    = kwargs.get("id")
+        self._interface_a: Interface    = self.__class__.setattr_helper("interface_a", kwargs)
+        self._interface_b: Interface    = self.__class__.setattr_helper("interface_b", kwargs)
+        self.connection_status: Choice  = Choice.fromJson(kwargs.get("connection_status"))
 
     def getSheetRowData(self) -> RowData:
         """ Create RowData for Sheets from this object """
-        Print.red_bg(f"A={self.interface_a.device.id} ... B={self.interface_b.device.id}")
-        # input("continue?")
+        ROWS.inc(output="sheet")
+        return self.sheetRowData(
+            self.connection_status is not None and self.connection_status["value"] is True,
+            self.interface_a.name, self.interface_a.device.name, self.interface_a.device.rack_unit, self.interface_a.device.rack.name,
+            self.interface_b.name, self.interface_b.device.name, self.interface_b.device.rack_unit, self.interface_b.device.rack.name)
+
+    @staticmethod
+    def sheetRowData(connected: bool,
+                     interface_a: str, device_a: str, rack_unit_a: Optional[int], rack_a: str,
+                     interface_b: str, device_b: str, rack_unit_b: Optional[int], rack_b: str) -> RowData:
+        """ Create RowData for Sheets from the values of a connection, also used by ``ConnectionTable.rows`` """
         return RowData(
             [
                 # checkbox
                 CellData(
-                    userEnteredValue = ExtendedValue( True if self.connection_status["value"] is True else False ),
+                    userEnteredValue = ExtendedValue( connected ),
                     dataValidation = sheet.DataValidationRule( sheet.BooleanCondition( sheet.ConditionType.BOOLEAN ) )
                 ),
                 # border 1
-                CellData( ExtendedValue( self.interface_a.name ) ),
-                CellData( ExtendedValue( self.interface_a.device.name ) ),
-                CellData( ExtendedValue( self.interface_a.device.rack_unit ) ),
-                CellData( ExtendedValue( self.interface_a.device.rack.name ) ),
+                CellData( ExtendedValue( interface_a ) ),
+                CellData( ExtendedValue( device_a ) ),
+                CellData( ExtendedValue( rack_unit_a ) ),
+                CellData( ExtendedValue( rack_a ) ),
                 # border 2
-                CellData( ExtendedValue( self.interface_b.name ) ),
-                CellData( ExtendedValue( self.interface_b.device.name ) ),
-                CellData( ExtendedValue( self.interface_b.device.rack_unit ) ),
-                CellData( ExtendedValue( self.interface_b.device.rack.name ) )
+                CellData( ExtendedValue( interface_b ) ),
+                CellData( ExtendedValue( device_b ) ),
+                CellData( ExtendedValue( rack_unit_b ) ),
+                CellData( ExtendedValue( rack_b ) )
             ])
 
     @property
@@ -572,3 +1055,21 @@ class InterfaceConnection(Multiton, NetboxData):
         if type(self._interface_b) is not Interface:
             NetboxRequest(NetboxQuery.INTERFACE, {"id": self.id}, self)
         return self._interface_b
+
+
+# every Multiton registry of netbox objects
+REGISTRIES: Tuple[type, ...] = (DataCenter, Rack, Device, Interface, InterfaceConnection)
+
+
+def registry_stats() -> Dict[str, Dict[str, int]]:
+    """ Return the size and hit / miss / merge counters of each registry, by class name """
+    return {cls.__name__: cls._instances.stats() for cls in REGISTRIES}
+
+
+def set_weak_registries(weak: bool = True) -> None:
+    """ Hold registered objects by weak reference (or strong again), for long running processes
+
+    Objects then only live as long as something else, eg: the list of connections being exported, references them.
+    """
+    for cls in REGISTRIES:
+        cls._instances.set_weak(weak)
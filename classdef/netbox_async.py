@@ -0,0 +1,212 @@
+""" asyncio fetch engine for netbox
+
+Async counterpart to ``NetboxRequest``, every request of a ``AsyncNetboxClient`` shares
+one connection pool and one concurrency limit, so pagination, related object resolution
+and several endpoints can all be in flight at once within a single event loop.
+Responses are hydrated with the same ``jsonToObj`` callbacks into the same Multiton registries.
+"""
+
+import asyncio
+import json
+import os
+import time
+from logging import getLogger
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+import aiohttp
+
+from .netbox import NetboxData, NetboxQuery, NetboxRequest, InterfaceConnection, Device, Rack, DataCenter
+from .prefetch import RESOLVABLE_CLASSES, chunk_ids, find_unresolved
+from .session import NetboxSession
+from .response_cache import ResponseCache
+from .metrics import REQUESTS, REQUEST_SECONDS, RESPONSE_BYTES, CACHE
+from .secrets import NETBOX_SEND_HEADERS
+
+
+debug = getLogger().debug
+
+
+def query_items(query_parameters: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """ Convert query parameters to (name, value) pairs, a list value becomes a repeated parameter """
+    items: List[Tuple[str, str]] = []
+    for name, value in query_parameters.items():
+        for single in (value if isinstance(value, (list, tuple)) else [value]):
+            items.append((name, str(single)))
+    return items
+
+
+class AsyncNetboxClient:
+    """ Bounded concurrency asyncio netbox client
+
+    Use as an async context manager:
+
+        async with AsyncNetboxClient() as client:
+            connections, racks = await asyncio.gather(
+                client.fetch_all(NetboxQuery.INTERFACECONNECTIONS, {"site": "hkg1"}, InterfaceConnection.jsonToObj),
+                client.fetch_all(NetboxQuery.RACKS, {"site": "hkg1"}, Rack.jsonToObj))
+
+    base_url : str
+        api root, defaults to ``NetboxRequest._BASE_URL``; point at a local stand-in server for testing
+    concurrency : int
+        maximum requests in flight (and connections open) at once, defaults to ``NetboxRequest.concurrency``
+    page_size : int
+        results per page when paginating, defaults to ``NetboxRequest.page_size``
+    use_cache : bool
+        read responses from, and store them in, the response cache shared with ``NetboxRequest``
+    """
+
+    def __init__(self,
+                 base_url: str = None,
+                 concurrency: int = None,
+                 page_size: int = None,
+                 headers: Dict[str, str] = None,
+                 verify: bool = None,
+                 timeout: float = None,
+                 use_cache: bool = True) -> None:
+        """ Init """
+        self.base_url: str      = base_url if base_url is not None else NetboxRequest._BASE_URL
+        self.concurrency: int   = concurrency if concurrency is not None else NetboxRequest.concurrency
+        self.page_size: int     = page_size if page_size is not None else NetboxRequest.page_size
+        self.headers: Dict[str, str] = headers if headers is not None else NETBOX_SEND_HEADERS
+        self.verify: bool       = verify if verify is not None else NetboxSession.verify
+        self.timeout: float     = timeout if timeout is not None else NetboxSession.timeout
+        self.use_cache: bool    = use_cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncNetboxClient":
+        connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                         limit_per_host=self.concurrency,
+                                         ssl=None if self.verify else False)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              headers=self.headers,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+        self._session = None
+
+    @property
+    def response_cache(self) -> ResponseCache:
+        """ Return the response store shared with ``NetboxRequest`` """
+        return ResponseCache.open(os.path.join(NetboxRequest.cache_dir, NetboxRequest.cache_file_name))
+
+    async def cache_call(self, method: str, *args) -> Any:
+        """ Call ``method`` of the response cache on the loop's default executor, SQLite blocks and would stall every request in flight """
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: getattr(self.response_cache, method)(*args))
+
+    async def get(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, Any]) -> bytes:
+        """ GET ``query_endpoint`` and return the raw body, responses are read from and stored in the response cache """
+        key = ResponseCache.key(query_endpoint, query_parameters)
+        if self.use_cache:
+            cached = await self.cache_call("get", key)
+            CACHE.inc(endpoint=query_endpoint.name, result="miss" if cached is None else "hit")
+            if cached is not None:
+                RESPONSE_BYTES.inc(len(cached.content), endpoint=query_endpoint.name, source="cache")
+                return cached.content
+        query_parameters = dict(query_parameters)
+        if type(query_endpoint.value) is tuple:
+            query_endpoint_str = f"{query_endpoint.value[0]}{query_parameters.pop(query_endpoint.value[1])}/"
+        else:
+            query_endpoint_str = str(query_endpoint.value)
+        async with self._semaphore:
+            debug(f"AsyncNetboxClient GET {query_endpoint_str} {query_parameters}")
+            start = time.perf_counter()
+            try:
+                async with self._session.get(self.base_url + query_endpoint_str, params=query_items(query_parameters)) as response:
+                    REQUESTS.inc(endpoint=query_endpoint.name, status=response.status)
+                    response.raise_for_status()
+                    body = await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                REQUESTS.inc(endpoint=query_endpoint.name, status="error")
+                raise
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=query_endpoint.name)
+            RESPONSE_BYTES.inc(len(body), endpoint=query_endpoint.name, source="network")
+        if self.use_cache:
+            await self.cache_call("put", key, query_endpoint.name, response.status, body)
+        return body
+
+    async def fetch_page(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, Any], json_callback: Callable = None) -> dict:
+        """ Request one page of a list endpoint and decode it through ``json_callback`` """
+        body = await self.get(query_endpoint, query_parameters)
+        return json.loads(body, object_hook=json_callback)
+
+    async def fetch_object(self, query_endpoint: NetboxQuery, obj_id: int, json_callback: Callable = None) -> Any:
+        """ Request a single object from an id endpoint (eg: ``NetboxQuery.DEVICE``) """
+        body = await self.get(query_endpoint, {"id": obj_id})
+        return json.loads(body, object_hook=json_callback)
+
+    async def iter_results(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, Any], json_callback: Callable = None) -> AsyncIterator[Any]:
+        """ Yield every result of a list endpoint, the pages after the first are all requested concurrently """
+        query_parameters = dict(query_parameters, limit=self.page_size)
+        first_page = await self.fetch_page(query_endpoint, query_parameters, json_callback)
+        offsets = range(self.page_size, first_page["count"], self.page_size)
+        pages = [asyncio.ensure_future(self.fetch_page(query_endpoint, dict(query_parameters, offset=offset), json_callback))
+                 for offset in offsets]
+        try:
+            for result in first_page["results"]:
+                yield result
+            for page in pages:
+                for result in (await page)["results"]:
+                    yield result
+        finally:
+            for page in pages:
+                page.cancel()
+
+    async def fetch_all(self, query_endpoint: NetboxQuery, query_parameters: Dict[str, Any], json_callback: Callable = None) -> List[Any]:
+        """ Return every result of a list endpoint """
+        return [result async for result in self.iter_results(query_endpoint, query_parameters, json_callback)]
+
+    async def fetch_many(self, queries: Dict[str, Tuple[NetboxQuery, Dict[str, Any], Optional[Callable]]]) -> Dict[str, List[Any]]:
+        """ Fetch several list queries concurrently, ``queries`` maps a name to (endpoint, parameters, json_callback) """
+        results = await asyncio.gather(*[self.fetch_all(*query) for query in queries.values()])
+        return dict(zip(queries.keys(), results))
+
+    async def fetch_by_ids(self, cls: Type[NetboxData], ids: List[int]) -> List[NetboxData]:
+        """ Load the full records of ``cls`` for ``ids`` with concurrent chunked ``id__in`` requests """
+        query_endpoint = NetboxQuery[f"{cls.__name__.upper()}S"]
+        chunks = await asyncio.gather(*[self.fetch_all(query_endpoint, {"id__in": ",".join(chunk)}, cls.jsonToObj)
+                                        for chunk in chunk_ids(sorted(ids))])
+        return [obj for chunk in chunks for obj in chunk if isinstance(obj, NetboxData)]
+
+    async def prefetch_related(self, objects: List[NetboxData], classes: Tuple[Type[NetboxData], ...] = RESOLVABLE_CLASSES) -> int:
+        """ Async ``classdef.prefetch.prefetch_related``, the classes of each pass are fetched concurrently """
+        loaded = 0
+        attempted = set()
+        frontier = list(objects)
+        while frontier:
+            fetches = []
+            for cls, by_id in find_unresolved(frontier, classes).items():
+                ids = [obj_id for obj_id in by_id if (cls, obj_id) not in attempted]
+                attempted.update((cls, obj_id) for obj_id in ids)
+                if ids:
+                    fetches.append(self.fetch_by_ids(cls, ids))
+            frontier = [obj for fetched in await asyncio.gather(*fetches) for obj in fetched]
+            loaded += len(frontier)
+        return loaded
+
+    async def fetch_site(self, site: str, resolve_related: bool = True) -> List[InterfaceConnection]:
+        """ Load the DataCenter, Racks, Devices and InterfaceConnections of ``site`` concurrently
+
+        Returns the InterfaceConnections, with anything they reference still unresolved loaded afterwards.
+        """
+        results = await self.fetch_many({
+            "datacenters":           ( NetboxQuery.DATACENTERS, {"slug": site.lower()}, DataCenter.jsonToObj ),
+            "racks":                 ( NetboxQuery.RACKS, {"site": site.lower()}, Rack.jsonToObj ),
+            "devices":               ( NetboxQuery.DEVICES, {"site": site.lower()}, Device.jsonToObj ),
+            "interface_connections": ( NetboxQuery.INTERFACECONNECTIONS, {"site": site.lower()}, InterfaceConnection.jsonToObj ),
+        })
+        interface_connections = results["interface_connections"]
+        if resolve_related:
+            await self.prefetch_related(interface_connections)
+        return interface_connections
+
+
+def fetch_site(site: str, **client_options) -> List[InterfaceConnection]:
+    """ Synchronous entry point, run ``AsyncNetboxClient.fetch_site`` in a new event loop """
+    async def run() -> List[InterfaceConnection]:
+        async with AsyncNetboxClient(**client_options) as client:
+            return await client.fetch_site(site)
+    return asyncio.run(run())
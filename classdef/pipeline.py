@@ -0,0 +1,163 @@
+""" Streaming export of InterfaceConnections into a Google Sheet
+
+Rather than rendering every row into one GridData sent in a single ``spreadsheets().create``,
+``RowPipeline`` appends the rows to an existing sheet in chunks (``appendCells``). Connections are
+streamed from netbox (``getInterfaceConnections(stream=True)``) and rendered a chunk at a time on a
+producer thread, while the main thread uploads the previous chunk; at most ``queue_size`` rendered
+chunks wait for upload, so memory stays bounded whatever the size of the site.
+
+    service = sheets_service()
+    export_site_streaming(service, "hkg1")
+"""
+
+import queue
+import threading
+import time
+from itertools import islice
+from logging import getLogger
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .netbox import InterfaceConnection
+from .columnar import ConnectionTable
+from .sheet import RowData, Spreadsheet, SpreadsheetProperties, Sheet, SheetProperties
+from .export import connection_banding
+
+
+debug = getLogger().debug
+
+# marks the end of the rendered chunks on the queue
+END = object()
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """ Yield lists of ``size`` consecutive items of ``iterable``, the last one shorter """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_chunks(connections: Iterable[InterfaceConnection], chunk_size: int) -> Iterator[List[RowData]]:
+    """ Yield the RowData of ``connections``, ``chunk_size`` rows at a time, consuming the connections lazily """
+    for chunk in chunked(connections, chunk_size):
+        yield list(ConnectionTable.fromConnections(chunk, use_numpy=False).rows())
+
+
+def append_cells_request(sheet_id: int, rows: List[RowData]) -> Dict[str, Any]:
+    """ Return the batchUpdate request appending ``rows`` after the last row of data in sheet ``sheet_id`` """
+    return {"appendCells": {"sheetId": sheet_id, "rows": rows, "fields": "*"}}
+
+
+def sheets_appender(service: Any, spreadsheet_id: str, sheet_id: int = 0) -> Callable[[List[RowData]], Any]:
+    """ Return an upload function of ``RowPipeline`` appending each chunk to sheet ``sheet_id`` with the Sheets API ``service`` """
+    def upload(rows: List[RowData]) -> Any:
+        body = {"requests": [append_cells_request(sheet_id, rows)]}
+        return service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+    return upload
+
+
+class RowPipeline:
+    """ Render chunks of rows on a producer thread and upload them as they are ready
+
+    chunks : Iterable[List[RowData]]
+        lazily rendered chunks, eg: ``render_chunks``; iterated on the producer thread
+    upload : Callable[[List[RowData]], Any]
+        sends one chunk, eg: ``sheets_appender``; called on the calling thread, in order
+    queue_size : int
+        rendered chunks allowed to wait for upload
+    """
+
+    queue_size: int = 2
+
+    def __init__(self, chunks: Iterable[List[RowData]], upload: Callable[[List[RowData]], Any], queue_size: Optional[int] = None) -> None:
+        """ Init """
+        self.chunks = chunks
+        self.upload = upload
+        self.queue_size = queue_size if queue_size is not None else self.__class__.queue_size
+        self.rows: int = 0
+        self.uploads: int = 0
+        # seconds the producer spent fetching and rendering, and the uploader spent uploading and waiting for chunks
+        self.render_time: float = 0.0
+        self.upload_time: float = 0.0
+        self.wait_time: float = 0.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def _put(self, item: Any) -> bool:
+        """ Queue ``item`` unless the uploader stopped, return False if it did """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self) -> None:
+        try:
+            chunks = iter(self.chunks)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                chunk = next(chunks, END)
+                self.render_time += time.perf_counter() - start
+                if chunk is END or not self._put(chunk):
+                    break
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._put(END)
+
+    def run(self) -> int:
+        """ Upload every chunk, return the rows uploaded; an error producing or uploading a chunk stops both and is raised """
+        producer = threading.Thread(target=self._produce, name="RowPipeline-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                chunk = self._queue.get()
+                self.wait_time += time.perf_counter() - start
+                if chunk is END:
+                    break
+                start = time.perf_counter()
+                self.upload(chunk)
+                self.upload_time += time.perf_counter() - start
+                self.uploads += 1
+                self.rows += len(chunk)
+                debug(f"uploaded chunk {self.uploads}, {self.rows} rows")
+        finally:
+            self._stop.set()
+            producer.join()
+        if self._error is not None:
+            raise self._error
+        return self.rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "uploads": self.uploads, "render_time": self.render_time,
+                "upload_time": self.upload_time, "wait_time": self.wait_time}
+
+
+def export_site_streaming(service: Any,
+                          site: str,
+                          title: Optional[str] = None,
+                          chunk_size: int = 1000,
+                          queue_size: Optional[int] = None) -> str:
+    """ Create a spreadsheet with an empty sheet for ``site`` and stream the site's connections into it, return its id
+
+    The banding is added once the rows are uploaded, when their number is known.
+    """
+    properties = SpreadsheetProperties(title = title) if title is not None else SpreadsheetProperties()
+    body = Spreadsheet(sheets = [Sheet(properties = SheetProperties(title = site, index = 0, sheetId = 0))], properties = properties)
+    spreadsheet_id = service.spreadsheets().create(body=body, fields="spreadsheetId").execute()["spreadsheetId"]
+
+    connections = InterfaceConnection.getInterfaceConnections(data_center=site, stream=True)
+    pipeline = RowPipeline(render_chunks(connections, chunk_size), sheets_appender(service, spreadsheet_id, 0), queue_size)
+    rows = pipeline.run()
+    debug(f"streamed {site} into {spreadsheet_id}: {pipeline.stats()}")
+
+    if rows:
+        body = {"requests": [{"addBanding": {"bandedRange": connection_banding(rows, 0)}}]}
+        service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+    return spreadsheet_id
@@ -0,0 +1,123 @@
+""" Batch resolution of related netbox objects
+
+Objects nested inside a netbox response are only briefs (id, url, name),
+resolving them one at a time through the lazy properties of ``NetboxData``
+costs one GET per object. ``prefetch_related`` instead gathers every unresolved
+object reachable from a result set and loads them with ``id__in`` filter requests,
+merging the full records into the Multiton registries before they are used.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Tuple, Type
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from .netbox import NetboxData, NetboxQuery, NetboxRequest, Interface, Device, Rack
+
+
+debug = getLogger().debug
+
+# classes which are resolved by default, in the order they are reached from an InterfaceConnection
+RESOLVABLE_CLASSES: Tuple[Type[NetboxData], ...] = ( Interface, Device, Rack )
+
+# maximum length of the encoded ``id__in`` value of a single request, keeps the URL well under server limits
+ID_FILTER_LENGTH: int = 1800
+
+# objects resolved together by ``prefetch_batches``
+BATCH_SIZE: int = 1000
+
+
+def related_objects(obj: NetboxData) -> Iterator[NetboxData]:
+    """ Yield every ``NetboxData`` object directly referenced by ``obj`` """
+    for field in NetboxData.field_to_object_map.values():
+        related = getattr(obj, field["obj_attr"], None)
+        if isinstance(related, NetboxData):
+            yield related
+
+
+def chunk_ids(ids: Iterable[int], max_length: int = ID_FILTER_LENGTH, separator_length: int = 3) -> Iterator[List[str]]:
+    """ Split ``ids`` into lists whose url encoded ``id__in`` value fits within ``max_length``
+
+    separator_length : int
+        length of what separates the ids, 3 for the url encoded comma of ``id__in``,
+        ``len("&device_id=")`` when each id is sent as a repeated parameter
+    """
+    chunk: List[str] = []
+    length = 0
+    for obj_id in ids:
+        id_str = str(obj_id)
+        # each id is followed by a separator, a comma is sent url encoded as %2C
+        id_length = len(id_str) + separator_length
+        if chunk and length + id_length > max_length:
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(id_str)
+        length += id_length
+    if chunk:
+        yield chunk
+
+
+def find_unresolved(objects: Iterable[NetboxData], classes: Tuple[Type[NetboxData], ...] = RESOLVABLE_CLASSES) -> Dict[Type[NetboxData], Dict[int, NetboxData]]:
+    """ Walk the object graph from ``objects`` and return unresolved objects of ``classes`` by class and id """
+    unresolved: Dict[Type[NetboxData], Dict[int, NetboxData]] = {}
+    seen = set()
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if type(obj) in classes and not obj.is_resolved:
+            unresolved.setdefault(type(obj), {})[obj.id] = obj
+        stack.extend(related_objects(obj))
+    return unresolved
+
+
+def fetch_by_ids(cls: Type[NetboxData], ids: Iterable[int], concurrency: int = None) -> List[NetboxData]:
+    """ Load the full records of ``cls`` for ``ids`` with chunked ``id__in`` requests, return the hydrated objects """
+    concurrency = concurrency if concurrency is not None else NetboxRequest.concurrency
+    query_endpoint = NetboxQuery[f"{cls.__name__.upper()}S"]
+    chunks = list(chunk_ids(sorted(ids)))
+    debug(f"prefetch {cls.__name__} {sum(len(chunk) for chunk in chunks)} ids in {len(chunks)} requests")
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        # requests are made by the workers, hydration into the registries stays on this thread
+        pending = [executor.submit(NetboxRequest, query_endpoint, {"id__in": ",".join(chunk)}, json_callback = cls.jsonToObj)
+                   for chunk in chunks]
+        return [obj for request in pending for obj in request.result().results if isinstance(obj, NetboxData)]
+
+
+def prefetch_related(objects: Iterable[NetboxData], classes: Tuple[Type[NetboxData], ...] = RESOLVABLE_CLASSES, concurrency: int = None) -> int:
+    """ Resolve every object of ``classes`` reachable from ``objects`` in bulk
+
+    Runs in passes, as resolving an object (eg: a Device) can reveal further unresolved objects (its Rack).
+    Returns the number of objects loaded.
+    """
+    loaded = 0
+    attempted = set()
+    frontier = list(objects)
+    while frontier:
+        unresolved = find_unresolved(frontier, classes)
+        frontier = []
+        for cls, by_id in unresolved.items():
+            # an id which netbox did not return is not asked for again
+            ids = [obj_id for obj_id in by_id if (cls, obj_id) not in attempted]
+            attempted.update((cls, obj_id) for obj_id in ids)
+            if ids:
+                fetched = fetch_by_ids(cls, ids, concurrency)
+                loaded += len(fetched)
+                frontier.extend(fetched)
+    return loaded
+
+
+def prefetch_batches(objects: Iterable[NetboxData], batch_size: int = None, classes: Tuple[Type[NetboxData], ...] = RESOLVABLE_CLASSES) -> Iterator[NetboxData]:
+    """ Yield ``objects`` with their related objects resolved, consuming and resolving ``batch_size`` (default ``BATCH_SIZE``) objects at a time """
+    batch_size = batch_size if batch_size is not None else BATCH_SIZE
+    batch: List[NetboxData] = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            prefetch_related(batch, classes)
+            yield from batch
+            batch = []
+    if batch:
+        prefetch_related(batch, classes)
+        yield from batch
@@ -0,0 +1,309 @@
+""" Indexed store of raw netbox responses
+
+Every cached response is one row of a single SQLite database, holding only the
+raw body bytes, the status code and when it was fetched, under a short hashed key.
+Writes are single transactions and the database runs in WAL mode, so concurrent
+exporters (threads or processes) never read a partially written entry.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+
+
+debug = getLogger().debug
+
+
+class CachedResponse:
+    """ Response read back from the cache, provides the parts of ``requests.Response`` used on responses """
+
+    __slots__ = ("content", "status_code", "fetched")
+
+    def __init__(self, content: bytes, status_code: int, fetched: float) -> None:
+        """ Init """
+        self.content: bytes     = content
+        self.status_code: int   = status_code
+        self.fetched: float     = fetched
+
+    @property
+    def ok(self) -> bool:
+        """ True if the status code is not an error, as ``requests.Response.ok`` """
+        return self.status_code < 400
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    @property
+    def text(self) -> str:
+        """ Return body decoded as text """
+        return self.content.decode("utf-8")
+
+    def json(self, **kwargs) -> Any:
+        """ Decode body as JSON, ``kwargs`` are passed to ``json.loads`` (eg: ``object_hook``) """
+        return json.loads(self.content, **kwargs)
+
+
+class SQLiteStore:
+    """ Base for the SQLite backed stores, one instance per database file (see ``open``)
+
+    Subclasses define ``SCHEMA_VERSION`` and ``create_tables``.
+    """
+
+    # bump when the table layout changes, an older database is discarded and recreated
+    SCHEMA_VERSION: int = 0
+
+    _open_stores: Dict[Tuple[type, str], "SQLiteStore"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        """ Init, prefer ``open`` which shares instances by path """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.create_schema()
+
+    @classmethod
+    def open(cls, path: str):
+        """ Return the shared store for the database at ``path`` """
+        path = os.path.abspath(path)
+        with SQLiteStore._open_lock:
+            if (cls, path) not in SQLiteStore._open_stores:
+                SQLiteStore._open_stores[(cls, path)] = cls(path)
+            return SQLiteStore._open_stores[(cls, path)]
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Return this thread's connection to the database, connections are not shared between threads or processes """
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def create_schema(self) -> None:
+        """ Create the tables, discarding any from an older schema version """
+        connection = self.connection
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if connection.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                self.create_tables(connection)
+                connection.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """ Drop and create this store's tables """
+        raise NotImplementedError
+
+
+class ResponseCache(SQLiteStore):
+    """ SQLite backed response store, one instance per database file (see ``ResponseCache.open``)
+
+    Entries expire after the TTL of their endpoint (``ttl``, keyed by ``NetboxQuery`` name),
+    an expired entry is a miss and is replaced by the next fetch or removed by ``purge``.
+    The bodies are kept within ``max_bytes``, least recently used entries are evicted first.
+    """
+
+    SCHEMA_VERSION: int = 2
+
+    # seconds an entry stays valid, by endpoint name, topology changes far less often than cabling
+    ttl: Dict[str, float] = {
+        "DATACENTERS":          7 * 24 * 3600,
+        "RACKS":                24 * 3600,
+        "DEVICES":              6 * 3600,
+        "DEVICE":               6 * 3600,
+        "INTERFACES":           3600,
+        "INTERFACE":            3600,
+        "INTERFACECONNECTIONS": 900,
+    }
+    # TTL of an endpoint missing from ``ttl``
+    default_ttl: float = 3600
+    # on disk budget for the stored bodies
+    max_bytes: int = 1024 ** 3
+    # eviction stops once the total is back under this fraction of ``max_bytes``
+    evict_to: float = 0.9
+    # an entry's access time is only rewritten when older than this, saves a write per hit
+    access_resolution: float = 60
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """ Drop and create the response tables """
+        connection.execute("DROP TABLE IF EXISTS responses")
+        connection.execute("DROP TABLE IF EXISTS totals")
+        connection.execute(
+            "CREATE TABLE responses ("
+            " key TEXT PRIMARY KEY,"
+            " endpoint TEXT NOT NULL,"
+            " status INTEGER NOT NULL,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " fetched REAL NOT NULL,"
+            " accessed REAL NOT NULL"
+            ") WITHOUT ROWID")
+        connection.execute("CREATE INDEX responses_accessed ON responses (accessed)")
+        # running total of ``responses.size``, kept in step by every write so the budget check never scans
+        connection.execute("CREATE TABLE totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        connection.execute("INSERT INTO totals VALUES ('bytes', 0)")
+
+    @staticmethod
+    def key(query_endpoint: Any, query_parameters: Dict[str, Any]) -> str:
+        """ Return compact key for an endpoint and its query parameters """
+        query = repr(query_endpoint) + repr(sorted(query_parameters.items()))
+        return hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+
+    def ttl_for(self, endpoint: str) -> float:
+        """ Return the TTL in seconds for entries of ``endpoint`` """
+        return self.ttl.get(endpoint, self.default_ttl)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """ Return the cached response stored under ``key``, None if not present or expired """
+        row = self.connection.execute("SELECT body, status, fetched, endpoint, accessed FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        body, status, fetched, endpoint, accessed = row
+        now = time.time()
+        if now - fetched > self.ttl_for(endpoint):
+            debug(f"ResponseCache expired {endpoint} {key}")
+            return None
+        if now - accessed > self.access_resolution:
+            with self.connection as connection:
+                connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return CachedResponse(body, status, fetched)
+
+    def put(self, key: str, endpoint: str, status: int, body: bytes) -> None:
+        """ Store (or replace) a response body under ``key``, evicting least recently used entries when over budget """
+        now = time.time()
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            previous = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute("INSERT OR REPLACE INTO responses (key, endpoint, status, body, size, fetched, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (key, endpoint, status, body, len(body), now, now))
+            self._add_bytes(connection, len(body) - (previous[0] if previous else 0))
+            if self.total_bytes(connection) > self.max_bytes:
+                self._evict(connection, int(self.max_bytes * self.evict_to))
+        debug(f"ResponseCache stored {endpoint} {key} ({len(body)} bytes)")
+
+    def delete(self, key: str) -> None:
+        """ Remove the entry stored under ``key`` """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            previous = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._add_bytes(connection, -previous[0])
+
+    def clear(self) -> None:
+        """ Remove every entry """
+        self.purge(expired_only=False)
+
+    def total_bytes(self, connection: sqlite3.Connection = None) -> int:
+        """ Return the total size of the stored bodies """
+        connection = connection if connection is not None else self.connection
+        return connection.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()[0]
+
+    @staticmethod
+    def _add_bytes(connection: sqlite3.Connection, size: int) -> None:
+        connection.execute("UPDATE totals SET value = value + ? WHERE name = 'bytes'", (size,))
+
+    def _evict(self, connection: sqlite3.Connection, target_bytes: int) -> int:
+        """ Delete least recently used entries until the total is at most ``target_bytes``, return number evicted """
+        total = self.total_bytes(connection)
+        evicted = 0
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= target_bytes:
+                break
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        connection.execute("UPDATE totals SET value = ? WHERE name = 'bytes'", (total,))
+        debug(f"ResponseCache evicted {evicted} entries, {total} bytes remain")
+        return evicted
+
+    def purge(self, expired_only: bool = True, endpoint: Optional[str] = None) -> int:
+        """ Remove entries and return how many were removed
+
+        expired_only : bool
+            only remove entries past their TTL, otherwise remove all (matching ``endpoint``)
+        endpoint : str
+            only consider entries of this ``NetboxQuery`` name
+        """
+        now = time.time()
+        removed = size = 0
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if expired_only:
+                endpoints = [endpoint] if endpoint is not None else [row[0] for row in connection.execute("SELECT DISTINCT endpoint FROM responses")]
+                # each endpoint has its own TTL, so its own cutoff
+                conditions = [("endpoint = ? AND fetched < ?", (entry_endpoint, now - self.ttl_for(entry_endpoint))) for entry_endpoint in endpoints]
+            elif endpoint is not None:
+                conditions = [("endpoint = ?", (endpoint,))]
+            else:
+                conditions = [("1", ())]
+            for condition, parameters in conditions:
+                count, condition_size = connection.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE {condition}", parameters).fetchone()
+                if count:
+                    connection.execute(f"DELETE FROM responses WHERE {condition}", parameters)
+                    removed += count
+                    size += condition_size
+            self._add_bytes(connection, -size)
+        return removed
+
+    def enforce_budget(self) -> int:
+        """ Evict least recently used entries until within ``max_bytes``, return number evicted """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if self.total_bytes(connection) <= self.max_bytes:
+                return 0
+            return self._evict(connection, self.max_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        """ Return entry count, bytes and expired count, in total and by endpoint """
+        now = time.time()
+        endpoints: Dict[str, Dict[str, Any]] = {}
+        for endpoint, size, fetched in self.connection.execute("SELECT endpoint, size, fetched FROM responses"):
+            entry = endpoints.setdefault(endpoint, {"entries": 0, "bytes": 0, "expired": 0, "ttl": self.ttl_for(endpoint)})
+            entry["entries"] += 1
+            entry["bytes"] += size
+            if now - fetched > self.ttl_for(endpoint):
+                entry["expired"] += 1
+        return {
+            "path":      self.path,
+            "entries":   sum(entry["entries"] for entry in endpoints.values()),
+            "bytes":     self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "expired":   sum(entry["expired"] for entry in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Cache maintenance command, eg: from cron
+
+        python -m classdef cache stats
+        python -m classdef cache purge              # expired entries, then enforce the size budget
+        python -m classdef cache purge --all --endpoint INTERFACECONNECTIONS
+    """
+    import argparse
+    from .netbox import NetboxRequest
+
+    parser = argparse.ArgumentParser(prog="python -m classdef cache", description="netbox response cache maintenance")
+    parser.add_argument("command", choices=["stats", "purge"])
+    parser.add_argument("--path", default=os.path.join(NetboxRequest.cache_dir, NetboxRequest.cache_file_name), help="cache database")
+    parser.add_argument("--all", action="store_true", help="purge entries whether expired or not")
+    parser.add_argument("--endpoint", default=None, help="only purge entries of this NetboxQuery name")
+    parser.add_argument("--max-bytes", type=int, default=None, help="size budget to enforce")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache.open(args.path)
+    if args.max_bytes is not None:
+        cache.max_bytes = args.max_bytes
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        removed = cache.purge(expired_only=not args.all, endpoint=args.endpoint)
+        evicted = cache.enforce_budget()
+        print(json.dumps({"removed": removed, "evicted": evicted, "bytes": cache.total_bytes()}))
@@ -0,0 +1,85 @@
+""" Shared HTTP session for netbox traffic """
+
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .secrets import NETBOX_SEND_HEADERS
+
+
+class NetboxSession:
+    """ Process wide pooled, keep-alive ``requests.Session`` used by every netbox request
+
+    Connections are pooled per host, ``pool_maxsize`` bounds the open connections to each host
+    and with ``pool_block`` set, requests beyond it wait for a free connection rather than opening more.
+    Change settings with ``NetboxSession.configure``, which replaces the current session.
+    """
+
+    # number of distinct hosts a pool is kept for
+    pool_connections: int = 4
+    # connections kept open per host, should be at least the fetch concurrency (``NetboxRequest.concurrency``)
+    pool_maxsize: int = 8
+    # wait for a pooled connection instead of exceeding ``pool_maxsize`` connections to a host
+    pool_block: bool = True
+    # retries of failed connections and 502/503/504 responses, with exponential backoff
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    # seconds to wait for connect / read
+    timeout: float = 60
+    verify: bool = False
+
+    _session: Optional[requests.Session] = None
+    _pid: Optional[int] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, **settings) -> None:
+        """ Update session settings (eg: ``pool_maxsize=16``), the next request opens a new session with them """
+        for name, value in settings.items():
+            if name.startswith("_") or not hasattr(cls, name) or callable(getattr(cls, name)):
+                raise AttributeError(f"{name} is not a {cls.__name__} setting")
+            setattr(cls, name, value)
+        cls.close()
+
+    @classmethod
+    def get(cls) -> requests.Session:
+        """ Return the shared session, creating it on first use (and in each new process) """
+        if cls._session is None or cls._pid != os.getpid():
+            with cls._lock:
+                # pooled sockets must not be shared with a forked process
+                if cls._session is None or cls._pid != os.getpid():
+                    cls._session = cls.create()
+                    cls._pid = os.getpid()
+        return cls._session
+
+    @classmethod
+    def create(cls) -> requests.Session:
+        """ Create a session with the configured connection pool """
+        retry = Retry(total=cls.max_retries,
+                      backoff_factor=cls.backoff_factor,
+                      status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(["GET"]))
+        adapter = HTTPAdapter(pool_connections=cls.pool_connections,
+                              pool_maxsize=cls.pool_maxsize,
+                              pool_block=cls.pool_block,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(NETBOX_SEND_HEADERS)
+        session.headers["Connection"] = "keep-alive"
+        session.verify = cls.verify
+        return session
+
+    @classmethod
+    def close(cls) -> None:
+        """ Close the shared session and its pooled connections """
+        with cls._lock:
+            if cls._session is not None and cls._pid == os.getpid():
+                cls._session.close()
+            cls._session = None
+            cls._pid = None
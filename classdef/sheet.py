@@ -36,6 +36,10 @@ class DictMask(dict):
     def itervalues(self):
         return (self[key] for key in self)
 
+    def __reduce__(self):
+        """ Pickle as a plain dict (eg: sheets rendered by export worker processes), the ``itemlist`` keys view can not be pickled """
+        return (dict, (dict(self),))
+
 
 class ExtendedValue(DictMask):
     def __init__(self,
@@ -77,7 +81,8 @@ class GridRange(DictMask):
                  endColumnIndex: int = None,
                  sheetId: int = None) -> None:
         """ Init """
-        # self.sheetId: int           = sheetId
+        if sheetId is not None:
+            self.sheetId: int               = sheetId
         self.startRowIndex: int             = startRowIndex
         self.endRowIndex: Optional[int]     = endRowIndex if endRowIndex is not None else startRowIndex
         self.startColumnIndex: int          = startColumnIndex
@@ -400,11 +405,52 @@ class DeveloperMetadata(DictMask):
         pass
 
 
+class GridProperties(DictMask):
+    """ Size of the grid of a sheet
+
+    https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#GridProperties
+    """
+
+    def __init__(self,
+                 rowCount: int = None,
+                 columnCount: int = None) -> None:
+        """ Init """
+        if rowCount is not None:
+            self.rowCount: int = rowCount
+        if columnCount is not None:
+            self.columnCount: int = columnCount
+        super().__init__(self.__dict__)
+
+
+class SheetProperties(DictMask):
+    """ Properties of a sheet (tab) of a Spreadsheet
+
+    https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#SheetProperties
+    """
+
+    def __init__(self,
+                 title: str = None,
+                 index: int = None,
+                 sheetId: int = None,
+                 gridProperties: GridProperties = None) -> None:
+        """ Init """
+        if title is not None:
+            self.title: str = title
+        if index is not None:
+            self.index: int = index
+        if sheetId is not None:
+            self.sheetId: int = sheetId
+        if gridProperties is not None:
+            self.gridProperties: GridProperties = gridProperties
+        super().__init__(self.__dict__)
+
+
 class Sheet(DictMask):
     def __init__(self,
                  data: List[GridData] = [],
                  bandedRanges: List[BandedRange] = [],
                  merges: List[GridRange] = [],
+                 properties: SheetProperties = None,
                  #  conditionalFormats: [ConditionalFormatRule] = [],
                  #  filterViews: [FilterView] = [],
                  #  protectedRanges: [ProtectedRange] = [],
@@ -416,6 +462,8 @@ class Sheet(DictMask):
                  #  developerMetadata: [DeveloperMetadata] = []
                  ) -> None:
         """ Init """
+        if properties is not None:
+            self.properties: SheetProperties = properties
         self.data: List[GridData] = data
         # self.merges: [GridRange] = merges
         self.bandedRanges: List[BandedRange] = bandedRanges
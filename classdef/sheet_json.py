@@ -0,0 +1,189 @@
+""" Compact JSON encoding of the ``classdef.sheet`` model
+
+``json.dumps(spreadsheet)`` builds the whole request body as one string, through the ``DictMask``
+overrides, and keeps every None member. ``SheetEncoder`` walks the model itself and yields the
+compact JSON in chunks, so ``dump`` writes it to a file or socket as it goes. Members which are
+None, an empty dict or an empty list are left out, the Sheets API defaults them.
+
+Rows are the bulk of a spreadsheet and repeat the same few cells (the same device or rack in many
+rows), the JSON of a cell holding only a value is memoized.
+
+    with open("body.json", "w") as f:
+        dump(spreadsheet, f)
+"""
+
+import io
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, Hashable, Iterator, List, Tuple
+
+from .sheet import CellData, ExtendedValue, RowData
+
+
+# characters collected before a chunk is yielded or written
+CHUNK_SIZE: int = 64 * 1024
+
+# memoized cell encodings kept before the memo is cleared, bounds its memory on sheets of unique values
+CELL_MEMO_SIZE: int = 64 * 1024
+
+# compact JSON of any value, C accelerated
+encode_json = json.JSONEncoder(separators=(",", ":"), check_circular=False).encode
+
+LITERALS = {True: "true", False: "false", None: "null"}
+
+
+def encode_scalar(value: Any) -> str:
+    """ Return the JSON of a str, int, bool, None or float """
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if value is True or value is False or value is None:
+        return LITERALS[value]
+    if type(value) is int:
+        return int.__repr__(value)
+    return encode_json(value)
+
+
+def is_empty(value: Any) -> bool:
+    """ Return True for the values left out of an object: None, an empty dict or an empty list """
+    return value is None or not value and (type(value) in (list, tuple) or isinstance(value, dict))
+
+
+class SheetEncoder:
+    """ Incremental compact JSON encoder of Spreadsheet, Sheet, GridData, RowData ... trees
+
+    chunk_size : int
+        characters per chunk yielded by ``iterencode``
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE) -> None:
+        """ Init """
+        self.chunk_size = chunk_size
+        self._keys: Dict[str, str] = {}
+        self._cells: Dict[Tuple[str, type, Hashable], str] = {}
+
+    def iterencode(self, obj: Any) -> Iterator[str]:
+        """ Yield the JSON of ``obj`` in chunks of about ``chunk_size`` characters """
+        parts = []
+        size = 0
+        for part in self._encode(obj):
+            parts.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield "".join(parts)
+                parts.clear()
+                size = 0
+        if parts:
+            yield "".join(parts)
+
+    def encode(self, obj: Any) -> str:
+        return "".join(self._encode(obj))
+
+    def _key(self, key: str) -> str:
+        """ Return the encoded ``"key":`` of an object member """
+        encoded = self._keys.get(key)
+        if encoded is None:
+            encoded = self._keys[key] = encode_basestring_ascii(str(key)) + ":"
+        return encoded
+
+    def _encode(self, obj: Any) -> Iterator[str]:
+        """ Yield the JSON of ``obj`` in parts, a RowData at a time """
+        if type(obj) is RowData:
+            yield self.encodeRow(obj)
+        elif isinstance(obj, dict):
+            yield "{"
+            first = True
+            # ``dict.items``, the ``DictMask`` iteration overrides yield (index, key) pairs
+            for key, value in dict.items(obj):
+                if is_empty(value):
+                    continue
+                yield self._key(key) if first else "," + self._key(key)
+                first = False
+                yield from self._encode(value)
+            yield "}"
+        elif type(obj) in (list, tuple):
+            yield "["
+            for i, value in enumerate(obj):
+                if i:
+                    yield ","
+                yield from self._encode(value)
+            yield "]"
+        else:
+            yield encode_scalar(obj)
+
+    def _append(self, obj: Any, parts: List[str]) -> None:
+        """ Append the JSON of ``obj`` to ``parts``, ``_encode`` without the generator overhead for small values """
+        if isinstance(obj, dict):
+            separator = "{"
+            for key, value in dict.items(obj):
+                if value is None or not value and (type(value) in (list, tuple) or isinstance(value, dict)):
+                    continue
+                parts.append(separator + self._key(key))
+                separator = ","
+                self._append(value, parts)
+            parts.append("{}" if separator == "{" else "}")
+        elif type(obj) in (list, tuple):
+            separator = "["
+            for value in obj:
+                parts.append(separator)
+                separator = ","
+                self._append(value, parts)
+            parts.append("[]" if separator == "[" else "]")
+        else:
+            parts.append(encode_scalar(obj))
+
+    def encodeValue(self, obj: Any) -> str:
+        """ Return the JSON of ``obj`` in one string """
+        parts: List[str] = []
+        self._append(obj, parts)
+        return "".join(parts)
+
+    def encodeRow(self, row: dict) -> str:
+        """ Return the JSON of a RowData """
+        cells = row.get("values")
+        if len(row) != 1 or type(cells) is not list:
+            return self.encodeValue(row)
+        return '{"values":[' + ",".join([self.encodeCell(cell) for cell in cells]) + "]}"
+
+    def encodeCell(self, cell: Any) -> str:
+        """ Return the JSON of a CellData, memoized when the cell holds only a value """
+        # plain dicts too, sheets rendered in another process are unpickled as dicts
+        value = cell.get("userEnteredValue") if (type(cell) is CellData or type(cell) is dict) and len(cell) == 1 else None
+        if (type(value) is not ExtendedValue and type(value) is not dict) or len(value) != 1:
+            return self.encodeValue(cell)
+        for field, scalar in dict.items(value):
+            # type is part of the key, True == 1 but they encode differently
+            memo_key = (field, type(scalar), scalar)
+        try:
+            encoded = self._cells.get(memo_key)
+        except TypeError:
+            # unhashable value
+            return self.encodeValue(cell)
+        if encoded is None:
+            if len(self._cells) >= CELL_MEMO_SIZE:
+                self._cells.clear()
+            encoded = self._cells[memo_key] = self.encodeValue(cell)
+        return encoded
+
+
+def iterencode(obj: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """ Yield the compact JSON of ``obj`` in chunks """
+    return SheetEncoder(chunk_size).iterencode(obj)
+
+
+def dumps(obj: Any) -> str:
+    """ Return the compact JSON of ``obj`` """
+    return SheetEncoder().encode(obj)
+
+
+def dump(obj: Any, fp: Any, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8") -> int:
+    """ Write the compact JSON of ``obj`` to ``fp`` chunk by chunk, return the characters written
+
+    fp is a text file, or a binary file or socket (``sendall``) which is written ``encoding`` encoded
+    """
+    text = isinstance(fp, io.TextIOBase)
+    write = fp.write if text or not hasattr(fp, "sendall") else fp.sendall
+    written = 0
+    for chunk in iterencode(obj, chunk_size):
+        write(chunk if text else chunk.encode(encoding))
+        written += len(chunk)
+    return written
@@ -0,0 +1,226 @@
+""" Export of InterfaceConnections to local files: CSV, XLSX or Parquet
+
+A file is often all a consumer needs, and writing one needs neither the Sheets API nor its quotas.
+Connections are streamed from netbox and rendered a chunk at a time by the same ``RowPipeline`` as
+``export_site_streaming``, but into a ``RowSink`` rather than a sheet: each chunk of records (the
+values of a sheet row, led by the site) is written as it comes, so only ``queue_size`` chunks are held
+whatever the number of rows. Sites are written one after the other into the same file.
+
+``XlsxSink`` needs openpyxl and ``ParquetSink`` pyarrow, both optional.
+
+A file is written under a temporary name and renamed once complete, an export which fails leaves
+no partial file behind.
+
+    export_sites_file(["hkg1", "sin1"], "connections.parquet")
+"""
+
+import csv
+import os
+from logging import getLogger
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .netbox import InterfaceConnection
+from .columnar import ConnectionTable, RECORD_FIELDS
+from .pipeline import RowPipeline, chunked
+from .metrics import ROWS
+
+
+debug = getLogger().debug
+
+# columns of an exported file
+FIELDS: Tuple[str, ...] = ("site",) + RECORD_FIELDS
+
+# columns holding integers, the others but ``connected`` hold strings
+INTEGER_FIELDS = frozenset(field for field in FIELDS if field.startswith("rack_unit"))
+
+
+class RowSink:
+    """ Writes chunks of records, tuples of ``fields`` values, to the file ``path``
+
+    Used as a context manager, the file is only in place once the block completes without error.
+    """
+
+    def __init__(self, path: str, fields: Tuple[str, ...] = FIELDS) -> None:
+        """ Init """
+        self.path = path
+        self.fields = fields
+        self.rows: int = 0
+        self.temporary_path = f"{path}.partial"
+
+    def __enter__(self) -> "RowSink":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self) -> None:
+        """ Create the file and write its header """
+        raise NotImplementedError
+
+    def write(self, records: List[tuple]) -> None:
+        """ Write a chunk of records """
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """ Write what remains and close the file """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """ Complete the file and move it into place """
+        self.finish()
+        os.replace(self.temporary_path, self.path)
+        debug(f"wrote {self.rows} rows to {self.path}")
+
+    def abort(self) -> None:
+        """ Close and remove the incomplete file """
+        try:
+            self.finish()
+        finally:
+            if os.path.exists(self.temporary_path):
+                os.remove(self.temporary_path)
+
+
+class CsvSink(RowSink):
+    """ Comma separated values, with a header line; None is written as an empty field """
+
+    def open(self) -> None:
+        self._file = open(self.temporary_path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fields)
+
+    def write(self, records: List[tuple]) -> None:
+        self._writer.writerows(records)
+        self.rows += len(records)
+
+    def finish(self) -> None:
+        self._file.close()
+
+
+class XlsxSink(RowSink):
+    """ Excel workbook, written with openpyxl's write only mode which streams rows to disk
+
+    A worksheet holds at most ``max_rows`` rows (header included), the rows continue on another worksheet.
+    """
+
+    max_rows: int = 2**20
+    sheet_title: str = "connections"
+
+    def open(self) -> None:
+        if openpyxl is None:
+            raise ImportError("openpyxl is required to write xlsx files")
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._worksheet = None
+        self._worksheet_rows = 0
+
+    def add_worksheet(self) -> None:
+        """ Start a worksheet, with the header row """
+        count = len(self._workbook.worksheets)
+        self._worksheet = self._workbook.create_sheet(self.sheet_title if not count else f"{self.sheet_title} {count + 1}")
+        self._worksheet.append(self.fields)
+        self._worksheet_rows = 1
+
+    def write(self, records: List[tuple]) -> None:
+        for record in records:
+            if self._worksheet is None or self._worksheet_rows >= self.max_rows:
+                self.add_worksheet()
+            self._worksheet.append(record)
+            self._worksheet_rows += 1
+        self.rows += len(records)
+
+    def finish(self) -> None:
+        if self._worksheet is None:
+            self.add_worksheet()
+        self._workbook.save(self.temporary_path)
+
+
+class ParquetSink(RowSink):
+    """ Parquet file written with pyarrow, records are buffered into row groups of ``row_group_size`` rows """
+
+    row_group_size: int = 65536
+    compression: str = "snappy"
+
+    def schema(self) -> "pyarrow.Schema":
+        types = {"connected": pyarrow.bool_()}
+        return pyarrow.schema([(field, types.get(field, pyarrow.int64() if field in INTEGER_FIELDS else pyarrow.string()))
+                               for field in self.fields])
+
+    def open(self) -> None:
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to write parquet files")
+        self._schema = self.schema()
+        self._writer = pyarrow.parquet.ParquetWriter(self.temporary_path, self._schema, compression=self.compression)
+        self._buffer: List[tuple] = []
+
+    def flush(self) -> None:
+        """ Write the buffered records as a row group """
+        if self._buffer:
+            columns = [pyarrow.array(column, type=field.type) for column, field in zip(zip(*self._buffer), self._schema)]
+            self._writer.write_table(pyarrow.Table.from_arrays(columns, schema=self._schema))
+            self._buffer = []
+
+    def write(self, records: List[tuple]) -> None:
+        self._buffer.extend(records)
+        self.rows += len(records)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def finish(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+
+
+# sinks by format name
+SINKS: Dict[str, Type[RowSink]] = {
+    "csv":     CsvSink,
+    "xlsx":    XlsxSink,
+    "parquet": ParquetSink,
+}
+
+
+def open_sink(path: str, file_format: Optional[str] = None) -> RowSink:
+    """ Return the sink writing ``path`` in ``file_format``, default from the suffix of ``path`` """
+    if file_format is None:
+        file_format = os.path.splitext(path)[1].lstrip(".").lower()
+    cls = SINKS.get(file_format)
+    if cls is None:
+        raise ValueError(f"no sink writes {file_format or path!r} files, known formats: {', '.join(SINKS)}")
+    return cls(path)
+
+
+def record_chunks(site: str, connections: Iterable[InterfaceConnection], chunk_size: int) -> Iterator[List[tuple]]:
+    """ Yield the records of ``connections`` of ``site``, ``chunk_size`` at a time, consuming the connections lazily """
+    for chunk in chunked(connections, chunk_size):
+        yield [(site,) + record for record in ConnectionTable.fromConnections(chunk, use_numpy=False).records()]
+
+
+def export_sites_file(sites: List[str],
+                      path: str,
+                      file_format: Optional[str] = None,
+                      chunk_size: int = 10000,
+                      queue_size: Optional[int] = None) -> int:
+    """ Write the connections of every site of ``sites`` to the file ``path``, return the rows written """
+    with open_sink(path, file_format) as sink:
+        for site in sites:
+            connections = InterfaceConnection.getInterfaceConnections(data_center=site, stream=True)
+            pipeline = RowPipeline(record_chunks(site, connections, chunk_size), sink.write, queue_size)
+            pipeline.run()
+            debug(f"exported {site} to {path}: {pipeline.stats()}")
+    ROWS.inc(sink.rows, output="file")
+    return sink.rows
@@ -0,0 +1,159 @@
+""" Incremental sync of netbox objects using ``last_updated`` watermarks
+
+The first sync of a scope (an endpoint and its filters, eg: InterfaceConnections of site hkg1)
+downloads every object and stores each one's JSON along with the highest ``last_updated`` seen.
+Later syncs only request objects changed since that watermark (``last_updated__gte``), merge
+them into the stored set and the Multiton registries, and detect deletions by comparing the
+server's ``count`` for the scope with the stored set, listing ids only when they differ.
+
+Objects without ``last_updated`` give the scope no watermark, and without one every sync is a full
+download. NetBox 2.x serves interface-connections without ``last_updated``, so there only the devices
+and racks of the site are synced incrementally.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from logging import getLogger
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Type, Union
+
+from .netbox import NetboxData, NetboxQuery, NetboxRequest
+from .response_cache import ResponseCache, SQLiteStore
+
+
+debug = getLogger().debug
+
+
+class SyncStore(SQLiteStore):
+    """ Persisted object sets and watermarks of incrementally synced scopes """
+
+    SCHEMA_VERSION: int = 1
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """ Drop and create the sync tables """
+        connection.execute("DROP TABLE IF EXISTS watermarks")
+        connection.execute("DROP TABLE IF EXISTS objects")
+        connection.execute(
+            "CREATE TABLE watermarks ("
+            " scope TEXT PRIMARY KEY,"
+            " endpoint TEXT NOT NULL,"
+            " watermark TEXT,"
+            " synced REAL NOT NULL"
+            ") WITHOUT ROWID")
+        connection.execute(
+            "CREATE TABLE objects ("
+            " scope TEXT NOT NULL,"
+            " id INTEGER NOT NULL,"
+            " body BLOB NOT NULL,"
+            " PRIMARY KEY (scope, id)"
+            ") WITHOUT ROWID")
+
+    def watermark(self, scope: str) -> Optional[Dict[str, Any]]:
+        """ Return the watermark row of ``scope``, None if it has never been synced """
+        row = self.connection.execute("SELECT watermark, synced FROM watermarks WHERE scope = ?", (scope,)).fetchone()
+        if row is None:
+            return None
+        return {"watermark": row[0], "synced": row[1]}
+
+    def ids(self, scope: str) -> Set[int]:
+        """ Return the ids stored for ``scope`` """
+        return {row[0] for row in self.connection.execute("SELECT id FROM objects WHERE scope = ?", (scope,))}
+
+    def count(self, scope: str) -> int:
+        """ Return the number of objects stored for ``scope`` """
+        return self.connection.execute("SELECT COUNT(*) FROM objects WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def bodies(self, scope: str) -> Iterable[bytes]:
+        """ Yield the stored JSON of every object of ``scope`` in id order """
+        for row in self.connection.execute("SELECT body FROM objects WHERE scope = ? ORDER BY id", (scope,)):
+            yield row[0]
+
+    def merge(self, scope: str, endpoint: str, watermark: Optional[str], changed: List[dict], removed: Iterable[int] = (), replace: bool = False) -> None:
+        """ Upsert ``changed``, delete ``removed`` and move the watermark of ``scope`` in one transaction
+
+        replace : bool
+            discard every stored object of ``scope`` first, for a full sync
+        """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if replace:
+                connection.execute("DELETE FROM objects WHERE scope = ?", (scope,))
+            connection.executemany("INSERT OR REPLACE INTO objects (scope, id, body) VALUES (?, ?, ?)",
+                                   [(scope, obj["id"], json.dumps(obj, separators=(",", ":")).encode()) for obj in changed])
+            connection.executemany("DELETE FROM objects WHERE scope = ? AND id = ?", [(scope, obj_id) for obj_id in removed])
+            connection.execute("INSERT OR REPLACE INTO watermarks (scope, endpoint, watermark, synced) VALUES (?, ?, ?, ?)",
+                               (scope, endpoint, watermark, time.time()))
+
+    def forget(self, scope: str) -> None:
+        """ Drop the stored objects and watermark of ``scope``, the next sync is a full one """
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM objects WHERE scope = ?", (scope,))
+            connection.execute("DELETE FROM watermarks WHERE scope = ?", (scope,))
+
+
+class IncrementalSync:
+    """ Keep the objects of ``cls`` matching ``query_parameters`` in sync with netbox
+
+        connections = IncrementalSync(InterfaceConnection, {"site": "hkg1"}).sync()
+
+    stream : bool
+        decode the fetched pages one object at a time, and have ``sync`` return a generator
+        hydrating the stored objects as it is consumed rather than a list
+    """
+
+    # file in ``NetboxRequest.cache_dir`` holding the synced object sets
+    store_file_name: str = "sync.sqlite3"
+
+    def __init__(self, cls: Type[NetboxData], query_parameters: Dict[str, Any], stream: bool = False) -> None:
+        """ Init """
+        self.cls = cls
+        self.stream = stream
+        self.query_endpoint: NetboxQuery = NetboxQuery[f"{cls.__name__.upper()}S"]
+        self.query_parameters: Dict[str, Any] = dict(query_parameters)
+        self.scope: str = ResponseCache.key(self.query_endpoint, self.query_parameters)
+        self.store: SyncStore = SyncStore.open(os.path.join(NetboxRequest.cache_dir, self.store_file_name))
+
+    def fetch(self, query_parameters: Dict[str, Any]) -> List[dict]:
+        """ Return every object (as JSON) matching ``query_parameters``, always from netbox """
+        return list(NetboxRequest(self.query_endpoint, query_parameters, use_cache=False, stream=self.stream).results)
+
+    def remote_count(self) -> int:
+        """ Return how many objects netbox currently has in the scope """
+        return NetboxRequest(self.query_endpoint, self.query_parameters, limit=1, use_cache=False).response.json()["count"]
+
+    def remote_ids(self) -> Set[int]:
+        """ Return the ids netbox currently has in the scope, requested in the brief representation """
+        return {obj["id"] for obj in self.fetch(dict(self.query_parameters, brief=1))}
+
+    def sync(self) -> Union[List[NetboxData], Iterator[NetboxData]]:
+        """ Bring the stored scope up to date and return all of its objects, hydrated into the registries (lazily with ``stream``) """
+        state = self.store.watermark(self.scope)
+        if state is None or state["watermark"] is None:
+            changed = self.fetch(self.query_parameters)
+            removed: Set[int] = set()
+            watermark = max((obj["last_updated"] for obj in changed if obj.get("last_updated")), default=None)
+            debug(f"IncrementalSync {self.cls.__name__} full sync of {len(changed)} objects, watermark={watermark}")
+            if watermark is None and changed:
+                debug(f"IncrementalSync {self.cls.__name__} objects have no last_updated, every sync of {self.scope} is a full one")
+            self.store.merge(self.scope, self.query_endpoint.name, watermark, changed, replace=True)
+        else:
+            changed = self.fetch(dict(self.query_parameters, last_updated__gte=state["watermark"]))
+            watermark = max([state["watermark"]] + [obj["last_updated"] for obj in changed if obj.get("last_updated")])
+            stored_ids = self.store.ids(self.scope) | {obj["id"] for obj in changed}
+            # every change since the watermark is now stored, so netbox holding as many objects as the store means nothing was deleted
+            removed = set()
+            if self.remote_count() != len(stored_ids):
+                removed = stored_ids - self.remote_ids()
+            debug(f"IncrementalSync {self.cls.__name__} {len(changed)} changed, {len(removed)} removed, watermark={watermark}")
+            self.store.merge(self.scope, self.query_endpoint.name, watermark, changed, removed)
+        for obj_id in removed:
+            self.cls._instances.pop(obj_id, None)
+        return self.hydrate()
+
+    def hydrate(self) -> Union[List[NetboxData], Iterator[NetboxData]]:
+        """ Create / merge the stored objects of the scope into the registry of ``cls``, one at a time as they are consumed with ``stream`` """
+        objects = (json.loads(body, object_hook=self.cls.jsonToObj) for body in self.store.bodies(self.scope))
+        objects = (obj for obj in objects if isinstance(obj, self.cls))
+        return objects if self.stream else list(objects)
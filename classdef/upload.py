@@ -0,0 +1,450 @@
+""" Upload of Spreadsheets within the Sheets API request limits
+
+A whole Spreadsheet in one ``spreadsheets().create`` fails once the body passes the API's request
+size or cell limits. ``SheetsUploader`` instead creates the spreadsheet without its data (the sheet
+properties, sized grids and banding) and writes the rows with ``updateCells`` requests packed into
+as few ``batchUpdate`` calls as the ``max_bytes`` and ``max_cells`` budgets allow. Rows are packed
+in order, so filling each batch before starting the next gives the fewest batches.
+
+Sizes are those of the compact JSON (``classdef.sheet_json``) which is what is sent, so a batch's
+budget is exact rather than estimated. ``updateCells`` writes to a fixed position, a batch can be
+retried without duplicating rows; each is retried on its own, one rejected as too large is split in half.
+Cell attributes repeated down a column (the checkbox validation) are hoisted by ``classdef.formatting``
+into range requests sent after the rows, rather than written on every cell.
+
+The API is reached through a transport, ``GoogleTransport`` wraps a googleapiclient service and
+``MemoryTransport`` is a local stand-in holding spreadsheets in memory, enforcing the same budget.
+
+    uploader = SheetsUploader(GoogleTransport(sheets_service()))
+    spreadsheet_id = uploader.upload(spreadsheet)
+"""
+
+import itertools
+import json
+import time
+from logging import getLogger
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .print_color import Print
+from .sheet_json import SheetEncoder
+from .formatting import FormatCompiler
+from .metrics import SHEETS_REQUESTS, SHEETS_BYTES
+
+
+debug = getLogger().debug
+
+# statuses worth retrying: rate limited and server errors
+RETRYABLE_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+class UploadError(Exception):
+    """ A request the Sheets API (or the transport) did not complete
+
+    status : int
+        HTTP status, None when no response was received
+    retryable : bool
+        the same request may succeed when sent again
+    failed : List[Segment]
+        rows and requests of the batches which failed, ``SheetsUploader.send(spreadsheet_id, [error.failed])`` sends them again
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False, failed: Optional[List["Segment"]] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.failed: List[Segment] = failed or []
+
+
+class RequestTooLarge(UploadError):
+    """ The request body is over the API's size limit """
+
+    def __init__(self, message: str, status: Optional[int] = 413) -> None:
+        super().__init__(message, status, retryable=False)
+
+
+class Segment(NamedTuple):
+    """ Consecutive rows of one sheet written by one ``updateCells`` request, ``rows`` already JSON encoded """
+    sheet_id: int
+    row_index: int
+    column_index: int
+    rows: List[str]
+    cells: int
+
+    def request(self) -> str:
+        return ('{"updateCells":{"start":{"sheetId":%d,"rowIndex":%d,"columnIndex":%d},"rows":[%s],"fields":"*"}}'
+                % (self.sheet_id, self.row_index, self.column_index, ",".join(self.rows)))
+
+    def split(self, count: int) -> List["Segment"]:
+        """ Return the segment as the first ``count`` rows and the rest """
+        head, tail = self.rows[:count], self.rows[count:]
+        head_cells = self.cells * len(head) // len(self.rows)
+        return [self._replace(rows=head, cells=head_cells),
+                self._replace(row_index=self.row_index + count, rows=tail, cells=self.cells - head_cells)]
+
+
+class RawRequest(NamedTuple):
+    """ A batchUpdate request other than writing rows (eg: insertDimension), already JSON encoded """
+    body: str
+    rows: Tuple = ()
+    cells: int = 0
+
+    def request(self) -> str:
+        return self.body
+
+
+def segment_overhead(sheet_id: int, row_index: int, column_index: int) -> int:
+    """ Return the bytes of an ``updateCells`` request of a segment besides its rows """
+    return len(Segment(sheet_id, row_index, column_index, [], 0).request())
+
+
+def batch_body(segments: List[Union[Segment, RawRequest]]) -> bytes:
+    return ('{"requests":[' + ",".join(segment.request() for segment in segments) + "]}").encode("ascii")
+
+
+# bytes of ``batch_body`` besides its requests
+BATCH_OVERHEAD: int = len(batch_body([]))
+
+
+class GoogleTransport:
+    """ Sheets API through a googleapiclient ``service`` (``build('sheets', 'v4', ...)``) """
+
+    def __init__(self, service: Any) -> None:
+        """ Init """
+        self.service = service
+
+    @staticmethod
+    def error(e: Exception) -> UploadError:
+        """ Return the UploadError of an exception raised executing a request, an HttpError carries the response status """
+        status = getattr(getattr(e, "resp", None), "status", None)
+        status = int(status) if status is not None else None
+        if status == 413:
+            return RequestTooLarge(str(e), status)
+        return UploadError(str(e), status, retryable=status is None or status in RETRYABLE_STATUSES)
+
+    def create(self, body: Dict[str, Any]) -> str:
+        """ Create a spreadsheet from ``body``, return its id """
+        try:
+            return self.service.spreadsheets().create(body=body, fields="spreadsheetId").execute()["spreadsheetId"]
+        except Exception as e:
+            raise self.error(e) from e
+
+    def batch_update(self, spreadsheet_id: str, body: bytes) -> Any:
+        """ Send the serialized batchUpdate ``body`` as is, rather than the client re-encoding a dict with whitespace """
+        request = self.service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={})
+        request.body = body
+        request.headers["content-length"] = str(len(body))
+        try:
+            return request.execute()
+        except Exception as e:
+            raise self.error(e) from e
+
+
+class MemoryTransport:
+    """ Local stand-in of the Sheets API, spreadsheets are kept in memory
+
+    Supports the requests sent by this package: updateCells, appendCells, repeatCell, setDataValidation, insertDimension,
+    appendDimension and deleteDimension of rows, and banding.
+
+    max_bytes : int
+        bodies over this are rejected with ``RequestTooLarge``, like the API's request size limit
+    fail : Callable[[int], Optional[UploadError]]
+        called with the number of each batchUpdate call (from 0), raises what it returns, to simulate failures
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, fail: Optional[Callable[[int], Optional[UploadError]]] = None) -> None:
+        """ Init """
+        self.max_bytes = max_bytes
+        self.fail = fail
+        self.spreadsheets: Dict[str, Dict[str, Any]] = {}
+        # size of each batchUpdate body received, rejected ones included
+        self.requests: List[int] = []
+        self._ids = itertools.count(1)
+
+    def create(self, body: Dict[str, Any]) -> str:
+        spreadsheet_id = f"memory-{next(self._ids)}"
+        body = json.loads(json.dumps(body))
+        grids = {}
+        for sheet in body.get("sheets", []):
+            properties = sheet.get("properties", {})
+            grid = properties.get("gridProperties", {})
+            grids[properties.get("sheetId", 0)] = [[None] * grid.get("columnCount", 26) for _ in range(grid.get("rowCount", 1000))]
+        banded_ranges = {banded_range["bandedRangeId"]: banded_range for sheet in body.get("sheets", []) for banded_range in sheet.get("bandedRanges", [])}
+        self.spreadsheets[spreadsheet_id] = {"body": body, "grids": grids, "bandedRanges": banded_ranges}
+        return spreadsheet_id
+
+    def batch_update(self, spreadsheet_id: str, body: bytes) -> Dict[str, Any]:
+        call = len(self.requests)
+        self.requests.append(len(body))
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            raise RequestTooLarge(f"request of {len(body)} bytes is over {self.max_bytes}")
+        error = self.fail(call) if self.fail is not None else None
+        if error is not None:
+            raise error
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        # applied to copies, a batchUpdate is all or nothing
+        grids = {sheet_id: [row[:] for row in grid] for sheet_id, grid in spreadsheet["grids"].items()}
+        banded_ranges = dict(spreadsheet["bandedRanges"])
+        replies = []
+        for request in json.loads(body)["requests"]:
+            (kind, update), = request.items()
+            if kind == "updateCells":
+                self.update_cells(grids, update)
+            elif kind == "appendCells":
+                self.append_cells(grids, update)
+            elif kind in ("repeatCell", "setDataValidation"):
+                cell = update["cell"] if kind == "repeatCell" else {"dataValidation": update["rule"]}
+                self.repeat_cell(grids, update["range"], cell, update.get("fields", "dataValidation").split(","))
+            elif kind in ("insertDimension", "deleteDimension"):
+                dimension = update["range"]
+                grid = grids[dimension.get("sheetId", 0)]
+                start, end = dimension["startIndex"], dimension["endIndex"]
+                if dimension["dimension"] != "ROWS" or not 0 <= start < end <= len(grid) + (kind == "insertDimension"):
+                    raise UploadError(f"{kind} {start}:{end} is outside the grid of {len(grid)} rows", 400)
+                if kind == "insertDimension":
+                    grid[start:start] = [[None] * len(grid[0]) for _ in range(end - start)]
+                elif end - start >= len(grid):
+                    raise UploadError("deleting every row of a sheet is not allowed", 400)
+                else:
+                    del grid[start:end]
+            elif kind == "appendDimension":
+                grid = grids[update.get("sheetId", 0)]
+                grid.extend([None] * len(grid[0]) for _ in range(update["length"]))
+            elif kind in ("addBanding", "updateBanding"):
+                banded_range = update["bandedRange"]
+                banded_ranges[banded_range["bandedRangeId"]] = banded_range
+            elif kind == "deleteBanding":
+                del banded_ranges[update["bandedRangeId"]]
+            else:
+                raise UploadError(f"{kind} is not supported by {self.__class__.__name__}", 400)
+            replies.append({})
+        spreadsheet.update(grids=grids, bandedRanges=banded_ranges)
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+    @staticmethod
+    def update_cells(grids: Dict[int, List[List[Any]]], update: Dict[str, Any]) -> None:
+        """ Write the rows of an updateCells request, or clear its range when it has none """
+        if "range" in update:
+            grid_range = update["range"]
+            grid = grids[grid_range.get("sheetId", 0)]
+            for row in grid[grid_range.get("startRowIndex", 0):grid_range.get("endRowIndex", len(grid))]:
+                for column in range(grid_range.get("startColumnIndex", 0), grid_range.get("endColumnIndex", len(row))):
+                    row[column] = None
+            return
+        start = update["start"]
+        grid = grids[start.get("sheetId", 0)]
+        for row_offset, row in enumerate(update["rows"]):
+            row_index = start.get("rowIndex", 0) + row_offset
+            if row_index >= len(grid):
+                raise UploadError(f"row {row_index} is outside the grid of {len(grid)} rows", 400)
+            for column_offset, cell in enumerate(row.get("values", [])):
+                grid[row_index][start.get("columnIndex", 0) + column_offset] = cell
+
+    @staticmethod
+    def append_cells(grids: Dict[int, List[List[Any]]], update: Dict[str, Any]) -> None:
+        """ Write the rows of an appendCells request after the last row holding a cell, adding rows to the grid as needed """
+        grid = grids[update.get("sheetId", 0)]
+        row_index = len(grid)
+        while row_index > 0 and not any(grid[row_index - 1]):
+            row_index -= 1
+        for row in update["rows"]:
+            if row_index >= len(grid):
+                grid.append([None] * len(grid[0]))
+            for column, cell in enumerate(row.get("values", [])):
+                grid[row_index][column] = cell
+            row_index += 1
+
+    @staticmethod
+    def repeat_cell(grids: Dict[int, List[List[Any]]], grid_range: Dict[str, int], cell: Dict[str, Any], fields: List[str]) -> None:
+        """ Set ``fields`` of every cell in ``grid_range`` to those of ``cell`` """
+        grid = grids[grid_range.get("sheetId", 0)]
+        if grid_range.get("endRowIndex", len(grid)) > len(grid):
+            raise UploadError(f"row {grid_range['endRowIndex'] - 1} is outside the grid of {len(grid)} rows", 400)
+        for row in grid[grid_range.get("startRowIndex", 0):grid_range.get("endRowIndex", len(grid))]:
+            for column in range(grid_range.get("startColumnIndex", 0), grid_range.get("endColumnIndex", len(row))):
+                merged = {key: value for key, value in (row[column] or {}).items() if key not in fields}
+                merged.update((field, cell[field]) for field in fields if field in cell)
+                row[column] = merged or None
+
+    def values(self, spreadsheet_id: str, sheet_id: int = 0) -> List[List[Any]]:
+        """ Return the cells written to sheet ``sheet_id`` """
+        return self.spreadsheets[spreadsheet_id]["grids"][sheet_id]
+
+
+class SheetsUploader:
+    """ Create a Spreadsheet through ``transport`` in batches within the API limits
+
+    max_bytes : int
+        bytes of a batchUpdate body
+    max_cells : int
+        cells written by a batchUpdate
+    retries : int
+        times a batch is sent again after a retryable error, waiting ``backoff`` seconds doubling each time
+    hoist_formats : bool
+        send cell attributes repeated down a column as range requests (``FormatCompiler``)
+    """
+
+    max_bytes: int = 2 * 2**20
+    max_cells: int = 100000
+    retries: int = 3
+    backoff: float = 1.0
+    hoist_formats: bool = True
+
+    def __init__(self,
+                 transport: Any,
+                 max_bytes: Optional[int] = None,
+                 max_cells: Optional[int] = None,
+                 retries: Optional[int] = None,
+                 backoff: Optional[float] = None,
+                 hoist_formats: Optional[bool] = None) -> None:
+        """ Init """
+        self.transport = transport
+        self.max_bytes = max_bytes if max_bytes is not None else self.__class__.max_bytes
+        self.max_cells = max_cells if max_cells is not None else self.__class__.max_cells
+        self.retries = retries if retries is not None else self.__class__.retries
+        self.backoff = backoff if backoff is not None else self.__class__.backoff
+        self.hoist_formats = hoist_formats if hoist_formats is not None else self.__class__.hoist_formats
+        self.encoder = SheetEncoder()
+
+    @staticmethod
+    def skeleton(spreadsheet: Dict[str, Any]) -> Dict[str, Any]:
+        """ Return the body creating ``spreadsheet`` without its data, each sheet's grid sized for its data """
+        sheets = []
+        for index, sheet in enumerate(spreadsheet.get("sheets", [])):
+            row_count, column_count = 1, 1
+            for grid_data in sheet.get("data", []):
+                rows = grid_data.get("rowData", [])
+                width = max((len(row.get("values", [])) for row in rows), default=0)
+                row_count = max(row_count, grid_data.get("startRow", 0) + len(rows))
+                column_count = max(column_count, grid_data.get("startColumn", 0) + width)
+            properties = dict(sheet.get("properties", {}))
+            properties.setdefault("sheetId", index)
+            properties["gridProperties"] = dict(properties.get("gridProperties", {}), rowCount=row_count, columnCount=column_count)
+            sheet = {key: value for key, value in dict.items(sheet) if key != "data"}
+            sheet["properties"] = properties
+            sheets.append(sheet)
+        return {key: (sheets if key == "sheets" else value) for key, value in dict.items(spreadsheet)}
+
+    def segments(self, spreadsheet: Dict[str, Any]) -> Iterator[Segment]:
+        """ Yield the rows of ``spreadsheet`` as one segment per row, encoded """
+        for index, sheet in enumerate(spreadsheet.get("sheets", [])):
+            sheet_id = sheet.get("properties", {}).get("sheetId", index)
+            for grid_data in sheet.get("data", []):
+                start_row, start_column = grid_data.get("startRow", 0), grid_data.get("startColumn", 0)
+                for offset, row in enumerate(grid_data.get("rowData", [])):
+                    yield Segment(sheet_id, start_row + offset, start_column, [self.encoder.encodeRow(row)], len(row.get("values", [])))
+
+    def batches(self, segments: Iterable[Union[Segment, RawRequest]]) -> Iterator[List[Union[Segment, RawRequest]]]:
+        """ Pack requests, in order, into the fewest batches within the budgets; rows following each other in a sheet share a segment """
+        batch: List[Union[Segment, RawRequest]] = []
+        size, cells = BATCH_OVERHEAD, 0
+        for single in segments:
+            last = batch[-1] if batch else None
+            if type(single) is RawRequest:
+                extends = False
+                alone = len(single.body)
+            else:
+                row = single.rows[0]
+                extends = (type(last) is Segment and last.sheet_id == single.sheet_id and last.column_index == single.column_index
+                           and last.row_index + len(last.rows) == single.row_index)
+                alone = segment_overhead(single.sheet_id, single.row_index, single.column_index) + len(row)
+            # a row joining the last segment costs its comma, a new request its body and comma
+            added = 1 + len(row) if extends else (1 if batch else 0) + alone
+            if batch and (size + added > self.max_bytes or cells + single.cells > self.max_cells):
+                yield batch
+                batch, size, cells, extends, added = [], BATCH_OVERHEAD, 0, False, alone
+            if size + added > self.max_bytes:
+                raise UploadError(f"a request of {alone} bytes (row {getattr(single, 'row_index', None)}) does not fit a {self.max_bytes} bytes batch")
+            if extends:
+                last.rows.append(row)
+                batch[-1] = last._replace(cells=last.cells + single.cells)
+            else:
+                batch.append(single)
+            size += added
+            cells += single.cells
+        if batch:
+            yield batch
+
+    def post(self, spreadsheet_id: str, batch: List[Segment]) -> None:
+        """ Send one batch once, counting the request and its bytes """
+        body = batch_body(batch)
+        SHEETS_BYTES.inc(len(body))
+        try:
+            self.transport.batch_update(spreadsheet_id, body)
+        except UploadError as e:
+            SHEETS_REQUESTS.inc(status=e.status if e.status is not None else "error")
+            raise
+        SHEETS_REQUESTS.inc(status=200)
+
+    def send_batch(self, spreadsheet_id: str, batch: List[Segment]) -> int:
+        """ Send one batch, retrying it and splitting it if it is too large, return the requests sent """
+        for attempt in range(self.retries + 1):
+            try:
+                self.post(spreadsheet_id, batch)
+                return 1
+            except RequestTooLarge:
+                rows = sum(len(segment.rows) for segment in batch)
+                if rows < 2:
+                    raise
+                first, second = split_batch(batch, rows // 2)
+                Print.red(f"batch of {rows} rows too large, splitting it")
+                return self.send_batch(spreadsheet_id, first) + self.send_batch(spreadsheet_id, second)
+            except UploadError as e:
+                if not e.retryable or attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                Print.red(f"batch failed ({e.status}: {e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return 0
+
+    def send(self, spreadsheet_id: str, batches: Iterable[List[Segment]]) -> int:
+        """ Send every batch, return the requests sent
+
+        A batch failing does not stop the others, an UploadError listing the rows not written (``failed``) is raised at the end.
+        """
+        sent = 0
+        failed: List[Segment] = []
+        errors: List[UploadError] = []
+        for batch in batches:
+            try:
+                sent += self.send_batch(spreadsheet_id, batch)
+            except UploadError as e:
+                errors.append(e)
+                failed.extend(batch)
+        if errors:
+            rows = sum(len(segment.rows) for segment in failed)
+            raise UploadError(f"{len(errors)} batches ({rows} rows) failed: {errors[-1]}",
+                              errors[-1].status, errors[-1].retryable, failed)
+        return sent
+
+    def upload(self, spreadsheet: Dict[str, Any]) -> str:
+        """ Create ``spreadsheet``, return its id """
+        format_requests: List[str] = []
+        if self.hoist_formats:
+            spreadsheet, format_requests = FormatCompiler(encoder=self.encoder).compile(spreadsheet)
+        spreadsheet_id = self.transport.create(self.skeleton(spreadsheet))
+        # after the rows, writing a cell resets the attributes set by a range request
+        range_requests = [RawRequest(body) for body in format_requests]
+        try:
+            sent = self.send(spreadsheet_id, self.batches(itertools.chain(self.segments(spreadsheet), range_requests)))
+        except UploadError as e:
+            # rows sent again reset the range requests already applied, they are sent again after them
+            if any(type(segment) is Segment for segment in e.failed):
+                e.failed = [segment for segment in e.failed if type(segment) is Segment] + range_requests
+            raise
+        debug(f"uploaded {spreadsheet_id} in {sent} batchUpdate requests")
+        return spreadsheet_id
+
+
+def split_batch(batch: List[Segment], count: int) -> List[List[Segment]]:
+    """ Return ``batch`` as its first ``count`` rows and the rest """
+    first: List[Segment] = []
+    for i, segment in enumerate(batch):
+        if count >= len(segment.rows):
+            first.append(segment)
+            count -= len(segment.rows)
+            continue
+        if count == 0:
+            return [first, batch[i:]]
+        head, tail = segment.split(count)
+        return [first + [head], [tail] + batch[i + 1:]]
+    return [first, []]
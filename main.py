@@ -1,6 +1,7 @@
 """ application loader for netbox-export-connections , for netbox -> sheets """
 import os
 import sys
+import time
 from typing import Optional, List
 
 ROOT_PATH = os.path.abspath( os.path.join( __file__, ".." ) )
@@ -8,96 +9,128 @@ if ROOT_PATH not in sys.path:
     sys.path.append( ROOT_PATH )
 
 
-from pprint import pprint
-
-from googleapiclient.discovery import build
-from httplib2 import Http
-
-import json
-from oauth2client import file, client, tools
+import argparse
 
 from classdef import *
-
-d = NetboxRequest(NetboxQuery.DEVICE, {"id": 1531}, json_callback = Device.jsonToObj)
-
-# print("-----instances----->")
-# print(Device._instances)
-# print("<-----instances-----")
-
-# stash(Device)
-
-# print("\n" * 10)
-
-# unstash()
-
-# print("-----instances----->")
-# print(Device._instances)
-# print("<-----instances-----")
-
-# exit()
-
-r = GridRange(1, 10, 1, 10)
-brp = BandingProperties( headerColor = Color(50, 50, 50, 100),
-                         firstBandColor = Color(100, 100, 100, 200),
-                         secondBandColor = Color(200, 200, 200, 0) )
-
-br = BandedRange(range = r, rowProperties=brp)
-
-
-# rData = RowData([CellData(ExtendedValue(x)) for x in range(5) for y in range(10)])
-# rData = RowData([CellData(ExtendedValue(x)) for x in range(10)])
-interface_connections = InterfaceConnection.getInterfaceConnections(data_center='hkg1')
-rowData = []
-for ic in interface_connections:
-    rowData.append(ic.getSheetRowData())
-gData = GridData(r.startRowIndex, r.startColumnIndex, rowData)
-# gData = GridData(0, 0, rData)
-
-# s = Sheet( [gData], [br] )
-
-# gdata = Sheet(7, 5)
-# br = Sheet("three", "four")
-# pprint(br)
-# pprint(list(br))
-
-ss = Spreadsheet(
-    sheets=[Sheet([gData], [br])],
-    properties=SpreadsheetProperties(title="look at me")
-)
-# ss = Spreadsheet([Sheet()])
-
-pprint(ss, indent=2, compact=False )
-
-
-
-
-# # stash()
-
-# from pprint import pprint
-# pprint(Devices._instances)
-# inputs("Continue?")
-
-spreadsheet_body = json.dumps(ss)
-print(spreadsheet_body)
-# pprint(json.loads(spreadsheet_body), indent=4)
-
-# print(spreadsheet_body)
-
-
-
-
-# Setup the Sheets API
-SCOPES = 'https://www.googleapis.com/auth/drive'
-store = file.Storage('credentials.json')
-creds = store.get()
-if not creds or creds.invalid:
-    flow = client.flow_from_clientsecrets('client_secret.json', SCOPES)
-    creds = tools.run_flow(flow, store)
-service = build('sheets', 'v4', http=creds.authorize(Http()))
-
-request = service.spreadsheets().create(body=ss)
-# request = service.spreadsheets().create(body=spreadsheet_body)
-response = request.execute()
-
-# TODO: Change code below to process the `response` dict:
-pprint(response)
+from classdef.netbox import SITE
+from classdef.export import export_sites, get_sites
+from classdef.pipeline import export_site_streaming
+from classdef.upload import SheetsUploader, GoogleTransport
+from classdef.delta import DeltaExport
+from classdef.sinks import SINKS, export_sites_file
+from classdef.metrics import METRICS, EXPORT_SECONDS, EXPORT_SUCCESS
+from classdef import sheet_json
+
+
+def sheets_service():
+    """ Return the Sheets API service, authorizing with the stored credentials """
+    from googleapiclient.discovery import build
+    from httplib2 import Http
+    from oauth2client import file, client, tools
+
+    # Setup the Sheets API
+    SCOPES = 'https://www.googleapis.com/auth/drive'
+    store = file.Storage('credentials.json')
+    creds = store.get()
+    if not creds or creds.invalid:
+        flow = client.flow_from_clientsecrets('client_secret.json', SCOPES)
+        creds = tools.run_flow(flow, store)
+    return build('sheets', 'v4', http=creds.authorize(Http()))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export netbox interface connections to Google Sheets")
+    parser.add_argument("--site", action="append", dest="sites", metavar="SLUG",
+                        help=f"site to export, may be repeated (default {SITE})")
+    parser.add_argument("--all-sites", action="store_true", help="export every site in netbox")
+    parser.add_argument("--workers", type=int, help="worker processes, default one per site up to the number of CPUs")
+    parser.add_argument("--concurrency", type=int,
+                        help=f"concurrent netbox requests of all workers together (default {NetboxRequest.concurrency})")
+    parser.add_argument("--per-site", action="store_true", help="create a spreadsheet per site rather than a tab per site")
+    parser.add_argument("--title", help="spreadsheet title")
+    parser.add_argument("--dry-run", action="store_true", help="print the spreadsheet bodies instead of creating them")
+    parser.add_argument("--stream", action="store_true",
+                        help="create a spreadsheet per site and append its rows in chunks as they are fetched, one site at a time")
+    parser.add_argument("--chunk-size", type=int,
+                        help="rows appended per request with --stream (default 1000), rows written at a time with --output (default 10000)")
+    parser.add_argument("--delta", action="store_true",
+                        help="create a spreadsheet per site and record its rows, so --update can later send only what changed")
+    parser.add_argument("--update", metavar="SPREADSHEET_ID",
+                        help="send only the rows changed since the --delta export (or last --update) of the spreadsheet, one site")
+    parser.add_argument("--incremental", action="store_true",
+                        help="with --delta / --update, only download the objects changed in netbox since the last run; NetBox 2.x"
+                             " connections have no last_updated, so they are downloaded in full and only the site's devices and racks are incremental")
+    parser.add_argument("--output", metavar="PATH", help="write the connections of every site to a local file rather than Google Sheets")
+    parser.add_argument("--format", choices=sorted(SINKS), dest="file_format",
+                        help="format of the --output file, default from its suffix")
+    parser.add_argument("--metrics-json", metavar="PATH", help="write a JSON summary of the run's fetch, cache and export metrics")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="write the run's metrics in the Prometheus text format, for the node exporter's textfile collector")
+    args = parser.parse_args(argv)
+    if args.stream and args.dry_run:
+        parser.error("--stream uploads as it goes, it can not be combined with --dry-run")
+    if (args.delta or args.update) and (args.dry_run or args.stream):
+        parser.error("--delta and --update can not be combined with --dry-run or --stream")
+    if args.output and (args.dry_run or args.stream or args.delta or args.update or args.per_site):
+        parser.error("--output can not be combined with --dry-run, --stream, --delta, --update or --per-site")
+    if args.file_format and not args.output:
+        parser.error("--format sets the format of the --output file")
+    if args.update and (args.all_sites or len(args.sites or []) > 1):
+        parser.error("--update updates the spreadsheet of a single site")
+    return args
+
+
+def export(args: argparse.Namespace) -> None:
+    sites = get_sites() if args.all_sites else (args.sites or [SITE])
+    if args.delta or args.update:
+        uploader = SheetsUploader(GoogleTransport(sheets_service()))
+        for site in sites:
+            title = f"{args.title} {site}" if args.title is not None else None
+            print(f"{site}: {DeltaExport(uploader, site, args.update, title=title, incremental=args.incremental).export()}")
+        return
+
+    if args.output:
+        # each chunk of connections is written once, nothing needs to keep the netbox objects once it is
+        set_weak_registries()
+        chunk_size = args.chunk_size if args.chunk_size is not None else 10000
+        print(f"{args.output}: {export_sites_file(sites, args.output, args.file_format, chunk_size=chunk_size)} rows")
+        return
+
+    if args.stream:
+        service = sheets_service()
+        chunk_size = args.chunk_size if args.chunk_size is not None else 1000
+        for site in sites:
+            title = f"{args.title} {site}" if args.title is not None else None
+            print(f"{site}: {export_site_streaming(service, site, title=title, chunk_size=chunk_size)}")
+        return
+
+    spreadsheets = export_sites(sites, workers=args.workers, concurrency=args.concurrency, per_site=args.per_site, title=args.title)
+
+    if args.dry_run:
+        for ss in spreadsheets:
+            sheet_json.dump(ss, sys.stdout)
+            print()
+        return
+
+    # created without data, the rows are written in batchUpdate requests within the API limits
+    uploader = SheetsUploader(GoogleTransport(sheets_service()))
+    for ss in spreadsheets:
+        print(uploader.upload(ss))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    started = time.time()
+    try:
+        export(args)
+        EXPORT_SUCCESS.set(time.time())
+    finally:
+        EXPORT_SECONDS.set(time.time() - started)
+        if args.metrics_json:
+            METRICS.write_summary(args.metrics_json)
+        if args.metrics_textfile:
+            METRICS.write_textfile(args.metrics_textfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+""" Snapshot of the registries with stash / unstash """
+import json
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from classdef import cache_manager
+from classdef.cache_manager import stash, unstash
+from classdef.netbox import InterfaceConnection, Device, Rack, DataCenter, REGISTRIES
+
+
+def clear_registries() -> None:
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """ Hydrate a synthetic site into the registries and stash it, return the snapshot path and the registered ids """
+    clear_registries()
+    netbox = SyntheticNetbox(1000)
+    for kind, cls in (("sites", DataCenter), ("racks", Rack), ("devices", Device), ("interface-connections", InterfaceConnection)):
+        json.loads(netbox.page(kind), object_hook=cls.jsonToObj)
+    ids = {cls.__name__: sorted(cls._instances.keys()) for cls in REGISTRIES}
+    path = stash(path=str(tmp_path / "snapshot.pickle"))
+    clear_registries()
+    yield path, ids
+    clear_registries()
+
+
+def test_round_trip(snapshot):
+    path, ids = snapshot
+    assert unstash(path=path)
+    assert {cls.__name__: sorted(cls._instances.keys()) for cls in REGISTRIES} == ids
+    # references come back as the registered objects, not copies
+    for connection in InterfaceConnection._instances.values():
+        device = connection.interface_a.device
+        assert device is Device._instances[device.id]
+        assert device.rack is Rack._instances[device.rack.id]
+
+
+def test_version_mismatch_is_stale(snapshot, monkeypatch):
+    path, _ = snapshot
+    monkeypatch.setattr(cache_manager, "SNAPSHOT_VERSION", cache_manager.SNAPSHOT_VERSION + 1)
+    assert not unstash(path=path)
+    assert all(len(cls._instances) == 0 for cls in REGISTRIES)
+
+
+def test_layout_change_is_stale(snapshot, monkeypatch):
+    path, _ = snapshot
+    monkeypatch.setattr(Rack, "slotNames", classmethod(lambda cls: ("id",)))
+    assert not unstash(path=path)
+
+
+def test_missing_or_invalid_snapshot(tmp_path):
+    assert not unstash(path=str(tmp_path / "missing.pickle"))
+    invalid = tmp_path / "invalid.pickle"
+    invalid.write_bytes(b"not a pickle")
+    assert not unstash(path=str(invalid))
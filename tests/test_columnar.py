@@ -0,0 +1,110 @@
+""" ConnectionTable rows and filters, on the array and NumPy columns """
+import json
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef import columnar
+from classdef.columnar import ConnectionTable, STRING_COLUMNS
+from classdef.netbox import NetboxRequest, InterfaceConnection, REGISTRIES
+
+USE_NUMPY = [False, pytest.param(True, marks=pytest.mark.skipif(columnar.numpy is None, reason="numpy is not installed"))]
+
+
+@pytest.fixture(scope="module")
+def connections(tmp_path_factory):
+    # 4 sites of 2 racks
+    netbox = SyntheticNetbox(3000, racks_per_site=2)
+    server = NetboxServer(netbox)
+    base_url, cache_dir = NetboxRequest._BASE_URL, NetboxRequest.cache_dir
+    NetboxRequest._BASE_URL, NetboxRequest.cache_dir = server.start(), str(tmp_path_factory.mktemp("cache"))
+    try:
+        yield InterfaceConnection.getInterfaceConnections(data_center=["site1", "site2"])
+    finally:
+        NetboxRequest._BASE_URL, NetboxRequest.cache_dir = base_url, cache_dir
+        server.stop()
+        for cls in REGISTRIES:
+            cls._instances.clear()
+
+
+def sides(connection):
+    return [(interface.device, interface.device.rack, interface.device.rack.datacenter)
+            for interface in (connection.interface_a, connection.interface_b)]
+
+
+def expected_ids(connections, site=None, rack=None, device=None, connected=None):
+    """ The ids of the connections a filter of ``select`` should return, by walking the objects """
+    ids = []
+    for connection in connections:
+        if connected is not None and (connection.connection_status["value"] is True) != connected:
+            continue
+        found = sides(connection)
+        if site is not None and not any(obj.slug in site or obj.id in site for _, _, obj in found):
+            continue
+        if rack is not None and not any(obj.name in rack or obj.id in rack for _, obj, _ in found):
+            continue
+        if device is not None and not any(obj.name in device or obj.id in device for obj, _, _ in found):
+            continue
+        ids.append(connection.id)
+    return ids
+
+
+def test_rows_match_sheet_row_data(connections):
+    table = ConnectionTable.fromConnections(connections, use_numpy=False)
+    assert len(table) == len(connections)
+    assert json.dumps(list(table.rows())) == json.dumps([connection.getSheetRowData() for connection in connections])
+
+
+@pytest.mark.parametrize("use_numpy", USE_NUMPY)
+def test_select(connections, use_numpy):
+    table = ConnectionTable.fromConnections(connections, use_numpy=use_numpy)
+    assert table.is_numpy == use_numpy
+    device, rack, site = sides(connections[0])[0]
+    other_rack = sides(connections[-1])[1][1]
+    filters = [
+        {"site": ["site2"]},
+        {"site": [site.id]},
+        {"rack": [rack.name]},
+        {"rack": [rack.id, other_rack.name]},
+        {"device": [device.name], "connected": True},
+        {"device": [device.id]},
+        {"site": ["site1"], "rack": [other_rack.id], "connected": False},
+        {"rack": ["no-such-rack"]},
+    ]
+    for criteria in filters:
+        selected = table.select(**criteria)
+        expected = expected_ids(connections, **criteria)
+        assert list(selected.values("id")) == expected, criteria
+        assert (len(expected) == 0) == (criteria == {"rack": ["no-such-rack"]}), criteria
+    # objects are filtered by their id
+    assert list(table.select(rack=rack).values("id")) == expected_ids(connections, rack=[rack.id])
+    with pytest.raises(TypeError):
+        table.match("rack", [1.5])
+
+
+def test_numpy_and_array_agree(connections):
+    pytest.importorskip("numpy")
+    arrays = ConnectionTable.fromConnections(connections, use_numpy=False)
+    vectors = ConnectionTable.fromConnections(connections, use_numpy=True)
+    rack = sides(connections[3])[1][1]
+    for name in ("rack_id_a", "device_id_b", "connected"):
+        keys = sorted(set(arrays.values(name)))[::3]
+        assert list(arrays.isin(name, keys)) == vectors.isin(name, keys).tolist()
+    assert list(arrays.match("rack", [rack.name])) == vectors.match("rack", [rack.name]).tolist()
+    assert list(arrays.select(rack=rack.name).rows()) == list(vectors.select(rack=rack.name).rows())
+
+
+def test_strings_shared(connections):
+    table = ConnectionTable.fromConnections(connections, use_numpy=False)
+    device, rack, site = sides(connections[0])[0]
+    # one dictionary for every name column, both sides
+    code = table.strings.code(rack.name)
+    assert code is not None and (code in table.columns["rack_a"] or code in table.columns["rack_b"])
+    names = {name for column in STRING_COLUMNS for side in ("a", "b") for name in table.values(f"{column}_{side}")}
+    assert len(table.strings) == len(names | {None})
+    # a device on side a of one connection and side b of another has one code
+    assert set(table.columns["device_a"]) & set(table.columns["device_b"])
+    assert table.strings.decode(table.strings.code(site.slug)) == site.slug
+    # and by the tables select returns
+    assert table.select(rack=rack.name).strings is table.strings
@@ -0,0 +1,69 @@
+""" IdentityMap registries of the netbox models """
+import gc
+import json
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from classdef.netbox import Device, Rack, REGISTRIES, set_weak_registries
+
+
+@pytest.fixture
+def netbox():
+    for cls in REGISTRIES:
+        cls._instances.clear()
+    yield SyntheticNetbox(2000)
+    set_weak_registries(False)
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def hydrate(cls, record):
+    return json.loads(json.dumps(record), object_hook=cls.jsonToObj)
+
+
+def test_one_instance_per_id(netbox):
+    rack = hydrate(Rack, netbox.racks[0])
+    Rack._instances.reset_stats()
+    assert hydrate(Rack, dict(netbox.racks[0], name="R-renamed")) is rack
+    assert rack.name == "R-renamed"
+    assert Rack._instances.stats()["merges"] == 1
+
+
+def test_weak_registry_releases_unreferenced(netbox):
+    set_weak_registries()
+    rack = hydrate(Rack, netbox.racks[0])
+    other = hydrate(Rack, netbox.racks[1])
+    assert Rack._instances.weak and len(Rack._instances) == 2
+    del other
+    gc.collect()
+    assert list(Rack._instances.keys()) == [rack.id]
+    # back to strong references, the registered instances are kept
+    set_weak_registries(False)
+    del rack
+    gc.collect()
+    assert len(Rack._instances) == 1
+
+
+def test_secondary_index_follows_merge(netbox):
+    """ An update moving a device to another rack, or renaming it, moves it in the ``rack`` and ``name`` indexes """
+    record = netbox.devices[0]
+    device = hydrate(Device, record)
+    old_rack, new_rack = record["rack"]["id"], netbox.racks[-1]["id"]
+    assert Device.getIndexed("rack", old_rack) == [device]
+    moved = dict(record, name="moved", rack=SyntheticNetbox.brief("racks", netbox.racks[-1], "name", "display_name"))
+    assert hydrate(Device, moved) is device
+    assert device not in Device.getIndexed("rack", old_rack)
+    assert Device.getIndexed("rack", new_rack) == [device]
+    assert Device.getIndexed("name", "moved") == [device]
+    assert Device.getIndexed("name", record["name"]) == []
+
+
+def test_secondary_index_drops_collected(netbox):
+    set_weak_registries()
+    devices = [hydrate(Device, record) for record in netbox.devices[:3]]
+    rack = netbox.devices[0]["rack"]["id"]
+    assert len(Device.getIndexed("rack", rack)) == 3
+    del devices[1:]
+    gc.collect()
+    assert Device.getIndexed("rack", rack) == devices
@@ -0,0 +1,85 @@
+""" DeltaExport of a changed site, compared with a fresh export, netbox served by the stand-in server """
+import os
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer, StandInNetbox
+from classdef.netbox import NetboxRequest, REGISTRIES
+from classdef.response_cache import ResponseCache
+from classdef.upload import SheetsUploader, MemoryTransport, UploadError
+from classdef.delta import DeltaExport, Delta
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    # one site
+    netbox = SyntheticNetbox(300)
+    server = NetboxServer(netbox)
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    yield netbox, server
+    server.stop()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def changed(netbox: SyntheticNetbox, server: NetboxServer) -> None:
+    """ Serve the current records of ``netbox``, as a new run would fetch them """
+    server.netbox = StandInNetbox(netbox)
+    ResponseCache.open(os.path.join(NetboxRequest.cache_dir, NetboxRequest.cache_file_name)).clear()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def test_delta_matches_fresh_export(standin):
+    netbox, server = standin
+    transport = MemoryTransport()
+    uploader = SheetsUploader(transport, backoff=0)
+    spreadsheet_id = DeltaExport(uploader, "site1").export()
+
+    # nothing changed, nothing sent
+    changed(netbox, server)
+    sent = len(transport.requests)
+    unchanged = DeltaExport(uploader, "site1", spreadsheet_id)
+    unchanged.export()
+    assert unchanged.stats["requests"] == 0 and len(transport.requests) == sent
+
+    connections = netbox.interface_connections
+    del connections[100:103]
+    del connections[0]
+    connections[10]["connection_status"] = {"value": not connections[10]["connection_status"]["value"], "label": "Changed"}
+    connections[20]["interface_a"]["name"] = "renamed"
+    connections.append(dict(connections[30], id=10000))
+    changed(netbox, server)
+    delta = DeltaExport(uploader, "site1", spreadsheet_id)
+    delta.export()
+    assert delta.stats["deleted"] == 4 and delta.stats["inserted"] == 1 and delta.stats["changed"] >= 2
+    assert delta.stats["requests"] == 1
+
+    fresh_id = DeltaExport(uploader, "site1").export()
+    fresh = transport.spreadsheets[fresh_id]
+    updated = transport.spreadsheets[spreadsheet_id]
+    assert updated["grids"] == fresh["grids"]
+    assert updated["bandedRanges"][0]["range"] == fresh["bandedRanges"][0]["range"]
+
+
+def test_failed_delta_forgets_the_sheet(standin):
+    netbox, server = standin
+    transport = MemoryTransport()
+    uploader = SheetsUploader(transport, backoff=0, retries=0)
+    spreadsheet_id = DeltaExport(uploader, "site1").export()
+    del netbox.interface_connections[5]
+    changed(netbox, server)
+    transport.fail = lambda call: UploadError("bad request", 400)
+    with pytest.raises(UploadError):
+        DeltaExport(uploader, "site1", spreadsheet_id).export()
+    transport.fail = None
+    with pytest.raises(ValueError):
+        DeltaExport(uploader, "site1", spreadsheet_id).export()
+
+
+def test_delta_between():
+    delta = Delta.between([(1, b"a"), (2, b"b"), (3, b"c")], [(2, b"B"), (3, b"c"), (4, b"d")])
+    assert delta == Delta(deleted=[(0, 1)], inserted=[(2, 3)], written=[(0, 1), (2, 3)], changed=1)
+    assert not Delta.between([(1, b"a")], [(1, b"a")])
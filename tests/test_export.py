@@ -0,0 +1,53 @@
+""" Multi-site export with worker processes, against the netbox stand-in server """
+import json
+import os
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef.export import export_sites
+from classdef.metrics import REQUESTS, ROWS
+from classdef.netbox import NetboxRequest, REGISTRIES
+from classdef.response_cache import ResponseCache
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    # 4 sites of 2 racks
+    server = NetboxServer(SyntheticNetbox(3000, racks_per_site=2))
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    yield server
+    server.stop()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def total(metric) -> float:
+    return sum(value for _, value in metric.snapshot())
+
+
+def test_workers_build_the_sheets_of_a_site_at_a_time(server):
+    requests, rows = total(REQUESTS), total(ROWS)
+    served = server.stats()["requests"]
+    spreadsheet, = export_sites(["site1", "site2"], workers=2, title="sites")
+    sheets = json.loads(json.dumps(spreadsheet["sheets"]))
+    assert [sheet["properties"]["title"] for sheet in sheets] == ["site1", "site2"]
+    assert [sheet["properties"]["sheetId"] for sheet in sheets] == [0, 1]
+    # the parent made no request itself, the workers' metrics were merged into its own
+    assert total(REQUESTS) - requests == server.stats()["requests"] - served > 0
+    assert total(ROWS) - rows == sum(len(sheet["data"][0]["rowData"]) for sheet in sheets)
+
+    # again, one site at a time in this process
+    ResponseCache.open(os.path.join(NetboxRequest.cache_dir, NetboxRequest.cache_file_name)).clear()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+    one_at_a_time, = export_sites(["site1", "site2"], workers=1, title="sites")
+    assert sheets == json.loads(json.dumps(one_at_a_time["sheets"]))
+
+
+def test_per_site(server):
+    spreadsheets = export_sites(["site3", "site4"], workers=2, per_site=True, title="connections")
+    assert [spreadsheet["properties"]["title"] for spreadsheet in spreadsheets] == ["connections site3", "connections site4"]
+    assert all(spreadsheet["sheets"][0]["properties"]["sheetId"] == 0 for spreadsheet in spreadsheets)
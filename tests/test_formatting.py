@@ -0,0 +1,84 @@
+""" FormatCompiler hoisting attributes repeated down a column into range requests """
+import json
+
+from classdef import sheet
+from classdef.formatting import FormatCompiler, MIN_RUN
+from classdef.sheet import Spreadsheet, Sheet, SheetProperties, GridData, RowData, CellData, ExtendedValue
+
+BOLD = {"textFormat": {"bold": True}}
+ITALIC = {"textFormat": {"italic": True}}
+
+
+def checkbox(connected: bool) -> CellData:
+    return CellData(ExtendedValue(connected), dataValidation=sheet.DataValidationRule(sheet.BooleanCondition(sheet.ConditionType.BOOLEAN)))
+
+
+def cell(value: str, fmt: dict = None) -> dict:
+    return {"userEnteredValue": {"stringValue": value}, "userEnteredFormat": fmt} if fmt else {"userEnteredValue": {"stringValue": value}}
+
+
+# column 0: a checkbox on every row
+# column 1: bold, broken by a cell without a format, the last an equal copy
+# column 2: bold, italic, then a lone bold
+# column 3: one format only
+FORMATS = [
+    (BOLD, BOLD, None),
+    (BOLD, BOLD, None),
+    (None, ITALIC, BOLD),
+    (BOLD, ITALIC, None),
+    (dict(BOLD), BOLD, None),
+]
+
+
+def spreadsheet() -> Spreadsheet:
+    rows = [RowData([checkbox(row % 2 == 0)] + [cell(f"r{row}c{column}", fmt) for column, fmt in enumerate(formats, 1)])
+            for row, formats in enumerate(FORMATS)]
+    return Spreadsheet(sheets=[Sheet([GridData(3, 2, rows)], properties=SheetProperties(sheetId=7))])
+
+
+def grid_range(first: int, end: int, column: int) -> dict:
+    # rows and columns are offset by the GridData's startRow 3 and startColumn 2
+    return {"sheetId": 7, "startRowIndex": 3 + first, "endRowIndex": 3 + end, "startColumnIndex": 2 + column, "endColumnIndex": 3 + column}
+
+
+def test_runs_hoisted():
+    assert MIN_RUN == 2
+    ss = spreadsheet()
+    original = json.loads(json.dumps(ss))
+    compiled, requests = FormatCompiler().compile(ss)
+    # the spreadsheet is not changed
+    assert json.loads(json.dumps(ss)) == original
+
+    assert [json.loads(request) for request in requests] == [
+        {"setDataValidation": {"range": grid_range(0, 5, 0), "rule": json.loads(json.dumps(ss["sheets"][0]["data"][0]["rowData"][0]["values"][0]["dataValidation"]))}},
+        {"repeatCell": {"range": grid_range(0, 2, 1), "cell": {"userEnteredFormat": BOLD}, "fields": "userEnteredFormat"}},
+        {"repeatCell": {"range": grid_range(3, 5, 1), "cell": {"userEnteredFormat": BOLD}, "fields": "userEnteredFormat"}},
+        {"repeatCell": {"range": grid_range(0, 2, 2), "cell": {"userEnteredFormat": BOLD}, "fields": "userEnteredFormat"}},
+        {"repeatCell": {"range": grid_range(2, 4, 2), "cell": {"userEnteredFormat": ITALIC}, "fields": "userEnteredFormat"}},
+    ]
+    rows = compiled["sheets"][0]["data"][0]["rowData"]
+    # hoisted attributes are gone from their cells, the values stay
+    assert all(list(row["values"][0]) == ["userEnteredValue"] for row in rows)
+    assert all("userEnteredFormat" not in row["values"][1] for row in rows)
+    assert all("userEnteredFormat" not in row["values"][2] for row in rows[:4])
+    assert [row["values"][2]["userEnteredValue"]["stringValue"] for row in rows] == [f"r{row}c2" for row in range(5)]
+    # a value on a single row stays on its cell
+    assert rows[4]["values"][2]["userEnteredFormat"] == BOLD
+    assert rows[2]["values"][3]["userEnteredFormat"] == BOLD
+    assert compiled["sheets"][0]["data"][0]["startRow"] == 3
+
+
+def test_min_run():
+    compiler = FormatCompiler(min_run=3)
+    compiled, requests = compiler.compile(spreadsheet())
+    # only the checkboxes repeat on 3 rows or more
+    assert [list(json.loads(request)) for request in requests] == [["setDataValidation"]]
+    rows = compiled["sheets"][0]["data"][0]["rowData"]
+    assert [row["values"][1].get("userEnteredFormat") for row in rows] == [fmt for fmt, _, _ in FORMATS]
+    assert compiler.hoisted == 5
+
+
+def test_nothing_to_hoist():
+    ss = Spreadsheet(sheets=[Sheet([GridData(0, 0, [RowData([cell("a", BOLD)]), RowData([cell("b")])])])])
+    compiled, requests = FormatCompiler().compile(ss)
+    assert requests == [] and compiled["sheets"][0]["data"][0] is ss["sheets"][0]["data"][0]
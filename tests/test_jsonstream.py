@@ -0,0 +1,78 @@
+""" Incremental decoding of netbox list pages split into chunks of every size """
+import json
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from classdef.jsonstream import StreamingPage, iter_chunks
+
+
+class CountingHook:
+    """ object_hook counting its calls, returning the dict unchanged """
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, jd: dict) -> dict:
+        self.calls += 1
+        return jd
+
+
+def page(results: list, **fields) -> bytes:
+    return json.dumps(dict({"count": len(results), "next": None, "previous": None, "results": results}, **fields)).encode()
+
+
+def decode(body: bytes, chunk_size: int):
+    hook = CountingHook()
+    stream = StreamingPage(iter_chunks(body, chunk_size), object_hook=hook)
+    results = list(stream.results())
+    return results, stream.fields, hook.calls
+
+
+def expected(body: bytes):
+    hook = CountingHook()
+    decoded = json.loads(body, object_hook=hook)
+    results = decoded.pop("results")
+    # the page itself is passed to the hook by json.loads, never by StreamingPage
+    return results, decoded, hook.calls - 1
+
+
+@pytest.fixture(scope="module")
+def connections() -> bytes:
+    return page(SyntheticNetbox(20).interface_connections)
+
+
+def test_every_chunk_size(connections):
+    want = expected(connections)
+    for chunk_size in list(range(1, 65)) + [len(connections) // 3, len(connections)]:
+        assert decode(connections, chunk_size) == want, chunk_size
+
+
+@pytest.mark.parametrize("body", [
+    # numbers and multi byte characters across chunk boundaries
+    page([1234567890, -0.125e-3, "héllo ☃ \U0001F600", {"name": "é\\\"☃"}, True, None]),
+    page([]),
+    # count after results, members after results
+    b'{"results": [{"id": 1}, {"id": 2}], "count": 2, "next": null}',
+    b' { "next" : null , "results" : [ { "a" : [ 1 , { "b" : "]}" } ] } ] , "count" : 1 } ',
+])
+def test_edge_cases(body):
+    want = expected(body)
+    for chunk_size in range(1, len(body) + 1):
+        assert decode(body, chunk_size) == want, chunk_size
+
+
+def test_field_before_results():
+    body = b'{"count": 12345, "next": "http://netbox/api/dcim/racks/?offset=2", "results": [{"id": 1}]}'
+    for chunk_size in range(1, 20):
+        stream = StreamingPage(iter_chunks(body, chunk_size))
+        assert stream.field("count") == 12345
+        assert "results" not in stream.fields
+        assert list(stream.results()) == [{"id": 1}]
+
+
+def test_truncated_page():
+    body = page([{"id": 1}, {"id": 2}])[:-10]
+    for chunk_size in (1, 7, len(body)):
+        with pytest.raises(ValueError):
+            decode(body, chunk_size)
@@ -0,0 +1,83 @@
+""" Metrics registry: merging worker snapshots and the Prometheus text format """
+import json
+import pickle
+
+import pytest
+
+from classdef.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+
+def test_labels_must_match(registry):
+    requests = registry.counter("requests_total", "requests", ("endpoint", "status"))
+    requests.inc(endpoint="RACKS", status=200)
+    requests.inc(3, endpoint="RACKS", status=200)
+    assert requests.value(endpoint="RACKS", status=200) == 4
+    with pytest.raises(ValueError):
+        requests.inc(endpoint="RACKS")
+    # registering again returns the registered metric, as another kind it is refused
+    assert registry.counter("requests_total", "requests", ("endpoint", "status")) is requests
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "requests", ("endpoint", "status"))
+
+
+def test_merge_worker_snapshots(registry):
+    """ Each worker process drains its registry after a task, the parent adds them up """
+    workers = [MetricsRegistry() for _ in range(2)]
+    for each in [registry] + workers:
+        each.counter("rows_total", "rows", ("output",))
+        each.histogram("seconds", "latency", buckets=(0.1, 1.0))
+        each.gauge("last", "last value")
+    for value, worker in enumerate(workers, 1):
+        worker.metrics["rows_total"].inc(10 * value, output="sheet")
+        worker.metrics["seconds"].observe((0.05, 0.5)[value - 1])
+        worker.metrics["last"].set(value)
+        # snapshots cross processes pickled
+        registry.merge(pickle.loads(pickle.dumps(worker.drain())))
+        assert worker.metrics["rows_total"].value() == 0
+    assert registry.metrics["rows_total"].value(output="sheet") == 30
+    # gauges take the merged value, histograms add their buckets, sum and count
+    assert registry.metrics["last"].values[()] == 2
+    assert registry.metrics["seconds"].values[()] == pytest.approx([1, 1, 0, 0.55, 2])
+
+
+def test_prometheus_format(registry):
+    requests = registry.counter("netbox_requests_total", "netbox requests", ("endpoint", "status"))
+    seconds = registry.histogram("netbox_request_seconds", "latency", ("endpoint",), buckets=(0.1, 1.0))
+    registry.gauge("export_duration_seconds", "duration").set(1.5)
+    requests.inc(endpoint='DEVICES "x"\\', status=200)
+    for value in (0.05, 0.5, 5):
+        seconds.observe(value, endpoint="DEVICES")
+    assert registry.prometheus().splitlines() == [
+        "# HELP export_duration_seconds duration",
+        "# TYPE export_duration_seconds gauge",
+        "export_duration_seconds 1.5",
+        "# HELP netbox_request_seconds latency",
+        "# TYPE netbox_request_seconds histogram",
+        'netbox_request_seconds_bucket{endpoint="DEVICES",le="0.1"} 1',
+        'netbox_request_seconds_bucket{endpoint="DEVICES",le="1.0"} 2',
+        'netbox_request_seconds_bucket{endpoint="DEVICES",le="+Inf"} 3',
+        'netbox_request_seconds_sum{endpoint="DEVICES"} 5.55',
+        'netbox_request_seconds_count{endpoint="DEVICES"} 3',
+        "# HELP netbox_requests_total netbox requests",
+        "# TYPE netbox_requests_total counter",
+        'netbox_requests_total{endpoint="DEVICES \\"x\\"\\\\",status="200"} 1',
+    ]
+
+
+def test_summary_cache_hit_ratio(registry, tmp_path):
+    lookups = registry.counter("netbox_cache_lookups_total", "lookups", ("endpoint", "result"))
+    assert registry.summary()["cache_hit_ratio"] is None
+    lookups.inc(3, endpoint="RACKS", result="hit")
+    lookups.inc(endpoint="DEVICES", result="miss")
+    path = tmp_path / "run.json"
+    registry.write_summary(str(path))
+    summary = json.loads(path.read_text())
+    assert summary["cache_hit_ratio"] == 0.75
+    assert summary["metrics"]["netbox_cache_lookups_total"]["values"][0] == {"labels": {"endpoint": "DEVICES", "result": "miss"}, "value": 1}
+    registry.write_textfile(str(tmp_path / "run.prom"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run.json", "run.prom"]
@@ -0,0 +1,101 @@
+""" AsyncNetboxClient against the netbox stand-in server, compared with the synchronous NetboxRequest path """
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef.netbox import NetboxQuery, NetboxRequest, InterfaceConnection, Rack, REGISTRIES
+from classdef.netbox_async import AsyncNetboxClient, fetch_site
+from classdef.response_cache import ResponseCache
+
+
+def clear_registries() -> None:
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    # 3 sites of 2 racks
+    server = NetboxServer(SyntheticNetbox(3000, racks_per_site=2))
+    base_url = server.start()
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", base_url)
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(NetboxRequest, "page_size", 200)
+    clear_registries()
+    yield server
+    clear_registries()
+    server.stop()
+
+
+def registry_contents():
+    """ Return the registered ids of each class """
+    return {cls.__name__: sorted(cls._instances.keys()) for cls in REGISTRIES}
+
+
+def links(interface_connections):
+    """ Return the ids each connection reaches through its interfaces, devices and racks """
+    return sorted((connection.id,
+                   connection.interface_a.id, connection.interface_a.device.id, connection.interface_a.device.rack.id,
+                   connection.interface_b.id, connection.interface_b.device.id, connection.interface_b.device.rack.id)
+                  for connection in interface_connections)
+
+
+def test_fetch_site_matches_sync(server):
+    """ ``fetch_site`` registers the same objects, linked the same way, as ``getInterfaceConnections`` """
+    sync_connections = InterfaceConnection.getInterfaceConnections(data_center="site2")
+    sync_links = links(sync_connections)
+    sync_registries = registry_contents()
+    clear_registries()
+
+    requests_before = server.stats()["requests"]
+    async_connections = fetch_site("site2", base_url=NetboxRequest._BASE_URL, use_cache=False)
+    fetched = server.stats()["requests"] - requests_before
+    assert sync_connections and len(async_connections) == len(sync_connections)
+    assert registry_contents() == sync_registries
+    assert links(async_connections) == sync_links
+    # everything was prefetched, following the links requested nothing more
+    assert server.stats()["requests"] - requests_before == fetched
+    for connection in async_connections:
+        for interface in (connection.interface_a, connection.interface_b):
+            rack = interface.device.rack
+            assert rack is Rack._instances[rack.obj_idx]
+
+
+def test_prefetch_related(server):
+    """ ``prefetch_related`` resolves the brief interfaces of connections fetched without it """
+    async def run():
+        async with AsyncNetboxClient(use_cache=False) as client:
+            connections = await client.fetch_site("site1", resolve_related=False)
+            return connections, await client.prefetch_related(connections)
+
+    connections, loaded = asyncio.run(run())
+    assert connections and loaded > 0
+    requests_before = server.stats()["requests"]
+    assert all(connection.interface_a.device.rack.name for connection in connections)
+    assert server.stats()["requests"] == requests_before
+
+
+def test_cache_off_the_event_loop(server, monkeypatch):
+    """ The SQLite response cache is read and written on executor threads, never on the event loop's """
+    threads = []
+    for name in ("get", "put"):
+        def record(self, *args, _method=getattr(ResponseCache, name), _name=name):
+            threads.append((_name, threading.get_ident()))
+            return _method(self, *args)
+        monkeypatch.setattr(ResponseCache, name, record)
+
+    async def run():
+        async with AsyncNetboxClient() as client:
+            return threading.get_ident(), await client.fetch_all(NetboxQuery.RACKS, {"site": "site1"}, Rack.jsonToObj)
+
+    loop_thread, racks = asyncio.run(run())
+    assert racks and {name for name, _ in threads} == {"get", "put"}
+    assert all(thread != loop_thread for _, thread in threads)
+
+    # and the second fetch is answered from the cache
+    requests_before = server.stats()["requests"]
+    assert [rack.id for rack in asyncio.run(run())[1]] == [rack.id for rack in racks]
+    assert server.stats()["requests"] == requests_before
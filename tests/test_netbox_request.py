@@ -0,0 +1,72 @@
+""" NetboxRequest offset pagination against the netbox stand-in server """
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef.netbox import NetboxRequest, NetboxQuery
+
+
+@pytest.fixture(scope="module")
+def netbox() -> SyntheticNetbox:
+    return SyntheticNetbox(1000)
+
+
+@pytest.fixture
+def server(netbox, monkeypatch, tmp_path):
+    server = NetboxServer(netbox)
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(NetboxRequest, "page_size", 70)
+    monkeypatch.setattr(NetboxRequest, "concurrency", 3)
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_every_page_in_offset_order(netbox, server, stream):
+    request = NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, {}, use_cache=False, stream=stream)
+    ids = [record["id"] for record in request.results]
+    assert request.count == len(netbox.interface_connections)
+    assert ids == [record["id"] for record in netbox.interface_connections]
+    # 1000 records in pages of 70
+    assert server.stats()["requests"] == 15
+
+
+def test_page_size_multiple(netbox, server):
+    request = NetboxRequest(NetboxQuery.DEVICES, {}, page_size=len(netbox.devices) // 2, use_cache=False)
+    assert [record["id"] for record in request.results] == [record["id"] for record in netbox.devices]
+    assert server.stats()["requests"] == 2
+
+
+def test_single_page(netbox, server):
+    request = NetboxRequest(NetboxQuery.RACKS, {}, use_cache=False)
+    assert [record["id"] for record in request.results] == [record["id"] for record in netbox.racks]
+    assert server.stats()["requests"] == 1
+
+
+@pytest.mark.parametrize("parameters, expected", [
+    ({"limit": 10}, slice(0, 10)),
+    ({"offset": 990}, slice(990, 1000)),
+    ({"limit": 5, "offset": 100}, slice(100, 105)),
+])
+def test_explicit_limit_or_offset_is_one_page(netbox, server, parameters, expected):
+    request = NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, parameters, use_cache=False)
+    assert not request.paginate
+    assert [record["id"] for record in request.results] == [record["id"] for record in netbox.interface_connections[expected]]
+    assert server.stats()["requests"] == 1
+
+
+def test_cached_pages(netbox, server):
+    first = [record["id"] for record in NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, {}).results]
+    requests = server.stats()["requests"]
+    assert [record["id"] for record in NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, {}).results] == first
+    assert server.stats()["requests"] == requests
+
+
+def test_stop_early(netbox, server):
+    """ Pages past the window are never requested when the consumer stops reading """
+    results = NetboxRequest(NetboxQuery.INTERFACECONNECTIONS, {}, use_cache=False, stream=True).results
+    assert [next(results)["id"] for _ in range(75)] == [record["id"] for record in netbox.interface_connections[:75]]
+    results.close()
+    # the first page, the window of 3 and the one requested as the second page was read
+    assert server.stats()["requests"] <= 5
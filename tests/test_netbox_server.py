@@ -0,0 +1,56 @@
+""" Filtering and pagination of the netbox stand-in server """
+import pytest
+import requests
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+
+
+@pytest.fixture(scope="module")
+def netbox() -> SyntheticNetbox:
+    # two sites: 20000 connections need 834 devices in 42 racks, 40 racks per site
+    return SyntheticNetbox(20000)
+
+
+@pytest.fixture
+def base_url(netbox):
+    server = NetboxServer(netbox)
+    yield server.start()
+    server.stop()
+
+
+def get(base_url: str, kind: str, **parameters) -> dict:
+    response = requests.get(f"{base_url}/dcim/{kind}/", params=dict(parameters, limit=0), timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def test_same_filter_on_different_endpoints(netbox, base_url):
+    """ A filter already served for one endpoint returns the records of the next endpoint, not the cached ones """
+    connections = get(base_url, "interface-connections", site="site1")["results"]
+    racks = get(base_url, "racks", site="site1")["results"]
+    devices = get(base_url, "devices", site="site1")["results"]
+    assert connections and all("interface_a" in record for record in connections)
+    assert [rack["id"] for rack in racks] == [rack["id"] for rack in netbox.racks if rack["site"]["slug"] == "site1"]
+    assert [device["id"] for device in devices] == [device["id"] for device in netbox.devices if device["site"]["slug"] == "site1"]
+    # and served again from the filter cache, each endpoint still gets its own records
+    assert get(base_url, "racks", site="site1")["results"] == racks
+    assert get(base_url, "interface-connections", site="site1")["results"] == connections
+
+
+def test_site_slug_and_brief(base_url):
+    """ ``slug`` selects a site, ``brief`` does not change the records served """
+    sites = get(base_url, "sites", slug="site2")["results"]
+    assert [site["slug"] for site in sites] == ["site2"]
+    assert get(base_url, "sites", slug="site2", brief="true")["results"] == sites
+    assert get(base_url, "sites", slug="nowhere")["count"] == 0
+
+
+def test_pagination(netbox, base_url):
+    """ ``limit`` / ``offset`` pages and their ``next`` links walk every record once """
+    response = requests.get(f"{base_url}/dcim/racks/", params={"limit": 10}, timeout=10).json()
+    ids = [rack["id"] for rack in response["results"]]
+    while response["next"] is not None:
+        response = requests.get(response["next"], timeout=10).json()
+        ids.extend(rack["id"] for rack in response["results"])
+    assert ids == [rack["id"] for rack in netbox.racks]
@@ -0,0 +1,138 @@
+""" RowPipeline producer thread and the streaming site export against MemoryTransport """
+import itertools
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef.netbox import NetboxRequest, InterfaceConnection, REGISTRIES
+from classdef.pipeline import RowPipeline, export_site_streaming
+from classdef.upload import MemoryTransport
+
+
+class Execute:
+    """ A Sheets API request, run by ``execute`` """
+
+    def __init__(self, call) -> None:
+        self.call = call
+
+    def execute(self):
+        return self.call()
+
+
+class MemoryService:
+    """ The ``spreadsheets()`` calls of a Sheets API service used by the pipeline, on a MemoryTransport """
+
+    def __init__(self, transport: MemoryTransport) -> None:
+        self.transport = transport
+
+    def spreadsheets(self) -> "MemoryService":
+        return self
+
+    def create(self, body, fields=None) -> Execute:
+        return Execute(lambda: {"spreadsheetId": self.transport.create(body)})
+
+    def batchUpdate(self, spreadsheetId, body) -> Execute:
+        return Execute(lambda: self.transport.batch_update(spreadsheetId, json.dumps(body).encode()))
+
+
+def run(pipeline: RowPipeline, timeout: float = 10):
+    """ Run ``pipeline`` on a thread, failing rather than hanging if it deadlocks; return what it returned or raised """
+    outcome = {}
+
+    def target() -> None:
+        try:
+            outcome["rows"] = pipeline.run()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "RowPipeline.run did not return"
+    return outcome
+
+
+def test_rows_in_order():
+    chunks = [[f"row{row}" for row in range(start, start + 7)] for start in range(0, 70, 7)]
+    uploaded = []
+
+    def upload(chunk) -> None:
+        # slower than the producer, the queue fills up
+        time.sleep(0.005)
+        uploaded.append(chunk)
+
+    pipeline = RowPipeline(iter(chunks), upload, queue_size=1)
+    assert run(pipeline) == {"rows": 70}
+    assert uploaded == chunks
+    assert pipeline.stats()["uploads"] == 10
+
+
+def test_producer_error_reaches_uploader():
+    def chunks():
+        yield [1, 2]
+        yield [3]
+        raise RuntimeError("netbox went away")
+
+    uploaded = []
+    pipeline = RowPipeline(chunks(), uploaded.append, queue_size=1)
+    outcome = run(pipeline)
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert uploaded == [[1, 2], [3]]
+
+
+def test_upload_error_stops_producer():
+    produced = itertools.count()
+
+    def chunks():
+        # endless, only stopping the producer ends it
+        for chunk in produced:
+            yield [chunk]
+
+    def upload(chunk) -> None:
+        if chunk == [3]:
+            raise ConnectionError("sheets went away")
+
+    pipeline = RowPipeline(chunks(), upload, queue_size=2)
+    outcome = run(pipeline)
+    assert isinstance(outcome.get("error"), ConnectionError)
+    assert pipeline.rows == 3
+    # the producer stopped within the queue size of the failed chunk
+    assert next(produced) <= 3 + 2 + 2
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = NetboxServer(SyntheticNetbox(1000, racks_per_site=2))
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(NetboxRequest, "page_size", 100)
+    yield server
+    server.stop()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def test_export_site_streaming(server):
+    transport = MemoryTransport()
+    spreadsheet_id = export_site_streaming(MemoryService(transport), "site1", title="site1", chunk_size=40, queue_size=1)
+    expected = json.loads(json.dumps([connection.getSheetRowData()["values"]
+                                      for connection in InterfaceConnection.getInterfaceConnections(data_center="site1")]))
+    assert len(expected) > 40 * 3
+    grid = transport.values(spreadsheet_id)
+    width = len(expected[0])
+    assert [row[:width] for row in grid[:len(expected)]] == expected
+    assert not any(any(row[width:]) for row in grid) and not any(any(row) for row in grid[len(expected):])
+    # one appendCells per chunk, then the banding of every row
+    assert len(transport.requests) == -(-len(expected) // 40) + 1
+    banding = transport.spreadsheets[spreadsheet_id]["bandedRanges"][0]
+    assert banding["range"]["startRowIndex"] == 0 and banding["range"]["endRowIndex"] == len(expected)
+
+
+def test_export_site_streaming_empty(server):
+    transport = MemoryTransport()
+    spreadsheet_id = export_site_streaming(MemoryService(transport), "no-such-site")
+    assert transport.requests == [] and transport.spreadsheets[spreadsheet_id]["bandedRanges"] == {}
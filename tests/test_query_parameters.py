@@ -0,0 +1,77 @@
+""" Rack and device filters of getInterfaceConnections against the netbox stand-in server """
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef import prefetch
+from classdef.netbox import NetboxRequest, InterfaceConnection, REGISTRIES
+
+
+@pytest.fixture(scope="module")
+def netbox() -> SyntheticNetbox:
+    # 4 sites of 2 racks
+    return SyntheticNetbox(3000, racks_per_site=2)
+
+
+@pytest.fixture
+def server(netbox, monkeypatch, tmp_path):
+    server = NetboxServer(netbox)
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    yield server
+    server.stop()
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def connection_ids(**filters) -> list:
+    return sorted(connection.id for connection in InterfaceConnection.getInterfaceConnections(resolve_related=False, **filters))
+
+
+def site_connection_ids(device_ids) -> list:
+    """ The connections of site1 with a device of ``device_ids`` on either side, filtered here rather than by netbox """
+    return sorted(connection.id for connection in InterfaceConnection.getInterfaceConnections(data_center="site1", resolve_related=False)
+                  if connection.interface_a.device.id in device_ids or connection.interface_b.device.id in device_ids)
+
+
+def site1(records) -> list:
+    return [record for record in records if record["site"]["slug"] == "site1"]
+
+
+@pytest.mark.parametrize("id_filter_length", [prefetch.ID_FILTER_LENGTH, 60])
+def test_rack_filter(netbox, server, monkeypatch, id_filter_length):
+    monkeypatch.setattr(prefetch, "ID_FILTER_LENGTH", id_filter_length)
+    rack = site1(netbox.racks)[1]
+    device_ids = {device["id"] for device in netbox.devices if device["rack"]["id"] == rack["id"]}
+    expected = site_connection_ids(device_ids)
+    assert expected
+    by_id = connection_ids(data_center=None, rack=rack["id"])
+    requests = InterfaceConnection.queryParameters(data_center=None, rack=rack["id"])
+    # the device ids are split over several requests once they no longer fit in one url
+    assert (len(requests) > 1) == (id_filter_length == 60)
+    assert by_id == expected
+    assert connection_ids(data_center="site1", rack=rack["name"]) == expected
+
+
+def test_racks_and_devices_combined(netbox, server):
+    racks = site1(netbox.racks)
+    devices = [device for device in netbox.devices if device["rack"]["id"] == racks[0]["id"]][:3]
+    expected = site_connection_ids({device["id"] for device in devices})
+    assert connection_ids(data_center="site1", rack=[rack["name"] for rack in racks], device=[device["name"] for device in devices]) == expected
+
+
+def test_device_filter(netbox, server):
+    devices = site1(netbox.devices)[::7]
+    expected = site_connection_ids({device["id"] for device in devices})
+    assert expected
+    assert connection_ids(data_center=None, device=[device["id"] for device in devices]) == expected
+    assert connection_ids(data_center="site1", device=[device["name"] for device in devices]) == expected
+    # ids and names are requested separately, both match
+    mixed = [device["id"] for device in devices[:2]] + [device["name"] for device in devices[2:]]
+    assert len(InterfaceConnection.queryParameters(data_center=None, device=mixed)) == 2
+    assert connection_ids(data_center=None, device=mixed) == expected
+
+
+def test_unknown_rack_matches_nothing(server):
+    assert InterfaceConnection.queryParameters(data_center="site1", rack="no-such-rack") == []
+    assert connection_ids(data_center="site1", rack="no-such-rack") == []
@@ -0,0 +1,106 @@
+""" ResponseCache store, expiry and size budget """
+import threading
+
+import pytest
+
+from classdef import response_cache
+from classdef.response_cache import ResponseCache
+
+
+class Clock:
+    """ Stands in for the ``time`` module of ``classdef.response_cache`` """
+
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ResponseCache.open(str(tmp_path / "responses.sqlite3"))
+
+
+def test_round_trip(cache):
+    key = ResponseCache.key("RACKS", {"site": "site1", "limit": 50})
+    assert key == ResponseCache.key("RACKS", {"limit": 50, "site": "site1"})
+    assert cache.get(key) is None
+    cache.put(key, "RACKS", 200, b'{"count": 0}')
+    response = cache.get(key)
+    assert response.status_code == 200 and response.json() == {"count": 0} and response
+    cache.put(key, "RACKS", 404, b"{}")
+    assert not cache.get(key) and cache.total_bytes() == 2
+    cache.delete(key)
+    assert cache.get(key) is None and cache.total_bytes() == 0
+
+
+def test_shared_by_path_and_thread_safe(cache, tmp_path):
+    assert ResponseCache.open(str(tmp_path / "responses.sqlite3")) is cache
+
+    def put(thread: int) -> None:
+        for i in range(50):
+            cache.put(f"{thread}-{i}", "DEVICES", 200, b"x" * 10)
+
+    threads = [threading.Thread(target=put, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["entries"] == 200 and cache.total_bytes() == 2000
+
+
+def test_entries_expire_after_their_endpoint_ttl(cache, clock):
+    cache.put("connections", "INTERFACECONNECTIONS", 200, b"[]")
+    cache.put("racks", "RACKS", 200, b"[]")
+    clock.now += cache.ttl_for("INTERFACECONNECTIONS") + 1
+    assert cache.get("connections") is None
+    assert cache.get("racks") is not None
+    assert cache.stats()["expired"] == 1
+    assert cache.purge() == 1
+    assert cache.stats()["entries"] == 1 and cache.total_bytes() == 2
+
+
+def test_purge_all_of_an_endpoint(cache):
+    for i in range(3):
+        cache.put(f"racks-{i}", "RACKS", 200, b"r" * 10)
+        cache.put(f"devices-{i}", "DEVICES", 200, b"d" * 5)
+    assert cache.purge() == 0
+    assert cache.purge(expired_only=False, endpoint="RACKS") == 3
+    assert cache.total_bytes() == 15
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.total_bytes() == 0
+
+
+def test_least_recently_used_evicted_over_budget(cache, clock):
+    cache.max_bytes = 100
+    for i in range(5):
+        cache.put(f"key-{i}", "DEVICES", 200, b"x" * 20)
+        clock.now += cache.access_resolution + 1
+    # read, key-0 is now the most recently used
+    assert cache.get("key-0") is not None
+    clock.now += 1
+    cache.put("key-5", "DEVICES", 200, b"x" * 20)
+    # over 100 bytes, evicted down to 90
+    assert cache.total_bytes() <= cache.max_bytes * cache.evict_to
+    assert cache.get("key-0") is not None
+    assert cache.get("key-1") is None and cache.get("key-2") is None
+    assert cache.get("key-5") is not None
+
+
+def test_enforce_budget(cache, clock):
+    for i in range(10):
+        cache.put(f"key-{i}", "DEVICES", 200, b"x" * 10)
+        clock.now += 1
+    assert cache.enforce_budget() == 0
+    cache.max_bytes = 45
+    assert cache.enforce_budget() == 6
+    assert cache.total_bytes() == 40 and cache.stats()["entries"] == 4
+    assert cache.get("key-9") is not None and cache.get("key-5") is None
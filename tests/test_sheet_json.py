@@ -0,0 +1,118 @@
+""" sheet_json encodes the same body as json.dumps, without the empty members """
+import io
+import json
+import pickle
+import socket
+import threading
+
+import pytest
+
+from classdef import sheet_json
+from classdef.netbox import InterfaceConnection
+from classdef.sheet import Spreadsheet, SpreadsheetProperties, Sheet, GridData, RowData, CellData, ExtendedValue
+from classdef.sheet_json import SheetEncoder
+
+
+def spreadsheet(rows: int) -> Spreadsheet:
+    """ Connection rows over 40 racks of 40 devices, and a row of values json would escape """
+    row_data = []
+    for row in range(rows):
+        device_a, device_b = row % 1600, (row * 7 + 3) % 1600
+        row_data.append(InterfaceConnection.sheetRowData(
+            row % 5 != 0,
+            f"eth{row % 48}", f"dev{device_a}", device_a % 40 or None, f"R{device_a // 40}",
+            f"xe-0/0/{row % 48}", f"dév☃{device_b}", device_b % 40 or None, f"R\"{device_b // 40}\\",
+        ))
+    row_data.append(RowData([CellData(ExtendedValue(1)), CellData(ExtendedValue(True)), CellData(ExtendedValue(1.5)),
+                             CellData(ExtendedValue("\U0001F600\n")), CellData(ExtendedValue()), CellData(ExtendedValue(-0.0))]))
+    return Spreadsheet(sheets=[Sheet([GridData(0, 0, row_data)])], properties=SpreadsheetProperties(title="connections ☃"))
+
+
+def without_empty(value):
+    if isinstance(value, dict):
+        return {key: without_empty(member) for key, member in value.items() if not sheet_json.is_empty(member)}
+    if isinstance(value, list):
+        return [without_empty(member) for member in value]
+    return value
+
+
+@pytest.fixture(scope="module")
+def body():
+    ss = spreadsheet(500)
+    return ss, without_empty(json.loads(json.dumps(ss)))
+
+
+def test_same_body_as_json_dumps(body):
+    ss, expected = body
+    assert json.loads(sheet_json.dumps(ss)) == expected
+    # sheets rendered in a worker process arrive as plain dicts
+    assert json.loads(sheet_json.dumps(pickle.loads(pickle.dumps(ss)))) == expected
+
+
+def test_chunks(body):
+    ss, expected = body
+    chunks = list(sheet_json.iterencode(ss, chunk_size=1000))
+    assert len(chunks) > 1 and all(len(chunk) >= 1000 for chunk in chunks[:-1])
+    assert json.loads("".join(chunks)) == expected
+
+
+def test_memoized_cells():
+    encoder = SheetEncoder()
+    ss = spreadsheet(200)
+    assert encoder.encode(ss) == encoder.encode(ss)
+    # True and 1 are memoized apart
+    assert encoder.encodeCell(CellData(ExtendedValue(True))) == '{"userEnteredValue":{"boolValue":true}}'
+    assert encoder.encodeCell(CellData(ExtendedValue(1))) == '{"userEnteredValue":{"numberValue":1}}'
+    memo = len(encoder._cells)
+    encoder.encode(ss)
+    assert len(encoder._cells) == memo
+    # cells with more than a value (the checkbox) are not memoized
+    assert all(json.loads(encoded).keys() == {"userEnteredValue"} for encoded in encoder._cells.values())
+
+
+def test_memo_bounded(monkeypatch):
+    monkeypatch.setattr(sheet_json, "CELL_MEMO_SIZE", 10)
+    encoder = SheetEncoder()
+    for value in range(25):
+        assert encoder.encodeCell(CellData(ExtendedValue(f"v{value}"))) == f'{{"userEnteredValue":{{"stringValue":"v{value}"}}}}'
+    assert len(encoder._cells) <= 10
+
+
+def test_dump_text_file(body, tmp_path):
+    ss, expected = body
+    path = tmp_path / "body.json"
+    with open(path, "w", encoding="utf-8") as f:
+        written = sheet_json.dump(ss, f, chunk_size=4096)
+    text = path.read_text(encoding="utf-8")
+    assert written == len(text) and json.loads(text) == expected
+
+
+def test_dump_binary_file(body):
+    ss, expected = body
+    f = io.BytesIO()
+    written = sheet_json.dump(ss, f, chunk_size=4096)
+    assert written == len(f.getvalue()) and json.loads(f.getvalue()) == expected
+
+
+def test_dump_socket(body):
+    ss, expected = body
+    sender, receiver = socket.socketpair()
+    received = []
+
+    def receive() -> None:
+        while True:
+            data = receiver.recv(65536)
+            if not data:
+                break
+            received.append(data)
+
+    reader = threading.Thread(target=receive)
+    reader.start()
+    try:
+        written = sheet_json.dump(ss, sender, chunk_size=4096)
+    finally:
+        sender.close()
+        reader.join()
+        receiver.close()
+    data = b"".join(received)
+    assert written == len(data) and json.loads(data) == expected
@@ -0,0 +1,81 @@
+""" File sinks of connection exports """
+import csv
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from benchmarks.netbox_server import NetboxServer
+from classdef.netbox import NetboxRequest, REGISTRIES
+from classdef.sinks import CsvSink, FIELDS, export_sites_file, open_sink
+
+
+RECORDS = [("site1", True, "eth1", "sw-1", 4, "R1", "eth2", "sw-2", None, None),
+           ("site1", False, "eth3", "sw-1", 4, "R1", None, None, None, None)]
+
+
+def test_csv_sink(tmp_path):
+    path = str(tmp_path / "connections.csv")
+    with CsvSink(path) as sink:
+        sink.write(RECORDS)
+    assert sink.rows == 2
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(FIELDS)
+    assert rows[1] == ["site1", "True", "eth1", "sw-1", "4", "R1", "eth2", "sw-2", "", ""]
+    assert not (tmp_path / "connections.csv.partial").exists()
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    path = tmp_path / "connections.csv"
+    with pytest.raises(RuntimeError):
+        with open_sink(str(path)) as sink:
+            sink.write(RECORDS)
+            raise RuntimeError("netbox went away")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "connections.json"))
+
+
+def test_parquet_sink(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "connections.parquet")
+    with open_sink(path) as sink:
+        sink.row_group_size = 1
+        sink.write(RECORDS)
+    table = parquet.read_table(path)
+    assert table.column_names == list(FIELDS)
+    assert table.to_pylist()[1]["connected"] is False and table.to_pylist()[0]["rack_unit_a"] == 4
+
+
+def test_xlsx_sink_rolls_over(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = str(tmp_path / "connections.xlsx")
+    with open_sink(path) as sink:
+        sink.max_rows = 2
+        sink.write(RECORDS)
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    assert [len(list(worksheet.values)) for worksheet in workbook.worksheets] == [2, 2]
+
+
+def test_export_sites_file(tmp_path, monkeypatch):
+    netbox = SyntheticNetbox(3000, racks_per_site=2)
+    server = NetboxServer(netbox)
+    monkeypatch.setattr(NetboxRequest, "_BASE_URL", server.start())
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    try:
+        path = str(tmp_path / "connections.csv")
+        rows = export_sites_file(["site1", "site2"], path, chunk_size=100)
+    finally:
+        server.stop()
+        for cls in REGISTRIES:
+            cls._instances.clear()
+    with open(path, newline="") as f:
+        records = list(csv.DictReader(f))
+    assert rows == len(records)
+    sites = {device["name"]: device["site"]["slug"] for device in netbox.devices}
+    for site in ("site1", "site2"):
+        exported = [record for record in records if record["site"] == site]
+        assert exported and all(site in (sites[record["device_a"]], sites[record["device_b"]]) for record in exported)
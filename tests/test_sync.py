@@ -0,0 +1,119 @@
+""" IncrementalSync change and deletion detection, netbox replaced by records held in the test """
+from typing import Any, Dict, List, Set
+
+import pytest
+
+from benchmarks.synthetic import SyntheticNetbox
+from classdef.netbox import NetboxRequest, Rack, REGISTRIES
+from classdef.sync import IncrementalSync
+
+
+LATER = "2018-07-01T00:00:00.000000Z"
+
+
+class RecordedSync(IncrementalSync):
+    """ IncrementalSync of ``remote`` racks, records what it asks netbox """
+
+    remote: Dict[int, Dict[str, Any]] = {}
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.fetched: List[Dict[str, Any]] = []
+        self.listed: int = 0
+
+    def fetch(self, query_parameters: Dict[str, Any]) -> List[dict]:
+        self.fetched.append(query_parameters)
+        since = query_parameters.get("last_updated__gte")
+        return [dict(record) for _, record in sorted(self.remote.items()) if since is None or record["last_updated"] >= since]
+
+    def remote_count(self) -> int:
+        return len(self.remote)
+
+    def remote_ids(self) -> Set[int]:
+        self.listed += 1
+        return set(self.remote)
+
+
+@pytest.fixture
+def remote(monkeypatch, tmp_path):
+    monkeypatch.setattr(NetboxRequest, "cache_dir", str(tmp_path))
+    records = {rack["id"]: dict(rack) for rack in SyntheticNetbox(2000).racks[:5]}
+    monkeypatch.setattr(RecordedSync, "remote", records)
+    for cls in REGISTRIES:
+        cls._instances.clear()
+    yield records
+    for cls in REGISTRIES:
+        cls._instances.clear()
+
+
+def sync() -> RecordedSync:
+    synced = RecordedSync(Rack, {"site": "site1"})
+    synced.result = synced.sync()
+    return synced
+
+
+def test_first_sync_is_full(remote):
+    synced = sync()
+    assert sorted(rack.id for rack in synced.result) == [1, 2, 3, 4, 5]
+    assert synced.fetched == [{"site": "site1"}]
+    assert synced.store.ids(synced.scope) == {1, 2, 3, 4, 5}
+
+
+def test_change_only_requests_since_watermark(remote):
+    watermark = remote[1]["last_updated"]
+    sync()
+    remote[2] = dict(remote[2], name="R-changed", last_updated=LATER)
+    synced = sync()
+    assert synced.fetched == [{"site": "site1", "last_updated__gte": watermark}]
+    # nothing deleted: the counts agree, the ids are not listed
+    assert synced.listed == 0
+    assert Rack._instances[2].name == "R-changed"
+    assert sorted(rack.id for rack in synced.result) == [1, 2, 3, 4, 5]
+    # the watermark moved to the change
+    assert sync().fetched == [{"site": "site1", "last_updated__gte": LATER}]
+
+
+def test_deletion_is_detected(remote):
+    sync()
+    del remote[4]
+    synced = sync()
+    assert synced.listed == 1
+    assert sorted(rack.id for rack in synced.result) == [1, 2, 3, 5]
+    assert 4 not in Rack._instances
+    assert synced.store.ids(synced.scope) == {1, 2, 3, 5}
+
+
+def test_deletion_hidden_by_an_addition(remote):
+    """ One object added and another deleted leave the remote count unchanged from the stored count before the sync """
+    sync()
+    del remote[1]
+    remote[6] = dict(remote[5], id=6, name="R-new", last_updated=LATER)
+    synced = sync()
+    assert synced.listed == 1
+    assert sorted(rack.id for rack in synced.result) == [2, 3, 4, 5, 6]
+    assert 1 not in Rack._instances
+
+
+def test_forget_makes_the_next_sync_full(remote):
+    synced = sync()
+    synced.store.forget(synced.scope)
+    assert sync().fetched == [{"site": "site1"}]
+
+
+def test_stream_hydrates_as_consumed(remote):
+    synced = RecordedSync(Rack, {"site": "site1"}, stream=True)
+    racks = synced.sync()
+    # synced and stored already, hydrated only as the generator is read
+    assert synced.store.ids(synced.scope) == {1, 2, 3, 4, 5} and len(Rack._instances) == 0
+    assert next(racks).id == 1 and len(Rack._instances) == 1
+    assert [rack.id for rack in racks] == [2, 3, 4, 5]
+
+
+def test_without_last_updated_every_sync_is_full(remote):
+    """ NetBox 2.x interface-connections have no last_updated, the scope never gets a watermark """
+    for record in remote.values():
+        del record["last_updated"]
+    sync()
+    synced = sync()
+    assert synced.fetched == [{"site": "site1"}]
+    assert synced.store.watermark(synced.scope)["watermark"] is None
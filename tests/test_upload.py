@@ -0,0 +1,94 @@
+""" SheetsUploader batching, splitting and retries against the in memory Sheets stand-in """
+import pytest
+
+from classdef.upload import SheetsUploader, MemoryTransport, UploadError, Segment, batch_body
+
+
+def spreadsheet(rows: int, columns: int = 3):
+    """ Return a one sheet spreadsheet body of ``rows`` rows of ``columns`` cells, every row encodes to the same length """
+    return {
+        "properties": {"title": "test"},
+        "sheets": [{
+            "properties": {"sheetId": 0, "title": "connections"},
+            "data": [{"startRow": 0, "startColumn": 0, "rowData": [
+                {"values": [{"userEnteredValue": {"stringValue": f"r{row:04d}c{column}"}} for column in range(columns)]}
+                for row in range(rows)]}],
+        }],
+    }
+
+
+def written(transport: MemoryTransport, spreadsheet_id: str):
+    return [[cell["userEnteredValue"]["stringValue"] for cell in row] for row in transport.values(spreadsheet_id)]
+
+
+def expected(rows: int, columns: int = 3):
+    return [[f"r{row:04d}c{column}" for column in range(columns)] for row in range(rows)]
+
+
+def test_batches_within_budgets():
+    """ Every batch is within the byte and cell budgets and the rows are all written once, in place """
+    transport = MemoryTransport()
+    uploader = SheetsUploader(transport, max_bytes=2000, max_cells=40, hoist_formats=False)
+    body = spreadsheet(100)
+    batches = list(uploader.batches(uploader.segments(body)))
+    assert all(len(batch_body(batch)) <= 2000 for batch in batches)
+    assert all(sum(segment.cells for segment in batch) <= 40 for batch in batches)
+    spreadsheet_id = uploader.upload(body)
+    assert written(transport, spreadsheet_id) == expected(100)
+    assert max(transport.requests) <= 2000
+
+
+def test_fewest_batches():
+    """ Rows of a known size are packed into exactly as many batches as the byte budget requires """
+    uploader = SheetsUploader(MemoryTransport(), max_cells=10**6, hoist_formats=False)
+    rows = [segment.rows[0] for segment in uploader.segments(spreadsheet(100))]
+    # the largest batch of 10 rows, the row index with the most digits
+    uploader.max_bytes = len(batch_body([Segment(0, 90, 0, rows[90:], 30)]))
+    assert len(batch_body([Segment(0, 0, 0, rows[:11], 33)])) > uploader.max_bytes
+    batches = list(uploader.batches(uploader.segments(spreadsheet(100))))
+    assert [sum(len(segment.rows) for segment in batch) for batch in batches] == [10] * 10
+    # cells bound instead
+    uploader.max_bytes, uploader.max_cells = 10**6, 30
+    assert len(list(uploader.batches(uploader.segments(spreadsheet(95))))) == 10
+
+
+def test_request_too_large_splits_batch():
+    """ A batch the API rejects as too large is split in half until it is accepted """
+    transport = MemoryTransport(max_bytes=1500)
+    uploader = SheetsUploader(transport, max_bytes=6000, hoist_formats=False, backoff=0)
+    spreadsheet_id = uploader.upload(spreadsheet(100))
+    assert written(transport, spreadsheet_id) == expected(100)
+    assert any(size > 1500 for size in transport.requests)
+    accepted = [size for size in transport.requests if size <= 1500]
+    assert sum(accepted) < sum(transport.requests)
+
+
+def test_transient_failure_retries_the_batch_only():
+    """ A retryable error sends the failed batch again, and only it """
+    failures = {1}
+    transport = MemoryTransport(fail=lambda call: UploadError("unavailable", 503, retryable=True) if call in failures else None)
+    uploader = SheetsUploader(transport, max_cells=90, hoist_formats=False, backoff=0)
+    spreadsheet_id = uploader.upload(spreadsheet(90))
+    assert written(transport, spreadsheet_id) == expected(90)
+    # three batches of 30 rows, the second sent twice
+    assert len(transport.requests) == 4
+    assert transport.requests[1] == transport.requests[2]
+
+
+def test_exhausted_retries_raise_with_failed_rows():
+    """ A batch still failing after ``retries`` is reported in ``UploadError.failed``, the other batches are written """
+    transport = MemoryTransport(fail=lambda call: UploadError("unavailable", 503, retryable=True) if 1 <= call <= 3 else None)
+    uploader = SheetsUploader(transport, max_cells=90, retries=2, hoist_formats=False, backoff=0)
+    with pytest.raises(UploadError) as error:
+        uploader.upload(spreadsheet(90))
+    failed = error.value.failed
+    assert error.value.status == 503 and error.value.retryable
+    assert [(segment.row_index, len(segment.rows)) for segment in failed] == [(30, 30)]
+    # first and third batches, and the second's 3 attempts
+    assert len(transport.requests) == 5
+    spreadsheet_id, = transport.spreadsheets
+    grid = transport.values(spreadsheet_id)
+    assert all(row[0] is None for row in grid[30:60]) and all(row[0] is not None for row in grid[:30] + grid[60:])
+    # the failed rows can be sent again
+    uploader.send(spreadsheet_id, [failed])
+    assert written(transport, spreadsheet_id) == expected(90)